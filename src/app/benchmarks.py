@@ -0,0 +1,419 @@
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import sklearn
+from django.conf import settings
+
+from .catalog import CATALOG_SCHEMA, Catalog
+from .columnar import ColumnarCatalog
+from .features import NUMERIC_COLUMNS, SVD_COMPONENTS, TEXTUAL_COLUMNS, FeaturePipeline
+from .neighbors import build_indexes, reciprocal_rank_fusion
+from .titles import TitlesPayload
+from .utils import filter_recommendations, score
+
+
+# The version of the format of the results, increment it when a benchmark changes ( the results can't be compared )
+BENCHMARKS_VERSION = 2
+
+# The columns of data/cleaned_data.csv, in the same order
+CATALOG_COLUMNS = list(CATALOG_SCHEMA)
+
+# The modules a worker doesn't need to answer the requests: they are imported when they are used ( the fit, the
+# scraping of IMDB ), so importing the urls of the app must not import them
+DEFERRED_MODULES = ["sklearn", "scipy", "joblib", "requests", "bs4", "httpx"]
+
+# The loads of the catalog compared by load_benchmarks: pd.read_csv with type inference, the CSV file with the
+# schema, and the columnar files ( all the columns, or only some of them, decoded in a dataframe ), then the catalog
+# of a worker ( the arrays are memory-mapped, only the titles are decoded )
+LOAD_SETUP = 'path, directory, columns = Path(args["path"]), Path(args["directory"]), args["columns"]'
+CATALOG_LOADS = {"read_csv": "pd.read_csv(path)",
+                 "read_catalog_csv": "read_catalog_csv(path)",
+                 "read_catalog_csv_columns": "read_catalog_csv(path, columns)",
+                 "columnar": "ColumnarCatalog.load(directory).to_frame()",
+                 "columnar_columns": "ColumnarCatalog.load(directory, columns=columns).to_frame()",
+                 "catalog_columnar": "Catalog(ColumnarCatalog.load(directory))"}
+
+# The fits compared by features_benchmarks: the sparse pipeline, and the dense PCA of data/preprocessing.ipynb on the
+# same encoding ( we only take the encoders of the pipeline )
+FEATURES_SETUP = 'movies = read_catalog_csv(Path(args["path"]), PIPELINE_COLUMNS)'
+DENSE_SETUP = 'from sklearn.decomposition import PCA; encoded = FeaturePipeline.fit(movies, 1).encode(movies)'
+FEATURES_FITS = {"sparse_svd": ("", "FeaturePipeline.fit(movies).transform(movies)"),
+                 "dense_pca": (DENSE_SETUP, "PCA(n_components=0.95).fit_transform(encoded.toarray())")}
+
+# The script which measures a statement in a new process: the resident memory of its result and the growth of the
+# peak resident memory during the first call ( after the setup ), then the best time of the calls ( /proc/self/status
+# is read on Linux, ru_maxrss can't be used: it keeps the peak of the process before the exec )
+MEASURE_SCRIPT = """
+import json, sys, time
+from pathlib import Path
+import pandas as pd
+from app.catalog import Catalog, read_catalog_csv
+from app.columnar import ColumnarCatalog
+from app.features import PIPELINE_COLUMNS, FeaturePipeline
+
+def memory():
+    with open("/proc/self/status") as f:
+        status = dict(line.split(":", 1) for line in f)
+    return int(status["VmRSS"].split()[0]) * 1024, int(status["VmHWM"].split()[0]) * 1024
+
+args = json.loads(sys.argv[1])
+{setup}
+rss, peak = memory()
+times = []
+for _ in range(args["repeat"]):
+    start = time.perf_counter()
+    result = {statement}
+    times.append(time.perf_counter() - start)
+    if len(times) == 1:
+        result_rss, result_peak = memory()
+    del result
+print(json.dumps({{"seconds": min(times), "rss_bytes": result_rss - rss, "peak_rss_bytes": result_peak - peak}}))
+"""
+
+GENRES = ["Action", "Adventure", "Animation", "Biography", "Comedy", "Crime", "Documentary", "Drama", "Family",
+          "Fantasy", "Film-Noir", "History", "Horror", "Music", "Musical", "Mystery", "News", "Romance", "Sci-Fi",
+          "Sport", "Thriller", "War", "Western"]
+
+# The content ratings with their age category and their frequency in the catalog
+CONTENT_RATINGS = [("R", "adult", 0.43), ("PG-13", "teenager", 0.30), ("PG", "teenager", 0.14),
+                   ("Unknown", "unknown", 0.05), ("Not Rated", "unknown", 0.025), ("G", "child", 0.025),
+                   ("Unrated", "unknown", 0.012), ("Approved", "child", 0.011), ("X", "adult", 0.002)]
+LANGUAGES = [("English", 0.935), ("French", 0.015), ("Spanish", 0.008), ("Hindi", 0.006), ("Mandarin", 0.005),
+             ("German", 0.004), ("Japanese", 0.004), ("Italian", 0.003)]
+COUNTRIES = [("USA", 0.756), ("UK", 0.087), ("France", 0.032), ("Canada", 0.025), ("Germany", 0.02),
+             ("Australia", 0.011), ("India", 0.007), ("Japan", 0.006)]
+
+# The number of different names by movie in the catalog, the vocabularies grow with the synthetic catalogs
+VOCABULARY_RATIOS = {"director_name": 0.5, "actor_1_name": 0.42, "actor_2_name": 0.62, "actor_3_name": 0.72}
+
+
+def weighted_choice(rng, choices, size):
+    """Function to draw values with their frequencies ( a list of ( value, frequency ) )"""
+    values = np.array([value for value, _ in choices], dtype=object)
+    weights = np.array([weight for _, weight in choices])
+    return values[rng.choice(len(values), size=size, p=weights / weights.sum())]
+
+
+def skewed_names(rng, prefix, vocabulary_size, size):
+    """Function to draw names in a vocabulary, a few names are very frequent ( like the famous actors )"""
+    codes = (vocabulary_size * rng.random(size) ** 3).astype(np.int64)
+    return np.char.add(f"{prefix} ", codes.astype(str)).astype(object)
+
+
+def synthetic_movies(n, seed=0):
+    """Function to generate a synthetic catalog with the schema of data/cleaned_data.csv
+
+    The distributions are close to the ones of the catalog ( languages, content ratings, genres, numbers ),
+    and the number of different directors and actors grows with the catalog
+
+    Args:
+        n (int): The number of movies
+        seed (int, optional): The seed of the generator. Defaults to 0.
+
+    Returns:
+        pd.DataFrame: A movies dataframe ( like read_catalog_csv gives it )
+    """
+    rng = np.random.default_rng(seed)
+    ids = np.arange(n).astype(str)
+    data = {"movie_title": np.char.add("Movie ", ids).astype(object),
+            "movie_imdb_link": np.char.add(np.char.add("http://www.imdb.com/title/tt", np.char.zfill(ids, 7)),
+                                           "/?ref_=fn_tt_tt_1").astype(object)}
+
+    for column, ratio in VOCABULARY_RATIOS.items():
+        data[column] = skewed_names(rng, column.split("_")[0].capitalize(), max(1, int(ratio * n)), n)
+
+    # 1 to 8 genres by movie, in the order of GENRES like in the catalog
+    n_genres = np.minimum(rng.poisson(1.9, size=n) + 1, 8)
+    genre_masks = np.argsort(rng.random((n, len(GENRES))), axis=1) < n_genres[:, None]
+    data["genres"] = np.array(["|".join(genre for genre, selected in zip(GENRES, mask) if selected)
+                               for mask in genre_masks], dtype=object)
+    data["plot_keywords"] = np.array(["|".join(words) for words in
+                                      skewed_names(rng, "keyword", max(1, n * 2), (n, 5)).tolist()], dtype=object)
+
+    ratings = rng.choice(len(CONTENT_RATINGS), size=n, p=[weight for _, _, weight in CONTENT_RATINGS] /
+                         np.sum([weight for _, _, weight in CONTENT_RATINGS]))
+    data["content_rating"] = np.array([rating for rating, _, _ in CONTENT_RATINGS], dtype=object)[ratings]
+    data["age_category"] = np.array([age_category for _, age_category, _ in CONTENT_RATINGS], dtype=object)[ratings]
+    data["language"] = weighted_choice(rng, LANGUAGES, n)
+    data["country"] = weighted_choice(rng, COUNTRIES, n)
+
+    # The numbers, with the orders of magnitude of the catalog
+    data["num_critic_for_reviews"] = np.round(rng.gamma(1.4, 100, size=n))
+    data["duration"] = np.clip(np.round(rng.normal(108, 23, size=n)), 60, 330)
+    data["gross"] = np.round(rng.lognormal(16.8, 1.6, size=n))
+    data["budget"] = np.round(rng.lognormal(16.8, 1.3, size=n))
+    data["num_voted_users"] = np.round(rng.lognormal(10.4, 1.6, size=n)).astype(np.int64)
+    data["num_user_for_reviews"] = np.round(rng.lognormal(5.3, 1.1, size=n))
+    data["title_year"] = np.clip(np.round(rng.normal(2002, 12, size=n)), 1916, 2019)
+    data["imdb_score"] = np.clip(np.round(rng.normal(6.4, 1.1, size=n), 1), 1.6, 9.5)
+    for column in ["director_facebook_likes", "actor_1_facebook_likes", "actor_2_facebook_likes",
+                   "actor_3_facebook_likes"]:
+        data[column] = np.round(rng.lognormal(6, 2, size=n))
+    data["cast_total_facebook_likes"] = np.round(rng.lognormal(8, 1.5, size=n)).astype(np.int64)
+    data["movie_facebook_likes"] = np.round(rng.lognormal(5, 3, size=n)).astype(np.int64)
+    data["gross_filled_with_median"] = rng.random(n) < 0.17
+    data["budget_filled_with_median"] = rng.random(n) < 0.09
+
+    return pd.DataFrame(data, columns=CATALOG_COLUMNS)
+
+
+def encoded_width(movies):
+    """Function to get the number of columns of the movies encoded by FeaturePipeline ( before the TruncatedSVD )"""
+    return int(movies[TEXTUAL_COLUMNS].nunique().sum()) + len(NUMERIC_COLUMNS) + 2 * movies["genres"].nunique()
+
+
+def svd_memory(n_movies, n_columns):
+    """Function to estimate the memory of the TruncatedSVD of FeaturePipeline ( in bytes ): the randomized SVD keeps
+    about 2 float32 blocks of ( n_movies + n_columns ) x ( SVD_COMPONENTS + 10 oversamples )
+    """
+    return 2 * (n_movies + n_columns) * (SVD_COMPONENTS + 10) * 4
+
+
+def best_time(func, repeat):
+    """Function to get the best time of several calls of a function ( in seconds )"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def run_benchmarks(size, repeat=3, queries=20, nb=5, components=128, max_memory=4 * 1024 ** 3, seed=0):
+    """Function to time the paths of a recommendation on a synthetic catalog
+
+    The neighbors are searched in random features of `components` dimensions, so the index and the queries
+    can be timed on the large catalogs, even when FeaturePipeline can't encode them ( its encoding is dense )
+
+    Args:
+        size (int): The number of movies of the synthetic catalog
+        repeat (int, optional): The number of calls by measure ( we keep the best ). Defaults to 3.
+        queries (int, optional): The number of movies we search the neighbors of. Defaults to 20.
+        nb (int, optional): The number of recommendations ( we search nb * 10 neighbors ). Defaults to 5.
+        components (int, optional): The dimension of the features. Defaults to 128.
+        max_memory (int, optional): The largest memory of the TruncatedSVD of FeaturePipeline we fit ( in bytes,
+                                    see svd_memory ). Defaults to 4 GB.
+        seed (int, optional): The seed of the synthetic catalog and of the queries. Defaults to 0.
+
+    Returns:
+        dict: The time of each benchmark in seconds ( or the reason why it's skipped )
+    """
+    rng = np.random.default_rng(seed)
+    results = {}
+    movies = synthetic_movies(size, seed)
+
+    with tempfile.TemporaryDirectory() as directory:
+        # load_movies, from the CSV and from the columnar files
+        path = Path(directory) / "cleaned_data.csv"
+        movies.to_csv(path, index=False)
+        results["load_movies"] = {"seconds": best_time(lambda: Catalog.from_csv(path).movies, repeat)}
+        catalog = Catalog.from_csv(path)
+        ColumnarCatalog.from_frame(catalog.movies).save(Path(directory) / "catalog")
+        results["load_movies_columnar"] = {"seconds": best_time(
+            lambda: Catalog(ColumnarCatalog.load(Path(directory) / "catalog")), repeat)}
+        movies = catalog.movies
+
+        # generate_recommendations: the fit ( features and indexes ), then the queries
+        nbytes = svd_memory(size, encoded_width(movies))
+        if nbytes > max_memory:
+            results["fit_features"] = {"skipped": f"the TruncatedSVD needs {nbytes / 1024 ** 3:.1f} GB"}
+        else:
+            results["fit_features"] = {"seconds": best_time(
+                lambda: FeaturePipeline.fit(movies).transform(movies), 1)}
+
+        movie_ids = movies.index.to_numpy()
+        features = rng.standard_normal((size, components), dtype=np.float32)
+        start = time.perf_counter()
+        index = build_indexes(movie_ids, features, movies)["adult"]
+        results["fit_index"] = {"seconds": time.perf_counter() - start}
+
+        query_ids = rng.choice(movie_ids, size=min(queries, size), replace=False)
+        start = time.perf_counter()
+        for query_id in query_ids:
+            catalog.take(index.kneighbors(query_id, nb * 10)[1])
+        results["query"] = {"seconds": (time.perf_counter() - start) / len(query_ids)}
+
+        # A basket of 5 movies: 1 batched search, then the fusion of the neighbor lists
+        basket_ids = query_ids[:5]
+        results["basket"] = {"seconds": best_time(lambda: reciprocal_rank_fusion(
+            index.kneighbors_many(basket_ids, nb * 10 + len(basket_ids) - 1)[1], basket_ids), repeat)}
+
+        # filter_recommendations and score, on the recommendations of a movie
+        query_id = query_ids[0]
+        df_recommendations = catalog.take(index.kneighbors(query_id, nb * 10)[1])
+        choices = {"languages": ["English", "French"], "duration": ["1", "2"], "filter": "genres",
+                   "genres": ["Drama", "Comedy"], "actors": [], "directors": []}
+        results["filter_recommendations"] = {"seconds": best_time(
+            lambda: filter_recommendations(df_recommendations, choices, nb), repeat)}
+        movie = catalog.take([query_id])
+        results["score"] = {"seconds": best_time(lambda: score(movie, df_recommendations), repeat)}
+
+        # The choices of the questionnaire, on a pool of thousands of candidates
+        pool = rng.choice(movie_ids, size=min(5000, size), replace=False)
+        results["facets"] = {"seconds": best_time(lambda: catalog.facets(pool), repeat)}
+
+        # The payload of get_movie_titles
+        results["titles_payload"] = {"seconds": best_time(
+            lambda: TitlesPayload.from_movies(catalog.frame(["movie_title", "age_category"])), repeat)}
+
+    return results
+
+
+def measure_in_process(statement, setup="", repeat=1, **args):
+    """Function to measure a statement in a new process ( see MEASURE_SCRIPT ), so it doesn't reuse the memory of
+    another measure
+
+    Args:
+        statement (str): The measured expression
+        setup (str, optional): The code run before the measure, its memory is not counted. Defaults to "".
+        repeat (int, optional): The number of calls ( we keep the best time ). Defaults to 1.
+        **args: The JSON arguments of the statement and the setup ( in the dict args )
+
+    Returns:
+        dict: The time ( in seconds ), the resident memory of the result and the growth of the peak resident memory
+              ( in bytes )
+    """
+    script = MEASURE_SCRIPT.format(setup=setup, statement=statement)
+    process = subprocess.run([sys.executable, "-c", script, json.dumps({"repeat": repeat, **args})],
+                             cwd=settings.BASE_DIR, capture_output=True, text=True, check=True)
+    return json.loads(process.stdout)
+
+
+def load_benchmarks(path, directory, columns, repeat=3):
+    """Function to measure the loads of a catalog ( see CATALOG_LOADS ), each in a new process
+
+    Args:
+        path (pathlib.Path): The CSV file of the catalog
+        directory (pathlib.Path): The columnar files of the same catalog ( see ColumnarCatalog.save )
+        columns (list): The columns of the projected loads
+        repeat (int, optional): The number of loads by process ( we keep the best time ). Defaults to 3.
+
+    Returns:
+        dict: The measures of each load ( see measure_in_process )
+    """
+    return {name: measure_in_process(load, LOAD_SETUP, repeat, path=str(path), directory=str(directory),
+                                     columns=columns)
+            for name, load in CATALOG_LOADS.items()}
+
+
+def features_benchmarks(size, max_memory=1024 ** 3, seed=0):
+    """Function to measure the fits of the features on a synthetic catalog ( see FEATURES_FITS ), each in a new
+    process
+
+    Args:
+        size (int): The number of movies of the synthetic catalog
+        max_memory (int, optional): The largest dense encoding we fit the dense PCA on ( in bytes ). Defaults to 1 GB.
+        seed (int, optional): The seed of the synthetic catalog. Defaults to 0.
+
+    Returns:
+        dict: The number of encoded columns, and the measures of each fit ( see measure_in_process ) or the reason
+              why it's skipped
+    """
+    movies = synthetic_movies(size, seed)
+    results = {"encoded_columns": encoded_width(movies)}
+    nbytes = size * results["encoded_columns"] * 8
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / "cleaned_data.csv"
+        movies.to_csv(path, index=False)
+        for name, (setup, fit) in FEATURES_FITS.items():
+            if name == "dense_pca" and nbytes > max_memory:
+                results[name] = {"skipped": f"the dense encoding needs {nbytes / 1024 ** 3:.1f} GB"}
+            else:
+                results[name] = measure_in_process(fit, f"{FEATURES_SETUP}; {setup}", path=str(path))
+    return results
+
+
+def directory_size(directory):
+    """Function to get the size of the files of a directory ( in bytes )"""
+    return sum(path.stat().st_size for path in Path(directory).iterdir() if path.is_file())
+
+
+def import_times(module="app.urls"):
+    """Function to measure the imports of a new worker, in a new process ( python -X importtime )
+
+    Args:
+        module (str, optional): The module the worker imports after django.setup(). Defaults to "app.urls".
+
+    Returns:
+        dict: The cumulative import time of each imported module ( in seconds ), in the order of the imports
+    """
+    code = f"import django; django.setup(); import {module}"
+    process = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=settings.BASE_DIR,
+                             capture_output=True, text=True, check=True)
+    times = {}
+    for line in process.stderr.splitlines():
+        # The lines are "import time: self [us] | cumulative | imported package"
+        fields = line.removeprefix("import time:").split("|")
+        if len(fields) == 3 and fields[1].strip().isdigit():
+            times[fields[2].strip()] = int(fields[1]) / 1e6
+    return times
+
+
+def deferred_imports(times):
+    """Function to get the deferred modules ( see DEFERRED_MODULES ) imported by a worker
+
+    Args:
+        times (dict): The import times of import_times
+
+    Returns:
+        list: The deferred modules imported
+    """
+    return [module for module in DEFERRED_MODULES if module in times]
+
+
+def benchmark_report(results):
+    """Function to get the JSON report of the benchmarks, with the environment
+
+    Args:
+        results (dict): The results of run_benchmarks of each size
+
+    Returns:
+        dict: The report
+    """
+    return {"version": BENCHMARKS_VERSION,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "environment": {"python": platform.python_version(),
+                            "machine": platform.machine(),
+                            "numpy": np.__version__,
+                            "pandas": pd.__version__,
+                            "sklearn": sklearn.__version__},
+            "results": {str(size): size_results for size, size_results in results.items()}}
+
+
+def compare_reports(report, baseline, tolerance=0.25):
+    """Function to find the regressions of a report compared to a baseline
+
+    Args:
+        report (dict): The report of benchmark_report
+        baseline (dict): The report of the baseline
+        tolerance (float, optional): The slowdown allowed ( 0.25 is 25% slower ). Defaults to 0.25.
+
+    Raises:
+        ValueError: If the reports have different versions
+
+    Returns:
+        list: The size, the benchmark, the times and the ratio of each regression
+    """
+    if report["version"] != baseline["version"]:
+        raise ValueError(f"The baseline has the version {baseline['version']}, not {report['version']}")
+
+    regressions = []
+    for size, size_results in report["results"].items():
+        for name, result in size_results.items():
+            expected = baseline["results"].get(size, {}).get(name, {})
+            if "seconds" not in result or "seconds" not in expected:
+                continue
+            ratio = result["seconds"] / expected["seconds"]
+            if ratio > 1 + tolerance:
+                regressions.append({"size": int(size), "benchmark": name, "baseline": expected["seconds"],
+                                    "seconds": result["seconds"], "ratio": ratio})
+    return regressions
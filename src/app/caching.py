@@ -0,0 +1,76 @@
+import threading
+from functools import lru_cache
+
+import numpy as np
+from django.core.cache import caches
+
+from .catalog import get_catalog
+from .neighbors import get_neighbors_version
+
+
+class RecommendationCache:
+    """The cache of the recommended movies ( before the filters of the user ) of ( movie, nb, age_category )
+
+    The entries are in a cache of the Django cache framework ( the 'recommendations' cache of the CACHES setting ),
+    their key contains the catalog version and the version of the features and the indexes of the process, so
+    building them again gives new keys ( the old entries are evicted by the cache, they are never read again )
+
+    Args:
+        cache (django.core.cache.backends.base.BaseCache): The Django cache
+    """
+    def __init__(self, cache):
+        self.cache = cache
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def key(movie_id, nb, age_category):
+        """Method to get the key of the recommendations of a movie ( or of a basket of movies )
+
+        Args:
+            movie_id (int or list): The index in the catalog of the movie, or the indexes of the movies of a basket
+            nb (int): The number of recommendations
+            age_category (str): The age category
+
+        Returns:
+            str: The key
+        """
+        movie_ids = "-".join(str(idx) for idx in np.atleast_1d(movie_id).tolist())
+        return f"recommendations:{get_catalog().version}:{get_neighbors_version()}:{movie_ids}:{nb}:{age_category}"
+
+    def get(self, movie_id, nb, age_category):
+        """Method to get the cached recommendations
+
+        Returns:
+            np.ndarray: The indexes in the catalog of the recommendations, or None if they are not cached
+        """
+        indices = self.cache.get(self.key(movie_id, nb, age_category))
+        with self.lock:
+            if indices is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return indices
+
+    def set(self, movie_id, nb, age_category, indices):
+        """Method to cache the recommendations ( see get )"""
+        self.cache.set(self.key(movie_id, nb, age_category), np.asarray(indices, dtype=np.int32))
+
+    def to_text(self):
+        """Method to get the counters in the Prometheus text format ( see timing.Metrics.to_text )"""
+        with self.lock:
+            return "\n".join(["# HELP app_recommendation_cache_total The lookups of the recommendation cache",
+                              "# TYPE app_recommendation_cache_total counter",
+                              f'app_recommendation_cache_total{{result="hit"}} {self.hits}',
+                              f'app_recommendation_cache_total{{result="miss"}} {self.misses}']) + "\n"
+
+
+@lru_cache(maxsize=None)
+def get_recommendation_cache():
+    """Function to get the recommendation cache of the process ( its counters are by process )
+
+    Returns:
+        RecommendationCache: The shared cache
+    """
+    return RecommendationCache(caches["recommendations"])
@@ -0,0 +1,235 @@
+from functools import cached_property, lru_cache
+
+import numpy as np
+import pandas as pd
+
+from project import settings
+from .columnar import ColumnarCatalog
+
+
+DATA_DIR = settings.BASE_DIR / "data"
+CATALOG_CSV = DATA_DIR / "cleaned_data.csv"
+COLUMNAR_DIR = DATA_DIR / "catalog"
+
+# The schema of the catalog: the type of each column of cleaned_data.csv, in the same order ( "string" for the
+# textual columns ), so the CSV file is parsed without type inference
+CATALOG_SCHEMA = {"movie_title": "string", "director_name": "string", "num_critic_for_reviews": "float64",
+                  "duration": "float64", "director_facebook_likes": "float64", "actor_3_facebook_likes": "float64",
+                  "actor_2_name": "string", "actor_1_facebook_likes": "float64", "gross": "float64",
+                  "genres": "string", "actor_1_name": "string", "num_voted_users": "int64",
+                  "cast_total_facebook_likes": "int64", "actor_3_name": "string", "plot_keywords": "string",
+                  "movie_imdb_link": "string", "num_user_for_reviews": "float64", "language": "string",
+                  "country": "string", "content_rating": "string", "budget": "float64", "title_year": "float64",
+                  "actor_2_facebook_likes": "float64", "imdb_score": "float64", "movie_facebook_likes": "int64",
+                  "gross_filled_with_median": "bool", "budget_filled_with_median": "bool", "age_category": "string"}
+
+
+def normalize_title(title):
+    """Function to normalize a title ( case and whitespaces ) for the lookups
+
+    Args:
+        title (str): A movie title
+
+    Returns:
+        str: The normalized title
+    """
+    return " ".join(str(title).split()).casefold()
+
+
+def build_title_index(titles, popularity=None):
+    """Function to build a hash index of the titles
+
+    A title can be shared by several movies, so we keep all of them, the most popular first
+
+    Args:
+        titles (iterable): The titles of the movies ( in the order of the catalog )
+        popularity (np.ndarray, optional): The popularity of the movies to sort the duplicates. Defaults to None.
+
+    Returns:
+        dict: The tuple of the indexes in the catalog of the movies of each title
+    """
+    titles = list(titles)
+    rows = range(len(titles)) if popularity is None else np.argsort(-np.asarray(popularity), kind="stable").tolist()
+
+    index = {}
+    for row in rows:
+        index.setdefault(titles[row], []).append(row)
+    return {title: tuple(rows) for title, rows in index.items()}
+
+
+def read_catalog_csv(path, columns=None):
+    """Function to read the cleaned CSV file
+
+    Args:
+        path (pathlib.Path): The path of the CSV file
+        columns (list, optional): The columns to parse, the others are skipped. Defaults to None ( all the columns ).
+
+    Returns:
+        pd.DataFrame: A dataframe contains all movies
+    """
+    # We load the dataframe from CSV file, with the types of the schema
+    dtype = {column: str if kind == "string" else kind for column, kind in CATALOG_SCHEMA.items()}
+    df = pd.read_csv(path, usecols=columns, dtype=dtype)
+    if columns is not None:
+        df = df[list(columns)]
+
+    # We fill empty values with an empty string ( Don't worry the dataframe is already cleaned ! )
+    df.fillna("", inplace=True)
+    return df
+
+
+def read_catalog(columns=None):
+    """Function to read some columns of the catalog, the other columns are never loaded
+
+    We decode the arrays built by 'python manage.py build_catalog', else we parse only these columns of the CSV file
+
+    Args:
+        columns (list, optional): The columns. Defaults to None ( all the columns ).
+
+    Returns:
+        pd.DataFrame: A dataframe contains the columns of all the movies
+    """
+    try:
+        return ColumnarCatalog.load(COLUMNAR_DIR, columns=columns).to_frame()
+    except FileNotFoundError:
+        return read_catalog_csv(CATALOG_CSV, columns)
+
+
+class Catalog:
+    """The movie catalog, loaded once per process and shared ( read-only ! ) by every view
+
+    The movies are stored in a ColumnarCatalog, the dataframe of all the movies is decoded only if we use it
+
+    Args:
+        movies (pd.DataFrame or ColumnarCatalog): The movies
+    """
+    def __init__(self, movies):
+        self.columnar = movies if isinstance(movies, ColumnarCatalog) else ColumnarCatalog.from_frame(movies)
+
+        # We index the titles, the duplicates are sorted by number of votes
+        titles = self.columnar.strings("movie_title")
+        popularity = self.columnar.numbers.get("num_voted_users")
+        self.title_ids = build_title_index(titles, popularity)
+        self.normalized_title_ids = build_title_index(map(normalize_title, titles), popularity)
+
+    @classmethod
+    def from_csv(cls, path):
+        """Method to build a catalog from the cleaned CSV file
+
+        Args:
+            path (pathlib.Path): The path of the CSV file
+
+        Returns:
+            Catalog: The catalog
+        """
+        return cls(read_catalog_csv(path))
+
+    @cached_property
+    def movies(self):
+        """The dataframe of all the movies, it's decoded at the first use"""
+        return self.columnar.to_frame()
+
+    @cached_property
+    def version(self):
+        """A short digest of the movies, it changes when the catalog changes"""
+        return self.columnar.digest()[:16]
+
+    def __len__(self):
+        return len(self.columnar)
+
+    def lookup_title(self, title):
+        """Method to get all the movies with a title ( the exact title, else the normalized title )
+
+        Args:
+            title (str): A movie title
+
+        Returns:
+            tuple: The indexes in the catalog of the movies, the most popular first ( empty if the title is unknown )
+        """
+        ids = self.title_ids.get(title)
+        if ids is None:
+            ids = self.normalized_title_ids.get(normalize_title(title), ())
+        return ids
+
+    def find_title(self, title):
+        """Method to get the movie with a title ( the most popular if several movies have this title )
+
+        Args:
+            title (str): A movie title
+
+        Returns:
+            int: The index in the catalog of the movie, or None if the title is unknown
+        """
+        ids = self.lookup_title(title)
+        return ids[0] if ids else None
+
+    def title(self, idx):
+        """Method to get the title of a movie
+
+        Args:
+            idx (int): The index in the catalog of the movie
+
+        Returns:
+            str: The title of the movie
+        """
+        return self.columnar.strings("movie_title", [idx])[0]
+
+    def frame(self, columns):
+        """Method to get some columns of all the movies
+
+        Args:
+            columns (list): The columns
+
+        Returns:
+            pd.DataFrame: A dataframe contains the columns of all the movies ( it's a copy )
+        """
+        return self.columnar.to_frame(columns=columns)
+
+    def facets(self, idx):
+        """Method to get the choices of the questionnaire for some movies, with the codes of the columns
+        ( no dataframe is decoded, see ColumnarCatalog.unique_strings and ColumnarCatalog.genres )
+
+        Args:
+            idx (iterable): An iterable contains indexes of movies
+
+        Returns:
+            dict: The languages, the genres, the actors ( actor_1_name ) and the directors of the movies
+        """
+        rows = np.asarray(idx, dtype=np.intp).reshape(-1)
+        return {"languages": self.columnar.unique_strings("language", rows),
+                "genres": self.columnar.genres(rows),
+                "actors": [actor for actor in self.columnar.unique_strings("actor_1_name", rows) if actor],
+                "directors": [director for director in self.columnar.unique_strings("director_name", rows)
+                              if director]}
+
+    def take(self, idx):
+        """Method to get the movies at some positions
+
+        Args:
+            idx (iterable): An iterable contains indexes of movies
+
+        Raises:
+            TypeError: If idx is None ( to_frame would return all the movies )
+
+        Returns:
+            pd.DataFrame: A dataframe contains movies at the indexes in idx ( it's a copy )
+        """
+        if idx is None:
+            raise TypeError("The indexes of the movies are needed")
+        return self.columnar.to_frame(rows=idx)
+
+
+@lru_cache(maxsize=None)
+def get_catalog():
+    """Function to get the catalog of the process, it's loaded at the first call
+
+    We memory-map the arrays built by 'python manage.py build_catalog', so they are shared by the worker processes,
+    else we read the CSV file
+
+    Returns:
+        Catalog: The shared catalog
+    """
+    try:
+        return Catalog(ColumnarCatalog.load(COLUMNAR_DIR))
+    except FileNotFoundError:
+        return Catalog.from_csv(CATALOG_CSV)
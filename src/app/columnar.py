@@ -0,0 +1,360 @@
+import hashlib
+import json
+import sys
+
+import numpy as np
+import pandas as pd
+
+from .files import replace_file
+
+
+class StringDictionary:
+    """The different strings of a column, packed in a UTF-8 buffer ( it can be memory-mapped )
+
+    The strings are decoded only when we need them, each different string is decoded once by call
+
+    Args:
+        data (np.ndarray): The buffer ( uint8 )
+        offsets (np.ndarray): The offsets of the strings in the buffer ( int64, 1 more than the strings )
+    """
+    def __init__(self, data, offsets):
+        self.data = data
+        self.offsets = offsets
+
+    @classmethod
+    def from_strings(cls, strings):
+        """Method to pack strings
+
+        Args:
+            strings (iterable): The strings
+
+        Returns:
+            StringDictionary: The packed strings
+        """
+        encoded = [str(string).encode() for string in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(string) for string in encoded])
+        return cls(np.frombuffer(b"".join(encoded), dtype=np.uint8), offsets)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes + self.offsets.nbytes
+
+    def decode(self, codes):
+        """Method to decode strings
+
+        When we decode many strings, we decode the whole dictionary at once ( see to_array ) and we take the strings,
+        else we decode each string and we intern it
+
+        Args:
+            codes (np.ndarray): The codes of the strings ( their position in the dictionary, 1 dimension )
+
+        Returns:
+            np.ndarray: The strings ( dtype object )
+        """
+        codes = np.asarray(codes)
+        if len(codes) * 4 >= len(self):
+            return self.to_array()[codes]
+
+        buffer = memoryview(np.asarray(self.data))
+        starts = self.offsets[codes].tolist()
+        ends = self.offsets[codes + 1].tolist()
+        strings = np.empty(len(codes), dtype=object)
+        strings[:] = [sys.intern(str(buffer[start:end], "utf-8")) for start, end in zip(starts, ends)]
+        return strings
+
+    def to_array(self):
+        """Method to decode all the strings: the buffer is decoded once, then sliced
+
+        Returns:
+            np.ndarray: The strings ( dtype object )
+        """
+        data = np.asarray(self.data)
+        text = bytes(data).decode()
+        if len(text) == len(data):
+            offsets = self.offsets.tolist()
+        else:
+            # The offsets are in bytes, we remove the continuation bytes of UTF-8 to get them in characters
+            continuations = np.zeros(len(data) + 1, dtype=np.int64)
+            np.cumsum((data & 0xC0) == 0x80, out=continuations[1:])
+            offsets = (self.offsets - continuations[self.offsets]).tolist()
+
+        strings = np.empty(len(self), dtype=object)
+        strings[:] = [text[start:end] for start, end in zip(offsets[:-1], offsets[1:])]
+        return strings
+
+    def to_list(self):
+        """Method to decode all the strings"""
+        return self.to_array().tolist()
+
+
+def encode_genres(genres):
+    """Function to encode the genres ( separated by '|' ) in a bitmask
+
+    Args:
+        genres (iterable): The genres of each movie
+
+    Returns:
+        tuple: The bitmask of each movie ( uint32, or uint64 if there are more than 32 genres ) and the genre names
+    """
+    splitted = [[genre for genre in value.split("|") if genre] for value in genres]
+    names = sorted({genre for value in splitted for genre in value})
+    if len(names) > 64:
+        raise ValueError(f"The genre bitmask can't contain {len(names)} genres")
+
+    dtype = np.uint32 if len(names) <= 32 else np.uint64
+    bits = {name: 1 << bit for bit, name in enumerate(names)}
+    mask = np.array([sum(bits[genre] for genre in set(value)) for value in splitted], dtype=dtype)
+    return mask, names
+
+
+class ColumnarCatalog:
+    """The movies in compact arrays, they can be memory-mapped to be shared by the worker processes:
+        - the strings as integer codes ( int16, or int32 for a large dictionary ) in a StringDictionary by column
+        - the numbers as fixed-width arrays
+        - the genres as a bitmask too ( the bit of each genre is its position in genre_names )
+
+    Args:
+        columns (list): The columns in the order of the dataframe
+        codes (dict): The codes of each string column
+        dictionaries (dict): The StringDictionary of each string column
+        numbers (dict): The array of each numeric column
+        genre_mask (np.ndarray, optional): The bitmask of the genres of each movie. Defaults to None.
+        genre_names (list, optional): The genre of each bit. Defaults to None.
+    """
+    def __init__(self, columns, codes, dictionaries, numbers, genre_mask=None, genre_names=None):
+        self.columns = columns
+        self.codes = codes
+        self.dictionaries = dictionaries
+        self.numbers = numbers
+        self.genre_mask = genre_mask
+        self.genre_names = genre_names
+
+    @classmethod
+    def from_frame(cls, df):
+        """Method to encode a movies dataframe
+
+        Args:
+            df (pd.DataFrame): A movies dataframe ( without missing values )
+
+        Returns:
+            ColumnarCatalog: The encoded movies
+        """
+        codes, dictionaries, numbers = {}, {}, {}
+        for column in df.columns:
+            if pd.api.types.is_numeric_dtype(df[column]):
+                numbers[column] = np.ascontiguousarray(df[column].to_numpy())
+            else:
+                column_codes, uniques = pd.factorize(df[column].to_numpy(dtype=object))
+                dtype = np.int16 if len(uniques) <= np.iinfo(np.int16).max else np.int32
+                codes[column] = column_codes.astype(dtype)
+                dictionaries[column] = StringDictionary.from_strings(uniques)
+
+        genre_mask, genre_names = None, None
+        if "genres" in codes:
+            # We encode the dictionary, then we get the bitmask of each movie with its code
+            dictionary_mask, genre_names = encode_genres(dictionaries["genres"].to_list())
+            genre_mask = dictionary_mask[codes["genres"]]
+        return cls(list(df.columns), codes, dictionaries, numbers, genre_mask, genre_names)
+
+    def __len__(self):
+        return len(self.array(self.columns[0])) if self.columns else 0
+
+    def array(self, column):
+        """Method to get the array of a column ( the codes for a string column )"""
+        return self.codes[column] if column in self.codes else self.numbers[column]
+
+    @property
+    def nbytes(self):
+        arrays = [*self.codes.values(), *self.numbers.values()]
+        if self.genre_mask is not None:
+            arrays.append(self.genre_mask)
+        return sum(array.nbytes for array in arrays) + sum(dictionary.nbytes
+                                                           for dictionary in self.dictionaries.values())
+
+    def schema(self):
+        """Method to get the type of each column
+
+        Returns:
+            dict: "string" for the string columns, else the dtype of the array ( in the order of the columns )
+        """
+        return {column: "string" if column in self.codes else self.numbers[column].dtype.name
+                for column in self.columns}
+
+    def digest(self):
+        """Method to get a digest of the movies ( it changes when a column or a value changes )
+
+        Returns:
+            str: The SHA-256 of the columns and the arrays ( hexadecimal )
+        """
+        digest = hashlib.sha256(json.dumps(self.columns).encode())
+        for column in self.columns:
+            arrays = [self.array(column)]
+            if column in self.dictionaries:
+                arrays += [self.dictionaries[column].data, self.dictionaries[column].offsets]
+            for array in arrays:
+                digest.update(array.dtype.str.encode())
+                digest.update(np.ascontiguousarray(array).tobytes())
+        return digest.hexdigest()
+
+    def strings(self, column, rows=None):
+        """Method to decode a string column
+
+        Args:
+            column (str): The column
+            rows (np.ndarray, optional): The positions of the movies. Defaults to None ( all the movies ).
+
+        Returns:
+            np.ndarray: The strings of the movies ( dtype object )
+        """
+        codes = self.codes[column] if rows is None else self.codes[column][rows]
+        return self.dictionaries[column].decode(codes)
+
+    def unique_strings(self, column, rows):
+        """Method to get the different strings of a column in some movies, we only decode their codes
+
+        Args:
+            column (str): The string column
+            rows (np.ndarray): The positions of the movies
+
+        Returns:
+            list: The different strings, in the order of their first movie
+        """
+        codes, first_rows = np.unique(self.codes[column][rows], return_index=True)
+        return self.dictionaries[column].decode(codes[np.argsort(first_rows, kind="stable")]).tolist()
+
+    def genres(self, rows):
+        """Method to get the different genres of some movies, with a bitwise OR of their bitmasks
+
+        Args:
+            rows (np.ndarray): The positions of the movies
+
+        Returns:
+            list: The different genres, in the order of the bits ( alphabetical )
+        """
+        mask = int(np.bitwise_or.reduce(self.genre_mask[rows])) if len(rows) else 0
+        return [name for bit, name in enumerate(self.genre_names) if mask >> bit & 1]
+
+    def to_frame(self, rows=None, columns=None):
+        """Method to decode movies in a dataframe
+
+        Args:
+            rows (iterable, optional): The positions of the movies. Defaults to None ( all the movies ).
+            columns (list, optional): The columns to decode. Defaults to None ( all the columns ).
+
+        Returns:
+            pd.DataFrame: A dataframe of the movies ( it's a copy ), the index is their position
+        """
+        columns = columns or self.columns
+        if rows is None:
+            index = pd.RangeIndex(len(self))
+        else:
+            rows = np.asarray(rows, dtype=np.intp).reshape(-1)
+            index = pd.Index(rows)
+
+        data = {}
+        for column in columns:
+            if column in self.codes:
+                data[column] = self.strings(column, rows)
+            else:
+                data[column] = np.array(self.numbers[column] if rows is None else self.numbers[column][rows])
+        return pd.DataFrame(data, index=index, columns=columns)
+
+    def save(self, directory):
+        """Method to save the arrays in .npy files ( uncompressed, so they can be memory-mapped )
+
+        Each file is replaced at once, so the workers which memory-mapped the old files keep reading them
+
+        Args:
+            directory (pathlib.Path): The directory of the files
+        """
+        directory.mkdir(parents=True, exist_ok=True)
+        arrays = {}
+        for column, codes in self.codes.items():
+            arrays[f"{column}.codes.npy"] = codes
+            arrays[f"{column}.dictionary.npy"] = self.dictionaries[column].data
+            arrays[f"{column}.offsets.npy"] = self.dictionaries[column].offsets
+        for column, array in self.numbers.items():
+            arrays[f"{column}.npy"] = array
+        if self.genre_mask is not None:
+            arrays["genre_mask.npy"] = self.genre_mask
+        for filename, array in arrays.items():
+            with replace_file(directory / filename) as path:
+                np.save(path, array)
+
+        manifest = {"movies": len(self),
+                    "columns": self.columns,
+                    "schema": self.schema(),
+                    "genre_names": self.genre_names,
+                    "nbytes": self.nbytes}
+        with replace_file(directory / "catalog.json") as path, open(path, "w") as f:
+            json.dump(manifest, f, indent=4)
+
+    @classmethod
+    def load(cls, directory, mmap_mode="r", columns=None):
+        """Method to load the arrays saved by save
+
+        Only the files of the columns are opened, so the other columns are never read
+
+        Args:
+            directory (pathlib.Path): The directory of the files
+            mmap_mode (str, optional): The numpy mmap_mode of the arrays. Defaults to "r".
+            columns (list, optional): The columns to load. Defaults to None ( all the columns ).
+
+        Raises:
+            KeyError: If a column is not in the catalog
+            ValueError: If the type of an array is not the type of the schema
+
+        Returns:
+            ColumnarCatalog: The movies
+        """
+        with open(directory / "catalog.json") as f:
+            manifest = json.load(f)
+
+        schema = manifest["schema"]
+        columns = manifest["columns"] if columns is None else list(columns)
+        unknown = [column for column in columns if column not in schema]
+        if unknown:
+            raise KeyError(f"The catalog has no column {', '.join(unknown)}")
+
+        codes, dictionaries, numbers = {}, {}, {}
+        for column in columns:
+            if schema[column] == "string":
+                codes[column] = np.load(directory / f"{column}.codes.npy", mmap_mode=mmap_mode)
+                dictionaries[column] = StringDictionary(
+                    np.load(directory / f"{column}.dictionary.npy", mmap_mode=mmap_mode),
+                    np.load(directory / f"{column}.offsets.npy", mmap_mode=mmap_mode))
+            else:
+                numbers[column] = np.load(directory / f"{column}.npy", mmap_mode=mmap_mode)
+                if numbers[column].dtype.name != schema[column]:
+                    raise ValueError(f"The column {column} is {numbers[column].dtype.name}, "
+                                     f"not {schema[column]} as in the schema")
+
+        genre_mask, genre_names = None, None
+        if manifest["genre_names"] is not None and "genres" in codes:
+            genre_mask = np.load(directory / "genre_mask.npy", mmap_mode=mmap_mode)
+            genre_names = manifest["genre_names"]
+        return cls(columns, codes, dictionaries, numbers, genre_mask, genre_names)
+
+
+def memory_report(df, columnar, workers=1):
+    """Function to compare the memory of a movies dataframe with the memory of the same movies in a ColumnarCatalog
+
+    Each worker has its own copy of the dataframe, but the memory-mapped arrays are shared by all the workers
+
+    Args:
+        df (pd.DataFrame): A movies dataframe
+        columnar (ColumnarCatalog): The same movies encoded
+        workers (int, optional): The number of worker processes. Defaults to 1.
+
+    Returns:
+        dict: The sizes in bytes for all the workers
+    """
+    dataframe_nbytes = int(df.memory_usage(deep=True).sum())
+    return {"workers": workers,
+            "dataframe_nbytes": workers * dataframe_nbytes,
+            "columnar_nbytes": columnar.nbytes,
+            "ratio": columnar.nbytes / (workers * dataframe_nbytes)}
@@ -0,0 +1,219 @@
+import hashlib
+import json
+import time
+from itertools import product
+
+import joblib
+import numpy as np
+from sklearn.neighbors import NearestNeighbors
+
+
+# The hyperparameters tested by default ( the metrics are scored, the tree algorithms are only timed )
+ALGORITHMS = ["auto", "ball_tree", "kd_tree", "brute"]
+LEAF_SIZES = [10, 20, 30, 40, 50]
+METRICS = ["euclidean", "manhattan"]
+P_VALUES = [1, 2]
+
+
+def canonical_config(metric, p):
+    """Function to get the canonical form of a NearestNeighbors config
+
+    The search is exact, so the tree algorithm and the leaf_size give the same neighbors, only their speed differs
+    ( see algorithm_configs and time_algorithm ), they are not in the config. And the equivalent configs have the
+    same canonical form: p is used only by the minkowski metric ( minkowski with p=1 or p=2 is manhattan or
+    euclidean )
+
+    Args:
+        metric (str): The metric of NearestNeighbors
+        p (int): The p of NearestNeighbors
+
+    Returns:
+        dict: The parameters of NearestNeighbors
+    """
+    if metric == "minkowski" and p in (1, 2):
+        metric = {1: "manhattan", 2: "euclidean"}[p]
+
+    config = {"metric": metric}
+    if metric == "minkowski":
+        config["p"] = p
+    return config
+
+
+def config_key(config):
+    """Function to get a string identifying a config ( for the checkpoint )"""
+    return json.dumps(config, sort_keys=True)
+
+
+def hyperparameter_grid(metrics=METRICS, p_values=P_VALUES):
+    """Function to get the configs to test, without the equivalent configs
+
+    Returns:
+        list: The parameters of NearestNeighbors of each config
+    """
+    configs = {}
+    for metric, p in product(metrics, p_values):
+        config = canonical_config(metric, p)
+        configs.setdefault(config_key(config), config)
+    return list(configs.values())
+
+
+def algorithm_configs(algorithms=ALGORITHMS, leaf_sizes=LEAF_SIZES):
+    """Function to get the tree algorithms to time, without the equivalent ones ( leaf_size is not used by the brute
+    force algorithm )
+
+    Returns:
+        list: The algorithm and the leaf_size of each config
+    """
+    configs = {}
+    for algorithm, leaf_size in product(algorithms, leaf_sizes):
+        config = {"algorithm": algorithm} if algorithm == "brute" else {"algorithm": algorithm, "leaf_size": leaf_size}
+        configs.setdefault(config_key(config), config)
+    return list(configs.values())
+
+
+def fit_and_query(config, features, n_neighbors=50, batch_size=1024):
+    """Function to fit a config and to get the neighbors of all the movies
+
+    Args:
+        config (dict): The parameters of NearestNeighbors
+        features (np.ndarray): The features of the movies
+        n_neighbors (int, optional): The number of recommendations by movie. Defaults to 50.
+        batch_size (int, optional): The number of movies by kneighbors call. Defaults to 1024.
+
+    Returns:
+        tuple: The rows of the neighbors of each movie ( the first is the movie itself ), the fit time and the query
+               time ( in seconds )
+    """
+    start = time.perf_counter()
+    nn = NearestNeighbors(n_neighbors=n_neighbors + 1, **config)
+    nn.fit(features)
+    fit_seconds = time.perf_counter() - start
+
+    # We get the neighbors of all the movies by batch
+    start = time.perf_counter()
+    rows = np.concatenate([nn.kneighbors(features[i:i + batch_size], return_distance=False)
+                           for i in range(0, len(features), batch_size)])
+    return rows, fit_seconds, time.perf_counter() - start
+
+
+def evaluate_config(config, features, movie_ids, engine, n_neighbors=50, batch_size=1024):
+    """Function to fit a config and to score the recommendations of all the movies
+
+    Args:
+        config (dict): The parameters of NearestNeighbors
+        features (np.ndarray): The features of the movies
+        movie_ids (np.ndarray): The index in the scoring engine of the movie of each row
+        engine (ScoringEngine): The engine to score the recommendations
+        n_neighbors (int, optional): The number of recommendations by movie. Defaults to 50.
+        batch_size (int, optional): The number of movies by kneighbors call. Defaults to 1024.
+
+    Returns:
+        dict: The config, his scores ( mean and max by movie ) and his fit and query timings
+    """
+    rows, fit_seconds, query_seconds = fit_and_query(config, features, n_neighbors, batch_size)
+    scores = engine.score_many(movie_ids, movie_ids[rows[:, 1:]])
+    return {"params": config,
+            "score": float(scores.mean()),
+            "max_score": float(scores.max()),
+            "fit_seconds": fit_seconds,
+            "query_seconds": query_seconds}
+
+
+def time_algorithm(config, features, n_neighbors=50, batch_size=1024):
+    """Function to time the fit and the queries of a config, without scoring its recommendations ( the tree algorithms
+    of an exact search have the same recommendations )
+
+    Args:
+        config (dict): The parameters of NearestNeighbors ( with the algorithm and the leaf_size )
+        features (np.ndarray): The features of the movies
+        n_neighbors (int, optional): The number of recommendations by movie. Defaults to 50.
+        batch_size (int, optional): The number of movies by kneighbors call. Defaults to 1024.
+
+    Returns:
+        dict: The config and his fit and query timings
+    """
+    _, fit_seconds, query_seconds = fit_and_query(config, features, n_neighbors, batch_size)
+    return {"params": config, "fit_seconds": fit_seconds, "query_seconds": query_seconds}
+
+
+def search_key(features, movie_ids, n_neighbors):
+    """Function to get what identifies a search, besides the configs: the scores of 2 searches can be compared only
+    with the same features ( they change with build_features ) and the same number of recommendations
+
+    Args:
+        features (np.ndarray): The features of the movies
+        movie_ids (np.ndarray): The index in the scoring engine of the movie of each row
+        n_neighbors (int): The number of recommendations by movie
+
+    Returns:
+        dict: The number of recommendations and a digest of the features
+    """
+    digest = hashlib.sha256(np.ascontiguousarray(movie_ids, dtype=np.int64))
+    digest.update(np.ascontiguousarray(features, dtype=np.float32))
+    return {"n_neighbors": int(n_neighbors), "features": digest.hexdigest()[:16]}
+
+
+def load_checkpoint(path, search):
+    """Function to load the results already computed
+
+    Args:
+        path (pathlib.Path): The checkpoint file ( the search key, then 1 JSON result by line )
+        search (dict): The key of the search ( see search_key )
+
+    Raises:
+        ValueError: If the checkpoint is the checkpoint of another search
+
+    Returns:
+        dict: The result of each config key
+    """
+    if not path.exists():
+        return {}
+    with open(path) as f:
+        lines = [json.loads(line) for line in f if line.strip()]
+    if not lines or lines[0].get("search") != search:
+        raise ValueError(f"The checkpoint {path} is not the checkpoint of this search "
+                         "( the number of recommendations or the features changed )")
+    return {config_key(result["params"]): result for result in lines[1:]}
+
+
+def run_search(configs, features, movie_ids, engine, checkpoint_path, n_neighbors=50, batch_size=1024, n_jobs=-1,
+               callback=None):
+    """Function to evaluate the configs in a process pool, the results are checkpointed to resume the search
+
+    Args:
+        configs (list): The parameters of NearestNeighbors of each config
+        features (np.ndarray): The features of the movies
+        movie_ids (np.ndarray): The index in the scoring engine of the movie of each row
+        engine (ScoringEngine): The engine to score the recommendations
+        checkpoint_path (pathlib.Path): The checkpoint file
+        n_neighbors (int, optional): The number of recommendations by movie. Defaults to 50.
+        batch_size (int, optional): The number of movies by kneighbors call. Defaults to 1024.
+        n_jobs (int, optional): The number of processes. Defaults to -1 ( all the CPUs ).
+        callback (callable, optional): A function called with each new result. Defaults to None.
+
+    Raises:
+        ValueError: If the checkpoint is the checkpoint of another search ( see load_checkpoint )
+
+    Returns:
+        list: The results of all the configs, the best first
+    """
+    search = search_key(features, movie_ids, n_neighbors)
+    results = load_checkpoint(checkpoint_path, search)
+    if not checkpoint_path.exists():
+        with open(checkpoint_path, "w") as f:
+            f.write(json.dumps({"search": search}) + "\n")
+    todo = [config for config in configs if config_key(config) not in results]
+
+    tasks = (joblib.delayed(evaluate_config)(config, features, movie_ids, engine, n_neighbors, batch_size)
+             for config in todo)
+    with open(checkpoint_path, "a") as f:
+        for result in joblib.Parallel(n_jobs=n_jobs, return_as="generator")(tasks):
+            # We save each result as soon as we get it
+            f.write(json.dumps(result) + "\n")
+            f.flush()
+            results[config_key(result["params"])] = result
+            if callback is not None:
+                callback(result)
+
+    results = [results[config_key(config)] for config in configs]
+    return sorted(results, key=lambda result: result["score"], reverse=True)
@@ -0,0 +1,257 @@
+import hashlib
+import json
+import logging
+
+import numpy as np
+import pandas as pd
+
+from .catalog import DATA_DIR
+from .files import replace_file
+
+
+logger = logging.getLogger(__name__)
+
+# The version of the feature pipeline, increment it when the pipeline changes ( the artifacts are in FEATURES_DIR )
+FEATURES_VERSION = 2
+FEATURES_DIR = DATA_DIR / "features" / f"v{FEATURES_VERSION}"
+
+# The columns of the movies used by the pipeline ( see data/preprocessing.ipynb )
+TEXTUAL_COLUMNS = ["director_name", "actor_1_name", "actor_2_name", "actor_3_name", "language", "country",
+                   "age_category"]
+NUMERIC_COLUMNS = ["num_critic_for_reviews", "duration", "director_facebook_likes", "actor_3_facebook_likes",
+                   "actor_1_facebook_likes", "gross", "num_voted_users", "cast_total_facebook_likes",
+                   "num_user_for_reviews", "budget", "title_year", "actor_2_facebook_likes", "imdb_score",
+                   "movie_facebook_likes"]
+# All the columns read by the pipeline ( the other columns of the catalog are not loaded to build the features )
+PIPELINE_COLUMNS = [*TEXTUAL_COLUMNS, *NUMERIC_COLUMNS, "genres"]
+# We use the logarithm to reduce the skewness of these columns
+LOG_COLUMNS = ["num_critic_for_reviews", "director_facebook_likes", "actor_3_facebook_likes",
+               "actor_1_facebook_likes", "num_voted_users", "cast_total_facebook_likes", "num_user_for_reviews",
+               "actor_2_facebook_likes", "movie_facebook_likes", "gross", "budget"]
+
+# The number of components of the TruncatedSVD ( the dimension of the features ), and its number of power
+# iterations ( more iterations don't improve the scores of the recommendations )
+SVD_COMPONENTS = 256
+SVD_ITERATIONS = 2
+
+
+class FeaturePipeline:
+    """The pipeline to compute the features of the movies, it follows data/preprocessing.ipynb:
+        - one-hot encoding of the textual columns
+        - standard scaling of the numeric columns ( log scaled for the skewed ones )
+        - one-hot encoding of the genres, twice ( as run, the notebook encodes the whole genres string
+          and its keywords block encodes the genres again, we keep it to get the same features )
+        - TruncatedSVD to keep SVD_COMPONENTS components
+
+    The notebook encodes the movies in a dense matrix with a column by director and by actor, then a dense PCA,
+    their memory and time grow with the movies times the names: we keep the encoding in a sparse CSR matrix, and
+    TruncatedSVD reduces it without densifying it
+
+    Args:
+        textual_encoder (pp.OneHotEncoder): The encoder of the textual columns
+        scaler (pp.StandardScaler): The scaler of the numeric columns
+        genres_encoder (pp.OneHotEncoder): The encoder of the genres
+        svd (dc.TruncatedSVD): The TruncatedSVD
+        fit_loss (float, optional): The part of the encoded movies of the fit lost by the TruncatedSVD
+                                    ( see reconstruction_loss ). Defaults to None.
+    """
+    def __init__(self, textual_encoder, scaler, genres_encoder, svd, fit_loss=None):
+        self.textual_encoder = textual_encoder
+        self.scaler = scaler
+        self.genres_encoder = genres_encoder
+        self.svd = svd
+        self.fit_loss = fit_loss
+
+    @staticmethod
+    def scale_numeric(df):
+        """Method to get the numeric columns with the logarithm of the skewed ones"""
+        numeric = df[NUMERIC_COLUMNS].astype(float)
+        numeric[LOG_COLUMNS] = np.log(numeric[LOG_COLUMNS] + 1)
+        return numeric
+
+    @classmethod
+    def fit(cls, movies, n_components=SVD_COMPONENTS):
+        """Method to fit the encoders, the scaler and the TruncatedSVD on the movies
+
+        Args:
+            movies (pd.DataFrame): The movies dataframe ( the cleaned data )
+            n_components (int, optional): The number of components ( less for the small catalogs ).
+                                          Defaults to SVD_COMPONENTS.
+
+        Returns:
+            FeaturePipeline: The fitted pipeline
+        """
+        # sklearn is imported when we fit or load a pipeline, the workers which only read the features don't import it
+        from sklearn import decomposition as dc, preprocessing as pp
+
+        textual_encoder = pp.OneHotEncoder(handle_unknown="ignore", dtype=np.float32)
+        textual_encoder.fit(movies[TEXTUAL_COLUMNS])
+        scaler = pp.StandardScaler()
+        scaler.fit(cls.scale_numeric(movies))
+        genres_encoder = pp.OneHotEncoder(handle_unknown="ignore", dtype=np.float32)
+        genres_encoder.fit(movies[["genres"]])
+
+        pipeline = cls(textual_encoder, scaler, genres_encoder, None)
+        encoded = pipeline.encode(movies)
+        pipeline.svd = dc.TruncatedSVD(n_components=min(n_components, min(encoded.shape) - 1),
+                                       n_iter=SVD_ITERATIONS, random_state=0)
+        pipeline.svd.fit(encoded)
+        pipeline.fit_loss = pipeline.reconstruction_loss(encoded)
+        return pipeline
+
+    @property
+    def n_components(self):
+        return self.svd.n_components
+
+    @property
+    def explained_variance(self):
+        """The part of the variance of the encoded movies of the fit kept by the TruncatedSVD"""
+        return float(self.svd.explained_variance_ratio_.sum())
+
+    def encode(self, movies):
+        """Method to encode the movies before the TruncatedSVD
+
+        Args:
+            movies (pd.DataFrame): A movies dataframe
+
+        Returns:
+            scipy.sparse.csr_matrix: The encoded movies ( float32, 1 row per movie )
+        """
+        # scipy is imported when we encode movies, like sklearn
+        from scipy import sparse
+
+        genres = self.genres_encoder.transform(movies[["genres"]])
+        numeric = self.scaler.transform(self.scale_numeric(movies)).astype(np.float32)
+        return sparse.hstack([self.textual_encoder.transform(movies[TEXTUAL_COLUMNS]),
+                              sparse.csr_matrix(numeric),
+                              genres,
+                              genres], format="csr", dtype=np.float32)
+
+    def reconstruction_loss(self, encoded):
+        """Method to get the part of encoded movies lost by the TruncatedSVD
+
+        The rows of components_ are orthonormal: the squared norm lost is the squared norm of the encoded movies minus
+        the squared norm of their features ( we don't reconstruct the dense encoding )
+
+        Args:
+            encoded (scipy.sparse.csr_matrix): The encoded movies ( see encode )
+
+        Returns:
+            float: The part lost
+        """
+        kept = (self.svd.transform(encoded).astype(float) ** 2).sum()
+        return float(1 - kept / max(encoded.power(2).sum(dtype=float), np.finfo(float).tiny))
+
+    def transform(self, movies):
+        """Method to compute the features of the movies
+
+        Args:
+            movies (pd.DataFrame): A movies dataframe
+
+        Returns:
+            np.ndarray: The features of the movies ( float32, 1 row per movie )
+        """
+        return self.svd.transform(self.encode(movies)).astype(np.float32)
+
+
+def save_features(movie_ids, features, pipeline, build_seconds=None, directory=FEATURES_DIR, fitted_movies=None,
+                  changed_movies=0):
+    """Function to save the features in a .npy file, with the pipeline and a manifest
+
+    Args:
+        movie_ids (np.ndarray): The index in the catalog of the movie of each row of features
+        features (np.ndarray): The features of the movies
+        pipeline (FeaturePipeline): The fitted pipeline
+        build_seconds (float, optional): The build time of the features. Defaults to None.
+        directory (pathlib.Path, optional): The directory of the files. Defaults to FEATURES_DIR.
+        fitted_movies (int, optional): The number of movies the pipeline is fitted on. Defaults to None ( all ).
+        changed_movies (int, optional): The number of movies added or removed since the fit ( see app/updates.py ).
+                                        Defaults to 0.
+    """
+    import joblib
+    import sklearn
+
+    # Each file is replaced at once, so the workers which memory-mapped the old files keep reading them
+    directory.mkdir(parents=True, exist_ok=True)
+    with replace_file(directory / "movie_ids.npy") as path:
+        np.save(path, np.asarray(movie_ids, dtype=np.int32))
+    with replace_file(directory / "features.npy") as path:
+        np.save(path, np.ascontiguousarray(features, dtype=np.float32))
+    with replace_file(directory / "pipeline.joblib") as path:
+        joblib.dump(pipeline, path)
+
+    manifest = {"version": FEATURES_VERSION,
+                "movies": len(movie_ids),
+                "components": int(features.shape[1]),
+                "explained_variance": pipeline.explained_variance,
+                "reconstruction_loss": pipeline.fit_loss,
+                "fitted_movies": len(movie_ids) if fitted_movies is None else fitted_movies,
+                "changed_movies": changed_movies,
+                "build_seconds": build_seconds,
+                "sklearn_version": sklearn.__version__}
+    with replace_file(directory / "features.json") as path, open(path, "w") as f:
+        json.dump(manifest, f, indent=4)
+
+
+def load_manifest(directory=FEATURES_DIR):
+    """Function to load the manifest saved by save_features
+
+    Args:
+        directory (pathlib.Path, optional): The directory of the files. Defaults to FEATURES_DIR.
+
+    Returns:
+        dict: The manifest
+    """
+    with open(directory / "features.json") as f:
+        return json.load(f)
+
+
+def features_digest(directory=FEATURES_DIR):
+    """Function to get a short digest of the manifest of the features, it changes each time they are saved
+    ( the neighbor tables keep the digest of the features they are built with )
+
+    Args:
+        directory (pathlib.Path, optional): The directory of the files. Defaults to FEATURES_DIR.
+
+    Returns:
+        str: The digest, or None if the features are not built
+    """
+    try:
+        return hashlib.sha256((directory / "features.json").read_bytes()).hexdigest()[:16]
+    except FileNotFoundError:
+        return None
+
+
+def load_pipeline(directory=FEATURES_DIR):
+    """Function to load the pipeline saved by save_features
+
+    Args:
+        directory (pathlib.Path, optional): The directory of the files. Defaults to FEATURES_DIR.
+
+    Returns:
+        FeaturePipeline: The fitted pipeline
+    """
+    import joblib
+
+    return joblib.load(directory / "pipeline.joblib")
+
+
+def load_features(directory=FEATURES_DIR, mmap_mode="r"):
+    """Function to load the features of the movies
+
+    If they are not built ( with 'python manage.py build_features' ), we read the output of data/preprocessing.ipynb
+
+    Args:
+        directory (pathlib.Path, optional): The directory of the files. Defaults to FEATURES_DIR.
+        mmap_mode (str, optional): The numpy mmap_mode of the features. Defaults to "r".
+
+    Returns:
+        tuple: The indexes in the catalog of the movies and their features
+    """
+    try:
+        return np.load(directory / "movie_ids.npy"), np.load(directory / "features.npy", mmap_mode=mmap_mode)
+    except FileNotFoundError:
+        logger.warning("The features are not built, we read preprocessed_data.csv.gz "
+                       "(run 'python manage.py build_features')")
+        df_ML = pd.read_csv(DATA_DIR / "preprocessed_data.csv.gz", index_col=0)
+        return df_ML.index.to_numpy(), df_ML.to_numpy()
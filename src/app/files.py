@@ -0,0 +1,24 @@
+import os
+from contextlib import contextmanager
+
+
+@contextmanager
+def replace_file(path):
+    """Context manager to write a file at once: we write a temporary file next to it, then we replace the file
+
+    The processes which memory-mapped the old file keep reading it ( it's removed when they close it ), they never
+    read a file being written
+
+    Args:
+        path (pathlib.Path): The path of the file
+
+    Yields:
+        pathlib.Path: The path of the temporary file to write ( with the same suffix, np.save doesn't add one )
+    """
+    tmp_path = path.with_name(f"{path.stem}.tmp{path.suffix}")
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
@@ -0,0 +1,71 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app.benchmarks import benchmark_report, compare_reports, run_benchmarks
+from project.settings import BASE_DIR
+
+
+RESULTS_DIR = BASE_DIR / "benchmark_results"
+
+
+class Command(BaseCommand):
+    help = "Time the paths of a recommendation on synthetic catalogs, write a JSON report in benchmark_results " \
+           "and compare it with a baseline"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", nargs="+", type=int, default=[5_000, 50_000, 500_000],
+                            help="The numbers of movies of the synthetic catalogs")
+        parser.add_argument("--repeat", type=int, default=3,
+                            help="The number of calls by measure ( we keep the best )")
+        parser.add_argument("--queries", type=int, default=20,
+                            help="The number of movies we search the neighbors of")
+        parser.add_argument("--components", type=int, default=128,
+                            help="The dimension of the features of the index")
+        parser.add_argument("--max-memory", type=float, default=4,
+                            help="The largest memory of the TruncatedSVD of FeaturePipeline we fit ( in GB )")
+        parser.add_argument("--output", default=str(RESULTS_DIR / "benchmark.json"),
+                            help="The path of the JSON report")
+        parser.add_argument("--baseline",
+                            help="The path of a JSON report to compare with ( the command fails on a regression )")
+        parser.add_argument("--tolerance", type=float, default=0.25,
+                            help="The slowdown allowed before a regression ( 0.25 is 25%% slower )")
+
+    def handle(self, *args, **options):
+        results = {}
+        for size in options["sizes"]:
+            start = time.perf_counter()
+            results[size] = run_benchmarks(size, repeat=options["repeat"], queries=options["queries"],
+                                           components=options["components"],
+                                           max_memory=int(options["max_memory"] * 1024 ** 3))
+            self.stdout.write(f"{size} movies ( {time.perf_counter() - start:.1f}s )")
+            for name, result in results[size].items():
+                value = f"{result['seconds'] * 1000:.2f} ms" if "seconds" in result else f"skipped: {result['skipped']}"
+                self.stdout.write(f"    {name:>24} {value}")
+
+        # We write the report
+        report = benchmark_report(results)
+        output = BASE_DIR / options["output"]
+        output.parent.mkdir(parents=True, exist_ok=True)
+        with open(output, "w") as f:
+            json.dump(report, f, indent=4)
+        self.stdout.write(self.style.SUCCESS(f"Report saved in {output}"))
+
+        # And we compare it with the baseline
+        if options["baseline"]:
+            with open(BASE_DIR / options["baseline"]) as f:
+                baseline = json.load(f)
+            try:
+                regressions = compare_reports(report, baseline, options["tolerance"])
+            except ValueError as e:
+                raise CommandError(str(e))
+
+            for regression in regressions:
+                self.stdout.write(self.style.ERROR(
+                    f"{regression['size']} movies, {regression['benchmark']}: "
+                    f"{regression['baseline'] * 1000:.2f} ms -> {regression['seconds'] * 1000:.2f} ms "
+                    f"({regression['ratio']:.2f}x)"))
+            if regressions:
+                raise CommandError(f"{len(regressions)} regressions compared to {options['baseline']}")
+            self.stdout.write(self.style.SUCCESS(f"No regression compared to {options['baseline']}"))
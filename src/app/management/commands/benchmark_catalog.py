@@ -0,0 +1,62 @@
+import json
+import tempfile
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+
+from app.benchmarks import directory_size, load_benchmarks, synthetic_movies
+from app.catalog import CATALOG_CSV, read_catalog_csv
+from app.columnar import ColumnarCatalog
+from app.features import PIPELINE_COLUMNS
+from project.settings import BASE_DIR
+
+
+RESULTS_DIR = BASE_DIR / "benchmark_results"
+
+
+class Command(BaseCommand):
+    help = "Compare the load time and the resident memory of the CSV file and of the columnar files of the catalog, " \
+           "on the catalog and on a larger synthetic catalog, and write a JSON report in benchmark_results"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scale", type=int, default=100,
+                            help="The size of the synthetic catalog, in number of times the catalog")
+        parser.add_argument("--columns", nargs="+", default=PIPELINE_COLUMNS,
+                            help="The columns of the projected loads ( the columns of the feature pipeline )")
+        parser.add_argument("--repeat", type=int, default=3,
+                            help="The number of loads by measure ( we keep the best time )")
+        parser.add_argument("--output", default=str(RESULTS_DIR / "catalog.json"),
+                            help="The path of the JSON report")
+
+    def handle(self, *args, **options):
+        catalog = read_catalog_csv(CATALOG_CSV)
+        catalogs = {"catalog": catalog, "synthetic": synthetic_movies(len(catalog) * options["scale"])}
+
+        report = {"columns": options["columns"], "results": {}}
+        for name, movies in catalogs.items():
+            with tempfile.TemporaryDirectory() as directory:
+                # We write the same movies in a CSV file and in columnar files
+                path = Path(directory) / "cleaned_data.csv"
+                movies.to_csv(path, index=False)
+                ColumnarCatalog.from_frame(read_catalog_csv(path)).save(Path(directory) / "catalog")
+
+                results = {"movies": len(movies),
+                           "csv_bytes": path.stat().st_size,
+                           "columnar_bytes": directory_size(Path(directory) / "catalog"),
+                           "loads": load_benchmarks(path, Path(directory) / "catalog", options["columns"],
+                                                    options["repeat"])}
+            report["results"][name] = results
+
+            self.stdout.write(f"{name}: {results['movies']} movies, CSV {results['csv_bytes'] / 1024 ** 2:.1f} MB, "
+                              f"columnar {results['columnar_bytes'] / 1024 ** 2:.1f} MB")
+            self.stdout.write(f"    {'load':>24} {'time (ms)':>10} {'resident (MB)':>14} {'peak (MB)':>10}")
+            for load, result in results["loads"].items():
+                self.stdout.write(f"    {load:>24} {result['seconds'] * 1000:>10.1f} "
+                                  f"{result['rss_bytes'] / 1024 ** 2:>14.1f} "
+                                  f"{result['peak_rss_bytes'] / 1024 ** 2:>10.1f}")
+
+        output = BASE_DIR / options["output"]
+        output.parent.mkdir(parents=True, exist_ok=True)
+        with open(output, "w") as f:
+            json.dump(report, f, indent=4)
+        self.stdout.write(self.style.SUCCESS(f"Report written in {output}"))
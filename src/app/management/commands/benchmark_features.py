@@ -0,0 +1,43 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from app.benchmarks import features_benchmarks
+from app.catalog import get_catalog
+from project.settings import BASE_DIR
+
+
+RESULTS_DIR = BASE_DIR / "benchmark_results"
+
+
+class Command(BaseCommand):
+    help = "Measure the time and the peak memory of the fit of the features on synthetic catalogs larger than the " \
+           "catalog, with the sparse pipeline and with the dense PCA of data/preprocessing.ipynb"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scales", nargs="+", type=int, default=[1, 10, 100],
+                            help="The sizes of the synthetic catalogs, in number of times the catalog")
+        parser.add_argument("--max-memory", type=float, default=1,
+                            help="The largest dense encoding we fit the dense PCA on ( in GB )")
+        parser.add_argument("--output", default=str(RESULTS_DIR / "features.json"),
+                            help="The path of the JSON report")
+
+    def handle(self, *args, **options):
+        results = {}
+        self.stdout.write(f"{'movies':>8} {'columns':>8} {'fit':>10} {'time (s)':>9} {'peak (MB)':>10}")
+        for scale in options["scales"]:
+            size = len(get_catalog()) * scale
+            results[size] = features_benchmarks(size, max_memory=int(options["max_memory"] * 1024 ** 3))
+            for name in ["sparse_svd", "dense_pca"]:
+                result = results[size][name]
+                if "skipped" in result:
+                    measure = f"skipped: {result['skipped']}"
+                else:
+                    measure = f"{result['seconds']:>9.1f} {result['peak_rss_bytes'] / 1024 ** 2:>10.0f}"
+                self.stdout.write(f"{size:>8} {results[size]['encoded_columns']:>8} {name:>10} {measure}")
+
+        output = BASE_DIR / options["output"]
+        output.parent.mkdir(parents=True, exist_ok=True)
+        with open(output, "w") as f:
+            json.dump({str(size): size_results for size, size_results in results.items()}, f, indent=4)
+        self.stdout.write(self.style.SUCCESS(f"Report written in {output}"))
@@ -0,0 +1,85 @@
+import time
+
+import numpy as np
+import pandas as pd
+from django.core.management.base import BaseCommand
+
+from app.catalog import get_catalog
+from app.utils import filter_recommendations
+
+
+def reference_filter_recommendations(df, choices, nb=5):
+    """The previous filter_recommendations ( pd.concat of the durations and sorts with apply ), to compare"""
+    languages = choices["languages"]
+    if languages:
+        df = df[df["language"].isin(languages)]
+
+    durations = choices["duration"]
+    if durations:
+        temp_df = None
+        if "0" in durations:
+            temp_df = pd.concat([temp_df, df[df["duration"] < 90]])
+        if "1" in durations:
+            temp_df = pd.concat([temp_df, df[(df["duration"] >= 90) & (df["duration"] < 120)]])
+        if "2" in durations:
+            temp_df = pd.concat([temp_df, df[(df["duration"] >= 120) & (df["duration"] < 180)]])
+        if "3" in durations:
+            temp_df = pd.concat([temp_df, df[df["duration"] >= 180]])
+        if len(temp_df):
+            df = temp_df
+
+    filter_choice = choices["filter"]
+    if filter_choice == "genres" and choices["genres"]:
+        df = df.sort_values(by="genres", ascending=False,
+                            key=lambda x: x.apply(lambda y: sum(1 for genre in y.split("|")
+                                                                if genre in choices["genres"])))
+    elif filter_choice == "actors" and choices["actors"]:
+        df = df.sort_values(by="actor_1_name", ascending=False,
+                            key=lambda x: x.apply(lambda y: 1 if y in choices["actors"] else 0))
+    elif filter_choice == "directors" and choices["directors"]:
+        df = df.sort_values(by="director_name", ascending=False,
+                            key=lambda x: x.apply(lambda y: 1 if y in choices["directors"] else 0))
+
+    return df.iloc[:nb, :]
+
+
+def best_time(func, repeat):
+    """Function to get the best time of several calls of a function ( in seconds )"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+class Command(BaseCommand):
+    help = "Compare filter_recommendations with the previous implementation on candidate pools of several sizes"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", nargs="+", type=int, default=[50, 500, 5_000, 50_000],
+                            help="The numbers of candidates")
+        parser.add_argument("--repeat", type=int, default=5,
+                            help="The number of calls by measure ( we keep the best )")
+
+    def handle(self, *args, **options):
+        movies = get_catalog().movies
+        rng = np.random.default_rng(0)
+
+        # The choices of a user with a filter of each type
+        choices = {"languages": ["English", "French"], "duration": ["1", "2"],
+                   "genres": ["Drama", "Comedy"], "actors": movies["actor_1_name"].iloc[:20].tolist(),
+                   "directors": movies["director_name"].iloc[:20].tolist()}
+
+        self.stdout.write(f"{'candidates':>10} {'filter':>10} {'previous (ms)':>14} {'current (ms)':>13} "
+                          f"{'speedup':>8}")
+        for size in options["sizes"]:
+            # The candidates are random movies of the catalog ( with replacement for the large pools )
+            df = movies.iloc[rng.choice(len(movies), size=size, replace=size > len(movies))]
+            for filter_choice in ["genres", "actors", "directors"]:
+                filter_choices = {**choices, "filter": filter_choice}
+                previous = best_time(lambda: reference_filter_recommendations(df, filter_choices, 10),
+                                     options["repeat"])
+                current = best_time(lambda: filter_recommendations(df, filter_choices, 10), options["repeat"])
+                self.stdout.write(f"{size:>10} {filter_choice:>10} {previous * 1000:>14.2f} "
+                                  f"{current * 1000:>13.2f} {previous / current:>7.1f}x")
@@ -0,0 +1,86 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from django.contrib.sessions.backends.db import SessionStore
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from app.catalog import get_catalog
+from app.tokens import make_token, read_token
+from app.utils import get_recommendations_idx
+
+
+def session_handoff(movie_id, nb, age_category):
+    """The hand-off with the session: a write in the questionnaire, then a read in the result page"""
+    session = SessionStore()
+    session["title"] = get_catalog().title(movie_id)
+    session["nb"] = nb
+    session["recommendations_idx"] = get_recommendations_idx(movie_id, nb, age_category).tolist()
+    session.save()
+    SessionStore(session_key=session.session_key).get("recommendations_idx")
+    return session.session_key
+
+
+def token_handoff(movie_id, nb, age_category):
+    """The hand-off with a token: we sign it in the questionnaire, then we check it and we recompute the indexes"""
+    token = make_token(movie_id, nb, age_category)
+    movie_id, nb, age_category = read_token(token)
+    get_recommendations_idx(movie_id, nb, age_category)
+
+
+def run(handoff, movie_ids, workers):
+    """Function to run the hand-offs of several movies in parallel
+
+    Returns:
+        tuple: The latencies ( in seconds ), the number of errors, the total time and the results of the hand-offs
+    """
+    def timed_handoff(movie_id):
+        start = time.perf_counter()
+        try:
+            result, error = handoff(int(movie_id), 5, "adult"), False
+        except Exception:
+            result, error = None, True
+        finally:
+            # Each thread has its own database connection
+            connection.close()
+        return time.perf_counter() - start, error, result
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(timed_handoff, movie_ids))
+    total = time.perf_counter() - start
+    return (np.array([latency for latency, _, _ in results]), sum(error for _, error, _ in results), total,
+            [result for _, _, result in results])
+
+
+class Command(BaseCommand):
+    help = "Compare the hand-off of the recommendations to the result page with the session and with a signed token"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", nargs="+", type=int, default=[1, 4, 16],
+                            help="The numbers of concurrent requests")
+        parser.add_argument("--requests", type=int, default=500,
+                            help="The number of hand-offs by measure")
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(0)
+        catalog = get_catalog()
+        movie_ids = rng.choice(len(catalog), size=options["requests"])
+
+        # We warm up the catalog and the neighbors
+        token_handoff(int(movie_ids[0]), 5, "adult")
+
+        self.stdout.write(f"{'handoff':>8} {'workers':>8} {'req/s':>9} {'p50 (ms)':>9} {'p99 (ms)':>9} {'errors':>7}")
+        session_keys = []
+        for workers in options["workers"]:
+            for name, handoff in [("session", session_handoff), ("token", token_handoff)]:
+                latencies, errors, total, results = run(handoff, movie_ids, workers)
+                if handoff is session_handoff:
+                    session_keys += [session_key for session_key in results if session_key is not None]
+                self.stdout.write(f"{name:>8} {workers:>8} {len(movie_ids) / total:>9.0f} "
+                                  f"{np.percentile(latencies, 50) * 1000:>9.2f} "
+                                  f"{np.percentile(latencies, 99) * 1000:>9.2f} {errors:>7}")
+
+        # We delete the sessions of the benchmark
+        SessionStore.get_model_class().objects.filter(session_key__in=session_keys).delete()
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from app.benchmarks import deferred_imports, import_times
+
+
+class Command(BaseCommand):
+    help = "Measure the imports of a new worker ( python -X importtime ) and check that it doesn't import the " \
+           "modules it needs only to fit the features or to scrap IMDB"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--module", default="app.urls",
+                            help="The module the worker imports after django.setup()")
+        parser.add_argument("--top", type=int, default=15,
+                            help="The number of slowest imports we show")
+
+    def handle(self, *args, **options):
+        times = import_times(options["module"])
+        self.stdout.write(f"{options['module']} imported in {times.get(options['module'], 0) * 1000:.0f} ms, "
+                          f"{len(times)} modules imported")
+
+        # We show the slowest top-level packages
+        slowest = sorted(((seconds, module) for module, seconds in times.items() if "." not in module),
+                         reverse=True)[:options["top"]]
+        for seconds, module in slowest:
+            self.stdout.write(f"    {module:>24} {seconds * 1000:.0f} ms")
+
+        deferred = deferred_imports(times)
+        if deferred:
+            raise CommandError(f"The worker imports {', '.join(deferred)}")
+        self.stdout.write(self.style.SUCCESS("The worker imports none of the deferred modules"))
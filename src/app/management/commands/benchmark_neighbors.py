@@ -0,0 +1,82 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from app.catalog import get_catalog
+from app.features import load_features
+from app.neighbors import IVF_N_PROBE, IVFIndex, NeighborIndex, recall_at_k
+from app.utils import score
+
+
+def search(index, query_ids, n_neighbors):
+    """Function to search the neighbors of each query alone, like a request
+
+    Returns:
+        tuple: The neighbors of each query ( 1 row per query ) and the latency of each query ( in seconds )
+    """
+    neighbor_ids, latencies = [], []
+    for query_id in query_ids:
+        start = time.perf_counter()
+        neighbor_ids.append(index.kneighbors(query_id, n_neighbors)[1])
+        latencies.append(time.perf_counter() - start)
+    return np.array(neighbor_ids), np.array(latencies)
+
+
+class Command(BaseCommand):
+    help = "Compare the approximate neighbor backend ( ivf ) with the exact search: recall@k, latency and score"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--size", type=int, default=0,
+                            help="The number of movies of the index, the catalog is extended with noisy copies of "
+                                 "its movies to simulate a larger catalog ( 0 for the catalog only )")
+        parser.add_argument("--n-probe", nargs="+", type=int, default=sorted({4, 8, IVF_N_PROBE, 32}),
+                            help="The numbers of clusters searched by query")
+        parser.add_argument("--queries", type=int, default=200,
+                            help="The number of movies of the catalog we search the neighbors of")
+        parser.add_argument("--nb", type=int, default=5,
+                            help="The number of recommendations ( we search nb * 10 neighbors )")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options["seed"])
+        catalog = get_catalog()
+        catalog_ids, features = load_features()
+        features = np.asarray(features, dtype=np.float32)
+
+        # The catalog id of each movie of the index ( the noisy copies have the id of their movie )
+        sources = catalog_ids
+        if options["size"] > len(features):
+            copies = rng.integers(len(features), size=options["size"] - len(features))
+            noise = rng.normal(size=(len(copies), features.shape[1])).astype(np.float32) * 0.1 * features.std(axis=0)
+            features = np.vstack([features, features[copies] + noise])
+            sources = np.concatenate([catalog_ids, catalog_ids[copies]])
+        movie_ids = np.arange(len(features))
+
+        indexes = {}
+        for name, backend in [("exact", NeighborIndex), ("ivf", IVFIndex)]:
+            start = time.perf_counter()
+            indexes[name] = backend.fit(features, movie_ids)
+            self.stdout.write(f"{name}: fitted on {len(features)} movies in {time.perf_counter() - start:.1f}s")
+        self.stdout.write(f"ivf: {indexes['ivf'].n_lists} clusters")
+
+        # The queries are movies of the catalog, so their recommendations can be scored
+        query_ids = rng.choice(len(catalog_ids), size=min(options["queries"], len(catalog_ids)), replace=False)
+        n_neighbors = options["nb"] * 10
+
+        def mean_score(neighbor_ids):
+            """The mean score of the recommendations ( see utils.score )"""
+            return np.mean([score(catalog.take([sources[query_id]]), catalog.take(sources[neighbors]))
+                            for query_id, neighbors in zip(query_ids, neighbor_ids)])
+
+        expected_ids, latencies = search(indexes["exact"], query_ids, n_neighbors)
+        self.stdout.write(f"\n{'backend':>8} {'n_probe':>8} {f'recall@{n_neighbors}':>10} {'mean (ms)':>10} "
+                          f"{'p95 (ms)':>9} {'score':>7}")
+        self.stdout.write(f"{'exact':>8} {'':>8} {1:>10.3f} {latencies.mean() * 1000:>10.2f} "
+                          f"{np.percentile(latencies, 95) * 1000:>9.2f} {mean_score(expected_ids):>7.2f}")
+        for n_probe in options["n_probe"]:
+            indexes["ivf"].n_probe = n_probe
+            neighbor_ids, latencies = search(indexes["ivf"], query_ids, n_neighbors)
+            self.stdout.write(f"{'ivf':>8} {n_probe:>8} {recall_at_k(expected_ids, neighbor_ids):>10.3f} "
+                              f"{latencies.mean() * 1000:>10.2f} {np.percentile(latencies, 95) * 1000:>9.2f} "
+                              f"{mean_score(neighbor_ids):>7.2f}")
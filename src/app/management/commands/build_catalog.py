@@ -0,0 +1,33 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from app.catalog import CATALOG_CSV, COLUMNAR_DIR, read_catalog_csv
+from app.columnar import ColumnarCatalog, memory_report
+
+
+class Command(BaseCommand):
+    help = "Encode the catalog in compact arrays memory-mapped by the worker processes, with a memory report"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4,
+                            help="The number of worker processes in the memory report")
+
+    def handle(self, *args, **options):
+        # We encode the movies of the CSV file, and we save the arrays in COLUMNAR_DIR
+        df = read_catalog_csv(CATALOG_CSV)
+        columnar = ColumnarCatalog.from_frame(df)
+        columnar.save(COLUMNAR_DIR)
+
+        # We compare the memory of the dataframe ( 1 copy by worker ) with the shared arrays
+        report = {"1": memory_report(df, columnar),
+                  str(options["workers"]): memory_report(df, columnar, options["workers"])}
+        with open(COLUMNAR_DIR / "memory_report.json", "w") as f:
+            json.dump(report, f, indent=4)
+
+        for workers_report in report.values():
+            self.stdout.write(f"{workers_report['workers']} worker(s): "
+                              f"dataframe {workers_report['dataframe_nbytes'] / 1024 ** 2:.2f} MB, "
+                              f"columnar {workers_report['columnar_nbytes'] / 1024 ** 2:.2f} MB "
+                              f"({workers_report['ratio']:.1%})")
+        self.stdout.write(self.style.SUCCESS(f"Catalog saved in {COLUMNAR_DIR}: {len(columnar)} movies"))
@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from app.catalog import read_catalog
+from app.features import FEATURES_DIR, PIPELINE_COLUMNS, FeaturePipeline, save_features
+
+
+class Command(BaseCommand):
+    help = "Compute the features of the movies ( see data/preprocessing.ipynb ) and save them in memory-mappable files"
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+
+        # We fit the pipeline on the catalog and we compute the features of all the movies ( we only read the
+        # columns of the pipeline )
+        movies = read_catalog(PIPELINE_COLUMNS)
+        pipeline = FeaturePipeline.fit(movies)
+        features = pipeline.transform(movies)
+        build_seconds = time.perf_counter() - start
+
+        # And we save them in FEATURES_DIR
+        save_features(movies.index.to_numpy(), features, pipeline, build_seconds)
+
+        self.stdout.write(f"{len(movies)} movies x {pipeline.n_components} components "
+                          f"({pipeline.explained_variance:.2%} of the variance)")
+        self.stdout.write(self.style.SUCCESS(f"Features saved in {FEATURES_DIR} in {build_seconds:.1f}s "
+                                             "( run build_indexes and build_neighbor_tables to refit the indexes "
+                                             "and the neighbor tables, the outdated tables are ignored )"))
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from app.catalog import get_catalog
+from app.features import load_features
+from app.neighbors import INDEXES_DIR, NEIGHBOR_BACKENDS, build_indexes, save_indexes
+
+
+class Command(BaseCommand):
+    help = "Fit the neighbor index of each age category and serialize them with joblib"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--backend", choices=list(NEIGHBOR_BACKENDS), default="exact",
+                            help="The neighbor backend ( exact: sklearn NearestNeighbors, ivf: approximate )")
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+
+        # We fit the indexes on the preprocessed features
+        movie_ids, features = load_features()
+        indexes = build_indexes(movie_ids, features, get_catalog().frame(["age_category"]), options["backend"])
+
+        # And we save them in INDEXES_DIR
+        save_indexes(indexes, backend=options["backend"])
+
+        for age_category, index in indexes.items():
+            self.stdout.write(f"{age_category}: {len(index)} movies")
+        self.stdout.write(self.style.SUCCESS(f"Indexes saved in {INDEXES_DIR} "
+                                             f"in {time.perf_counter() - start:.1f}s "
+                                             "( run build_neighbor_tables if the features changed )"))
@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from app.neighbors import INDEXES_DIR, MAX_NB, build_neighbor_table, get_indexes, save_neighbor_tables
+
+
+class Command(BaseCommand):
+    help = "Precompute the nearest neighbors of every movie in every age category ( run build_indexes before )"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--max-nb", type=int, default=MAX_NB,
+                            help="The largest number of recommendations answered by the tables")
+        parser.add_argument("--batch-size", type=int, default=256,
+                            help="The number of movies by kneighbors call")
+        parser.add_argument("--jobs", type=int, default=-1,
+                            help="The number of parallel workers ( -1 for all the CPUs )")
+
+    def handle(self, *args, **options):
+        tables = {}
+        build_seconds = {}
+        # The tables are exact, so we build them with the exact indexes whatever the NEIGHBORS_BACKEND setting
+        for age_category, index in get_indexes("exact").items():
+            start = time.perf_counter()
+            tables[age_category] = build_neighbor_table(index,
+                                                        max_nb=options["max_nb"],
+                                                        batch_size=options["batch_size"],
+                                                        n_jobs=options["jobs"])
+            build_seconds[age_category] = time.perf_counter() - start
+
+            table = tables[age_category]
+            self.stdout.write(f"{age_category}: {len(table)} movies x {table.max_neighbors} neighbors, "
+                              f"{table.nbytes / 1024 ** 2:.2f} MB in {build_seconds[age_category]:.1f}s")
+
+        # We save the tables and the report ( neighbor_tables.json ) in INDEXES_DIR
+        save_neighbor_tables(tables, build_seconds)
+
+        total_nbytes = sum(table.nbytes for table in tables.values())
+        self.stdout.write(self.style.SUCCESS(f"Neighbor tables saved in {INDEXES_DIR}: "
+                                             f"{total_nbytes / 1024 ** 2:.2f} MB "
+                                             f"in {sum(build_seconds.values()):.1f}s"))
@@ -0,0 +1,91 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app.cross_validation import ALGORITHMS, LEAF_SIZES, METRICS, P_VALUES, algorithm_configs, hyperparameter_grid, \
+    run_search, search_key, time_algorithm
+from app.features import load_features
+from app.scoring import get_scoring_engine
+from project.settings import BASE_DIR
+
+
+LOG_DIR = BASE_DIR / "cross_validation_logs"
+
+
+class Command(BaseCommand):
+    help = "Search the best metric of the NearestNeighbors, then the fastest tree algorithm for this metric, and " \
+           "write a JSON report in cross_validation_logs"
+
+    # LAST RESULT ( with the old cross_validation )
+    # best_score: 88.99999999999997
+    # best_params: {'algorithm': 'auto', 'leaf_size': 10, 'metric': 'manhattan', 'p_value': 1}
+
+    def add_arguments(self, parser):
+        parser.add_argument("--algorithms", nargs="+", default=ALGORITHMS,
+                            help="The tree algorithms timed with the best metric ( they have the same score )")
+        parser.add_argument("--leaf-sizes", nargs="+", type=int, default=LEAF_SIZES,
+                            help="The leaf sizes timed with the best metric")
+        parser.add_argument("--metrics", nargs="+", default=METRICS)
+        parser.add_argument("--p-values", nargs="+", type=int, default=P_VALUES)
+        parser.add_argument("--neighbors", type=int, default=50,
+                            help="The number of recommendations by movie")
+        parser.add_argument("--batch-size", type=int, default=1024,
+                            help="The number of movies by kneighbors call")
+        parser.add_argument("--jobs", type=int, default=-1,
+                            help="The number of processes ( -1 for all the CPUs )")
+        parser.add_argument("--restart", action="store_true",
+                            help="Don't resume from the checkpoint of the last search")
+
+    def handle(self, *args, **options):
+        LOG_DIR.mkdir(exist_ok=True)
+        checkpoint_path = LOG_DIR / "checkpoint.jsonl"
+        if options["restart"]:
+            checkpoint_path.unlink(missing_ok=True)
+
+        # We get the configs to test without the equivalent configs
+        configs = hyperparameter_grid(options["metrics"], options["p_values"])
+        self.stdout.write(f"{len(configs)} configs to test")
+
+        movie_ids, features = load_features()
+
+        def print_result(result):
+            self.stdout.write(f"{result['params']}: score {result['score']:.4f}, "
+                              f"fit {result['fit_seconds']:.2f}s, query {result['query_seconds']:.2f}s")
+
+        start = time.perf_counter()
+        try:
+            results = run_search(configs, features, movie_ids, get_scoring_engine(), checkpoint_path,
+                                 n_neighbors=options["neighbors"],
+                                 batch_size=options["batch_size"],
+                                 n_jobs=options["jobs"],
+                                 callback=print_result)
+        except ValueError as e:
+            raise CommandError(f"{e}, run the search with --restart")
+
+        # The tree algorithms give the same neighbors, we only time them with the best metric ( 1 by 1, so they
+        # don't share the CPUs )
+        timings = []
+        for algorithm in algorithm_configs(options["algorithms"], options["leaf_sizes"]):
+            timing = time_algorithm({**algorithm, **results[0]["params"]}, features, options["neighbors"],
+                                    options["batch_size"])
+            self.stdout.write(f"{timing['params']}: fit {timing['fit_seconds']:.2f}s, "
+                              f"query {timing['query_seconds']:.2f}s")
+            timings.append(timing)
+        timings.sort(key=lambda timing: timing["query_seconds"])
+
+        # We write the report, the best metric with the fastest algorithm first
+        report = {"movies": len(movie_ids),
+                  "neighbors": options["neighbors"],
+                  "features": search_key(features, movie_ids, options["neighbors"])["features"],
+                  "seconds": time.perf_counter() - start,
+                  "best_params": timings[0]["params"],
+                  "best_score": results[0]["score"],
+                  "results": results,
+                  "timings": timings}
+        with open(LOG_DIR / "report.json", "w") as f:
+            json.dump(report, f, indent=4)
+
+        self.stdout.write(self.style.SUCCESS(f"best_score: {report['best_score']}\n"
+                                             f"best_params: {report['best_params']}\n"
+                                             f"Report saved in {LOG_DIR / 'report.json'}"))
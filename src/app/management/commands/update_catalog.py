@@ -0,0 +1,137 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from app.catalog import CATALOG_CSV, COLUMNAR_DIR, get_catalog, read_catalog_csv
+from app.columnar import ColumnarCatalog
+from app.features import (FEATURES_DIR, FeaturePipeline, features_digest, load_features, load_manifest, load_pipeline,
+                          save_features)
+from app.files import replace_file
+from app.neighbors import (INDEXES_DIR, NEIGHBOR_BACKENDS, build_indexes, build_neighbor_table, index_filename,
+                           load_indexes, load_neighbor_tables, save_indexes, save_neighbor_tables)
+from app.updates import MAX_CHANGED, MAX_LOSS_RATIO, MAX_UNKNOWN, CatalogUpdate
+
+
+class Command(BaseCommand):
+    help = ("Add and remove movies without preprocessing and fitting everything again: the added movies are "
+            "transformed with the fitted pipeline and inserted in the indexes, unless the catalog drifted too much")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--add", help="A CSV file of the added movies ( with the columns of cleaned_data.csv )")
+        parser.add_argument("--remove", nargs="+", default=[], help="The titles of the removed movies")
+        parser.add_argument("--remove-ids", nargs="+", type=int, default=[],
+                            help="The indexes in the catalog of the removed movies")
+        parser.add_argument("--max-changed", type=float, default=MAX_CHANGED,
+                            help="The part of the movies added or removed since the fit beyond which we rebuild")
+        parser.add_argument("--max-unknown", type=float, default=MAX_UNKNOWN,
+                            help="The part of unknown textual values beyond which we rebuild")
+        parser.add_argument("--max-loss-ratio", type=float, default=MAX_LOSS_RATIO,
+                            help="The ratio of the part lost by the TruncatedSVD beyond which we rebuild")
+        parser.add_argument("--force-rebuild", action="store_true",
+                            help="Fit the pipeline, the features and the indexes again on the whole catalog")
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        if not (FEATURES_DIR / "features.json").exists():
+            raise CommandError("The features aren't built, run build_features and build_indexes before")
+
+        # We find the removed movies, and we read the added movies
+        catalog = get_catalog()
+        removed_ids = set(options["remove_ids"])
+        for title in options["remove"]:
+            idx = catalog.find_title(title)
+            if idx is None:
+                raise CommandError(f"The movie '{title}' is not in the catalog")
+            removed_ids.add(idx)
+        if any(idx < 0 or idx >= len(catalog) for idx in removed_ids):
+            raise CommandError(f"The indexes in the catalog are between 0 and {len(catalog) - 1}")
+
+        try:
+            added = read_catalog_csv(options["add"]) if options["add"] else catalog.movies.iloc[:0]
+            update = CatalogUpdate(catalog.movies, added, sorted(removed_ids))
+        except ValueError as e:
+            raise CommandError(str(e))
+        if not update.n_changed:
+            self.stdout.write("Nothing to update")
+            return
+
+        # We measure the drift of the catalog since the fit of the pipeline
+        pipeline = load_pipeline()
+        manifest = load_manifest()
+        drift = update.drift(pipeline, manifest, options["max_changed"], options["max_unknown"],
+                             options["max_loss_ratio"])
+        self.stdout.write(f"{len(update.added)} added, {update.n_removed} removed: "
+                          f"{drift['changed']:.1%} of the movies changed since the fit, "
+                          f"{drift['unknown']:.1%} of unknown values, part lost x{drift['loss_ratio']:.2f}")
+
+        # We write the new catalog ( the files are replaced at once, the running workers keep reading the old ones )
+        with replace_file(CATALOG_CSV) as path:
+            update.movies.to_csv(path, index=False)
+        if (COLUMNAR_DIR / "catalog.json").exists():
+            ColumnarCatalog.from_frame(update.movies).save(COLUMNAR_DIR)
+
+        # The indexes of the other backends are updated only if they are built
+        backends = [backend for backend in NEIGHBOR_BACKENDS
+                    if (INDEXES_DIR / index_filename("adult", backend)).exists()]
+        # The neighbor tables are updated only if they are built, with the current features ( else they are built
+        # again, see get_neighbor_tables )
+        tables_report = None
+        if (INDEXES_DIR / "neighbor_tables.json").exists():
+            with open(INDEXES_DIR / "neighbor_tables.json") as f:
+                tables_report = json.load(f)
+            tables_report["outdated"] = tables_report.get("features") != features_digest()
+
+        if drift["rebuild"] or options["force_rebuild"]:
+            self.rebuild(update, backends, tables_report)
+        else:
+            self.update(update, manifest, pipeline, backends, tables_report)
+
+        self.stdout.write(self.style.SUCCESS(f"Catalog updated: {len(update.movies)} movies "
+                                             f"in {time.perf_counter() - start:.1f}s "
+                                             "( restart the server to load it )"))
+
+    def rebuild_tables(self, indexes, tables_report):
+        """Method to build the neighbor tables again with the exact indexes, with the same number of neighbors"""
+        max_nb = tables_report["adult"]["max_neighbors"] // 10
+        save_neighbor_tables({age_category: build_neighbor_table(index, max_nb)
+                              for age_category, index in indexes.items()})
+
+    def rebuild(self, update, backends, tables_report):
+        """Method to fit the pipeline, the features and the indexes again on the whole catalog"""
+        self.stdout.write("Fitting everything again")
+        pipeline = FeaturePipeline.fit(update.movies)
+        features = pipeline.transform(update.movies)
+        movie_ids = update.movies.index.to_numpy()
+        save_features(movie_ids, features, pipeline)
+
+        indexes = {}
+        for backend in backends:
+            indexes[backend] = build_indexes(movie_ids, features, update.movies, backend)
+            save_indexes(indexes[backend], backend=backend)
+        if tables_report is not None:
+            # The tables are built with the exact indexes, we fit them in memory if their files aren't built
+            exact = indexes.get("exact") or build_indexes(movie_ids, features, update.movies, "exact")
+            self.rebuild_tables(exact, tables_report)
+
+    def update(self, update, manifest, pipeline, backends, tables_report):
+        """Method to transform the added movies and to insert them in the features and the indexes"""
+        self.stdout.write("Updating the features and the indexes")
+        # We load copies of the arrays, not memory-maps: we replace their files
+        movie_ids, features = update.update_features(*load_features(mmap_mode=None), pipeline)
+        save_features(movie_ids, features, pipeline,
+                      fitted_movies=manifest.get("fitted_movies", manifest["movies"]),
+                      changed_movies=manifest.get("changed_movies", 0) + update.n_changed)
+
+        added_features = features[len(movie_ids) - len(update.added):]
+        indexes = {}
+        for backend in backends:
+            indexes[backend] = update.update_indexes(load_indexes(mmap_mode=None, backend=backend), added_features)
+            save_indexes(indexes[backend], backend=backend)
+        if tables_report is not None:
+            # The tables are updated with the exact indexes, we fit them in memory if their files aren't built
+            exact = indexes.get("exact") or build_indexes(movie_ids, features, update.movies, "exact")
+            if tables_report["outdated"]:
+                self.rebuild_tables(exact, tables_report)
+            else:
+                save_neighbor_tables(update.update_neighbor_tables(load_neighbor_tables(mmap_mode=None), exact))
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.3 on 2026-10-17 16:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Thumbnail',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('movie_url', models.CharField(max_length=255, unique=True)),
+                ('thumbnail_url', models.CharField(blank=True, max_length=1024, null=True)),
+                ('fetched_at', models.DateTimeField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,13 @@
+from django.db import models
+
+
+class Thumbnail(models.Model):
+    """The thumbnail URL of a movie scraped on IMDB ( see app/thumbnails.py )"""
+    movie_url = models.CharField(max_length=255, unique=True)
+
+    # None if we didn't find the thumbnail ( negative caching )
+    thumbnail_url = models.CharField(max_length=1024, null=True, blank=True)
+    fetched_at = models.DateTimeField()
+
+    def __str__(self):
+        return self.movie_url
@@ -0,0 +1,768 @@
+import hashlib
+import json
+import logging
+from functools import lru_cache
+
+import numpy as np
+from django.conf import settings
+
+from .catalog import DATA_DIR, get_catalog
+from .features import FEATURES_DIR, features_digest, load_features
+from .files import replace_file
+from .timing import timer
+
+
+logger = logging.getLogger(__name__)
+
+INDEXES_DIR = DATA_DIR / "indexes"
+
+AGE_CATEGORIES = ["adult", "teenager", "child"]
+
+# BESTS HYPERPARAMETERS ( see the cross_validation command )
+# {'algorithm': 'auto', 'leaf_size': 10, 'metric': 'manhattan', 'p': 1}
+NN_PARAMS = {"algorithm": "auto", "leaf_size": 10, "metric": "manhattan", "p": 1}
+
+# The largest number of recommendations answered by the neighbor tables ( we keep MAX_NB * 10 + 1 neighbors )
+MAX_NB = 10
+
+# The number of clusters searched by query by the approximate backend ( see IVFIndex and benchmark_neighbors )
+IVF_N_PROBE = 16
+
+
+class NeighborIndex:
+    """A NearestNeighbors model fitted on the movies of one age category
+
+    Args:
+        nn (NearestNeighbors): The fitted model
+        features (np.ndarray): The features the model is fitted on ( 1 row per movie )
+        movie_ids (np.ndarray): The index in the catalog of the movie of each row
+    """
+    def __init__(self, nn, features, movie_ids):
+        self.nn = nn
+        self.features = features
+        self.movie_ids = movie_ids
+        self.rows = {movie_id: row for row, movie_id in enumerate(movie_ids.tolist())}
+
+    @classmethod
+    def fit(cls, features, movie_ids):
+        """Method to fit a NearestNeighbors model on some movies
+
+        Args:
+            features (np.ndarray): The features of the movies ( 1 row per movie )
+            movie_ids (np.ndarray): The index in the catalog of the movie of each row
+
+        Returns:
+            NeighborIndex: The fitted index
+        """
+        # sklearn is imported when we fit or load an exact index, the NumPy backends and the neighbor tables
+        # don't import it ( see get_neighbors_source )
+        from sklearn.neighbors import NearestNeighbors
+
+        features = np.ascontiguousarray(features, dtype=np.float64)
+        nn = NearestNeighbors(**NN_PARAMS)
+        nn.fit(features)
+        return cls(nn, features, np.asarray(movie_ids))
+
+    def __len__(self):
+        return len(self.movie_ids)
+
+    def __contains__(self, movie_id):
+        return movie_id in self.rows
+
+    def kneighbors(self, movie_id, n_neighbors):
+        """Method to get the nearest neighbors of a movie
+
+        Args:
+            movie_id (int): The index in the catalog of the movie
+            n_neighbors (int): The number of neighbors ( the movie itself is not counted )
+
+        Returns:
+            tuple: The distances and the indexes in the catalog of the neighbors
+        """
+        distances, neighbor_ids = self.kneighbors_many([movie_id], n_neighbors)
+        return distances[0], neighbor_ids[0]
+
+    def kneighbors_many(self, movie_ids, n_neighbors):
+        """Method to get the nearest neighbors of several movies with a single kneighbors call
+
+        Args:
+            movie_ids (iterable): The indexes in the catalog of the movies
+            n_neighbors (int): The number of neighbors by movie ( the movie itself is not counted )
+
+        Returns:
+            tuple: The distances and the indexes in the catalog of the neighbors ( 1 row per movie )
+        """
+        rows = [self.rows[movie_id] for movie_id in movie_ids]
+        n_neighbors = min(n_neighbors + 1, len(self))
+        distances, neighbor_rows = self.nn.kneighbors(self.features[rows], n_neighbors=n_neighbors)
+
+        # We remove the first neighbor, it's the input movie
+        return distances[:, 1:], self.movie_ids[neighbor_rows[:, 1:]]
+
+    def update(self, mapping, features, movie_ids):
+        """Method to get the index after an update of the catalog ( the features of the other movies don't change )
+
+        sklearn can't add movies to a fitted model, so we fit it again ( it's fast, it only indexes the features )
+
+        Args:
+            mapping (np.ndarray): The new index in the catalog of each movie ( -1 for the removed movies )
+            features (np.ndarray): The features of the added movies
+            movie_ids (np.ndarray): The index in the new catalog of the added movies
+
+        Returns:
+            NeighborIndex: The updated index
+        """
+        new_ids = mapping[self.movie_ids]
+        keep = new_ids >= 0
+        return NeighborIndex.fit(np.vstack([self.features[keep], features]),
+                                 np.concatenate([new_ids[keep], movie_ids]))
+
+
+class IVFIndex:
+    """An approximate index of the movies of one age category, with NumPy only ( for the very large catalogs )
+
+    It's an inverted file: the movies are clustered with a k-means ( the coarse quantizer ), then to search the
+    neighbors of a movie, we compute the exact manhattan distances to the movies of the n_probe nearest clusters only
+
+    Args:
+        centroids (np.ndarray): The centroid of each cluster ( float32 )
+        features (np.ndarray): The features of the movies, sorted by cluster ( float32, 1 row per movie )
+        movie_ids (np.ndarray): The index in the catalog of the movie of each row
+        offsets (np.ndarray): The first row of each cluster ( 1 more than the clusters )
+        n_probe (int, optional): The number of clusters searched by query. Defaults to IVF_N_PROBE.
+    """
+    def __init__(self, centroids, features, movie_ids, offsets, n_probe=None):
+        self.centroids = centroids
+        self.features = features
+        self.movie_ids = movie_ids
+        self.offsets = offsets
+        self.n_probe = n_probe or IVF_N_PROBE
+        self.rows = {movie_id: row for row, movie_id in enumerate(movie_ids.tolist())}
+
+    @classmethod
+    def fit(cls, features, movie_ids, n_lists=None, n_iter=10, sample_size=100_000, seed=0):
+        """Method to cluster the movies with a k-means and sort them by cluster
+
+        Args:
+            features (np.ndarray): The features of the movies ( 1 row per movie )
+            movie_ids (np.ndarray): The index in the catalog of the movie of each row
+            n_lists (int, optional): The number of clusters. Defaults to None ( the square root of the movies ).
+            n_iter (int, optional): The number of iterations of the k-means. Defaults to 10.
+            sample_size (int, optional): The number of movies used to fit the k-means. Defaults to 100_000.
+            seed (int, optional): The seed of the random initialization. Defaults to 0.
+
+        Returns:
+            IVFIndex: The fitted index
+        """
+        features = np.ascontiguousarray(features, dtype=np.float32)
+        movie_ids = np.asarray(movie_ids)
+        n_lists = min(n_lists or max(1, round(np.sqrt(len(features)))), len(features))
+
+        # We fit the k-means on a sample, it's enough to place the centroids
+        rng = np.random.default_rng(seed)
+        sample = features[rng.choice(len(features), size=min(sample_size, len(features)), replace=False)]
+        centroids = sample[rng.choice(len(sample), size=n_lists, replace=False)].copy()
+        for _ in range(n_iter):
+            labels = cls.nearest_centroids(centroids, sample, 1)[:, 0]
+            for cluster in range(n_lists):
+                members = sample[labels == cluster]
+                # An empty cluster keeps its centroid
+                if len(members):
+                    centroids[cluster] = members.mean(axis=0)
+
+        # We sort the movies by cluster, so the movies of a cluster are contiguous
+        labels = cls.nearest_centroids(centroids, features, 1)[:, 0]
+        order = np.argsort(labels, kind="stable")
+        offsets = np.zeros(n_lists + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(labels, minlength=n_lists))
+        return cls(centroids, features[order], movie_ids[order], offsets)
+
+    @staticmethod
+    def nearest_centroids(centroids, features, n, batch_size=4096):
+        """Method to get the nearest centroids of movies ( with the euclidean distance, it's a matrix product )
+
+        Args:
+            centroids (np.ndarray): The centroids
+            features (np.ndarray): The features of the movies
+            n (int): The number of centroids by movie
+            batch_size (int, optional): The number of movies by matrix product. Defaults to 4096.
+
+        Returns:
+            np.ndarray: The n nearest centroids of each movie, the nearest first
+        """
+        squared_norms = (centroids ** 2).sum(axis=1)
+        nearest = []
+        for start in range(0, len(features), batch_size):
+            # |x - c|² = |x|² - 2 x.c + |c|², |x|² is the same for all the centroids
+            distances = squared_norms - 2 * features[start:start + batch_size] @ centroids.T
+            batch = np.argpartition(distances, n - 1, axis=1)[:, :n] if n < len(centroids) else \
+                np.tile(np.arange(len(centroids)), (len(distances), 1))
+            order = np.argsort(np.take_along_axis(distances, batch, axis=1), axis=1)
+            nearest.append(np.take_along_axis(batch, order, axis=1))
+        return np.concatenate(nearest) if nearest else np.empty((0, n), dtype=np.intp)
+
+    def __len__(self):
+        return len(self.movie_ids)
+
+    def __contains__(self, movie_id):
+        return movie_id in self.rows
+
+    @property
+    def n_lists(self):
+        return len(self.centroids)
+
+    def kneighbors(self, movie_id, n_neighbors):
+        """Method to get the approximate nearest neighbors of a movie
+
+        Args:
+            movie_id (int): The index in the catalog of the movie
+            n_neighbors (int): The number of neighbors ( the movie itself is not counted )
+
+        Returns:
+            tuple: The distances and the indexes in the catalog of the neighbors
+        """
+        distances, neighbor_ids = self.kneighbors_many([movie_id], n_neighbors)
+        return distances[0], neighbor_ids[0]
+
+    def kneighbors_many(self, movie_ids, n_neighbors):
+        """Method to get the approximate nearest neighbors of several movies
+
+        Args:
+            movie_ids (iterable): The indexes in the catalog of the movies
+            n_neighbors (int): The number of neighbors by movie ( the movie itself is not counted )
+
+        Returns:
+            tuple: The distances and the indexes in the catalog of the neighbors ( 1 row per movie )
+        """
+        rows = [self.rows[movie_id] for movie_id in movie_ids]
+        n_neighbors = min(n_neighbors + 1, len(self))
+        queries = self.features[rows]
+        sizes = np.diff(self.offsets)
+
+        distances = np.empty((len(rows), n_neighbors), dtype=np.float64)
+        neighbor_rows = np.empty((len(rows), n_neighbors), dtype=np.intp)
+        for i, clusters in enumerate(self.nearest_centroids(self.centroids, queries, self.n_lists)):
+            # We search the n_probe nearest clusters, and more if they don't contain enough movies
+            n_probe = max(self.n_probe, np.searchsorted(np.cumsum(sizes[clusters]), n_neighbors) + 1)
+            candidates = np.concatenate([np.arange(self.offsets[cluster], self.offsets[cluster + 1])
+                                         for cluster in clusters[:n_probe]])
+
+            # We re-rank the candidates with the exact manhattan distance ( the movies of a cluster are contiguous,
+            # so we compute it on slices of the features, without copying the candidates )
+            candidate_distances = np.concatenate([
+                np.abs(self.features[self.offsets[cluster]:self.offsets[cluster + 1]] - queries[i]).sum(axis=1)
+                for cluster in clusters[:n_probe]
+            ]).astype(np.float64)
+            nearest = np.argpartition(candidate_distances, n_neighbors - 1)[:n_neighbors] \
+                if n_neighbors < len(candidates) else np.arange(len(candidates))
+            nearest = nearest[np.argsort(candidate_distances[nearest], kind="stable")]
+            distances[i] = candidate_distances[nearest]
+            neighbor_rows[i] = candidates[nearest]
+
+        # We remove the first neighbor, it's the input movie
+        return distances[:, 1:], self.movie_ids[neighbor_rows[:, 1:]]
+
+    def update(self, mapping, features, movie_ids):
+        """Method to get the index after an update of the catalog, the added movies go in their nearest cluster
+        ( the k-means is not fitted again )
+
+        Args:
+            mapping (np.ndarray): The new index in the catalog of each movie ( -1 for the removed movies )
+            features (np.ndarray): The features of the added movies
+            movie_ids (np.ndarray): The index in the new catalog of the added movies
+
+        Returns:
+            IVFIndex: The updated index
+        """
+        new_ids = mapping[self.movie_ids]
+        keep = new_ids >= 0
+        features = np.ascontiguousarray(features, dtype=np.float32).reshape(-1, self.features.shape[1])
+        labels = np.concatenate([np.repeat(np.arange(self.n_lists), np.diff(self.offsets))[keep],
+                                 self.nearest_centroids(self.centroids, features, 1)[:, 0]])
+
+        # We sort the movies by cluster again
+        order = np.argsort(labels, kind="stable")
+        offsets = np.zeros(self.n_lists + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(labels, minlength=self.n_lists))
+        return type(self)(self.centroids, np.vstack([self.features[keep], features])[order],
+                        np.concatenate([new_ids[keep], movie_ids])[order], offsets, self.n_probe)
+
+
+class BruteForceIndex(IVFIndex):
+    """An exact index of the movies of one age category, with NumPy only ( a worker which serves it doesn't import
+    sklearn ): it's an IVFIndex with 1 cluster, so the distances to all the movies are computed
+    """
+    @classmethod
+    def fit(cls, features, movie_ids):
+        """Method to index some movies ( there is nothing to fit, see IVFIndex.fit )"""
+        return super().fit(features, movie_ids, n_lists=1)
+
+    def kneighbors_many(self, movie_ids, n_neighbors, batch_size=256):
+        """Method to get the nearest neighbors of several movies
+
+        The distances are computed on batches of movies in a reused buffer, the temporary arrays stay in the CPU cache
+
+        Args:
+            movie_ids (iterable): The indexes in the catalog of the movies
+            n_neighbors (int): The number of neighbors by movie ( the movie itself is not counted )
+            batch_size (int, optional): The number of movies by batch. Defaults to 256.
+
+        Returns:
+            tuple: The distances and the indexes in the catalog of the neighbors ( 1 row per movie )
+        """
+        queries = self.features[[self.rows[movie_id] for movie_id in movie_ids]]
+        n_neighbors = min(n_neighbors + 1, len(self))
+
+        distances = np.empty((len(queries), len(self)), dtype=np.float32)
+        buffer = np.empty((min(batch_size, len(self)), self.features.shape[1]), dtype=np.float32)
+        for start in range(0, len(self), batch_size):
+            batch = self.features[start:start + batch_size]
+            batch_buffer = buffer[:len(batch)]
+            for i, query in enumerate(queries):
+                np.subtract(batch, query, out=batch_buffer)
+                np.abs(batch_buffer, out=batch_buffer)
+                batch_buffer.sum(axis=1, out=distances[i, start:start + batch_size])
+
+        nearest = np.argpartition(distances, n_neighbors - 1, axis=1)[:, :n_neighbors] \
+            if n_neighbors < len(self) else np.tile(np.arange(len(self)), (len(queries), 1))
+        nearest_distances = np.take_along_axis(distances, nearest, axis=1)
+        order = np.argsort(nearest_distances, axis=1, kind="stable")
+        nearest = np.take_along_axis(nearest, order, axis=1)
+
+        # We remove the first neighbor, it's the input movie
+        return (np.take_along_axis(nearest_distances, order, axis=1)[:, 1:].astype(np.float64),
+                self.movie_ids[nearest[:, 1:]])
+
+
+# The neighbor backends: the exact search of sklearn, the approximate search of IVFIndex, or the exact search of
+# BruteForceIndex
+NEIGHBOR_BACKENDS = {"exact": NeighborIndex, "ivf": IVFIndex, "numpy": BruteForceIndex}
+
+
+# The constant of the reciprocal rank fusion, it flattens the weights of the first ranks ( 60 is the usual value )
+RRF_K = 60
+
+
+def reciprocal_rank_fusion(neighbor_ids, exclude=(), k=RRF_K):
+    """Function to fuse the neighbor lists of several movies, each neighbor gets the sum of 1 / ( k + rank )
+    over the lists ( a neighbor of several movies is ranked before a neighbor of only 1 movie )
+
+    Args:
+        neighbor_ids (np.ndarray): The neighbors of each movie, the nearest first ( 1 row per movie )
+        exclude (iterable, optional): The movies removed from the fused list. Defaults to ().
+        k (int, optional): The constant of the fusion. Defaults to RRF_K.
+
+    Returns:
+        tuple: The scores and the neighbors of the fused list, the best first
+    """
+    neighbor_ids = np.asarray(neighbor_ids)
+    ranks = np.broadcast_to(np.arange(1, neighbor_ids.shape[1] + 1), neighbor_ids.shape)
+
+    # We sum the scores of each neighbor with its position in the sorted neighbors
+    candidates, inverse = np.unique(neighbor_ids, return_inverse=True)
+    scores = np.bincount(inverse.ravel(), weights=1 / (k + ranks.ravel()), minlength=len(candidates))
+
+    keep = ~np.isin(candidates, list(exclude))
+    candidates, scores = candidates[keep], scores[keep]
+    order = np.argsort(-scores, kind="stable")
+    return scores[order], candidates[order]
+
+
+def recall_at_k(expected_ids, neighbor_ids):
+    """Function to get the part of the exact neighbors found by an approximate search
+
+    Args:
+        expected_ids (np.ndarray): The exact neighbors of each movie ( 1 row per movie )
+        neighbor_ids (np.ndarray): The approximate neighbors of each movie ( 1 row per movie )
+
+    Returns:
+        float: The mean recall@k of the movies ( k is the number of exact neighbors )
+    """
+    return float(np.mean([len(np.intersect1d(expected, found)) / len(expected)
+                          for expected, found in zip(expected_ids, neighbor_ids)]))
+
+
+class NeighborTable:
+    """The nearest neighbors of every movie of one age category, precomputed by build_neighbor_table
+
+    Args:
+        movie_ids (np.ndarray): The index in the catalog of the movie of each row
+        neighbor_ids (np.ndarray): The index in the catalog of the neighbors of each movie ( int32 )
+        distances (np.ndarray): The distances of the neighbors of each movie ( float32 )
+    """
+    def __init__(self, movie_ids, neighbor_ids, distances):
+        self.movie_ids = movie_ids
+        self.neighbor_ids = neighbor_ids
+        self.distances = distances
+        self.rows = {movie_id: row for row, movie_id in enumerate(movie_ids.tolist())}
+
+    def __len__(self):
+        return len(self.movie_ids)
+
+    def __contains__(self, movie_id):
+        return movie_id in self.rows
+
+    @property
+    def nbytes(self):
+        return self.movie_ids.nbytes + self.neighbor_ids.nbytes + self.distances.nbytes
+
+    @property
+    def max_neighbors(self):
+        """The largest number of neighbors we can get ( the movie itself is not counted )"""
+        return self.neighbor_ids.shape[1] - 1
+
+    def kneighbors(self, movie_id, n_neighbors):
+        """Method to get the nearest neighbors of a movie, it's just a slice of the table
+
+        Args:
+            movie_id (int): The index in the catalog of the movie
+            n_neighbors (int): The number of neighbors ( the movie itself is not counted )
+
+        Returns:
+            tuple: The distances and the indexes in the catalog of the neighbors
+        """
+        if n_neighbors > self.max_neighbors:
+            raise ValueError(f"The table contains only {self.max_neighbors} neighbors by movie")
+        row = self.rows[movie_id]
+
+        # We remove the first neighbor, it's the input movie
+        return self.distances[row, 1:n_neighbors + 1], self.neighbor_ids[row, 1:n_neighbors + 1]
+
+    def kneighbors_many(self, movie_ids, n_neighbors):
+        """Method to get the nearest neighbors of several movies, it's just a slice of the table
+
+        Args:
+            movie_ids (iterable): The indexes in the catalog of the movies
+            n_neighbors (int): The number of neighbors by movie ( the movie itself is not counted )
+
+        Returns:
+            tuple: The distances and the indexes in the catalog of the neighbors ( 1 row per movie )
+        """
+        if n_neighbors > self.max_neighbors:
+            raise ValueError(f"The table contains only {self.max_neighbors} neighbors by movie")
+        rows = [self.rows[movie_id] for movie_id in movie_ids]
+        return self.distances[rows, 1:n_neighbors + 1], self.neighbor_ids[rows, 1:n_neighbors + 1]
+
+    def update(self, mapping, index, movie_ids):
+        """Method to get the table after an update of the catalog, without computing all the neighbors again:
+            - the rows of the removed movies are removed
+            - the rows with a removed neighbor are computed again with the index
+            - the added movies are merged in the other rows if they are nearer than their last neighbor
+            - the rows of the added movies are computed with the index
+
+        Args:
+            mapping (np.ndarray): The new index in the catalog of each movie ( -1 for the removed movies )
+            index (NeighborIndex): The exact index of the age category, already updated
+            movie_ids (np.ndarray): The index in the new catalog of the added movies of the age category
+
+        Returns:
+            NeighborTable: The updated table
+        """
+        n_neighbors = min(self.neighbor_ids.shape[1], len(index))
+        new_ids = mapping[self.movie_ids]
+        keep = new_ids >= 0
+        movie_ids_kept = new_ids[keep]
+        neighbor_ids = mapping[np.asarray(self.neighbor_ids[keep, :n_neighbors])]
+        distances = np.array(self.distances[keep, :n_neighbors])
+
+        # We merge the added movies in the rows ( the manhattan distance, like the index )
+        if len(movie_ids):
+            rows = np.array([index.rows[movie_id] for movie_id in movie_ids_kept.tolist()], dtype=np.intp)
+            added_features = index.features[[index.rows[movie_id] for movie_id in np.asarray(movie_ids).tolist()]]
+            added_distances = np.stack([np.abs(index.features[rows] - added).sum(axis=1)
+                                        for added in added_features], axis=1).astype(np.float32)
+            candidates = np.hstack([neighbor_ids, np.broadcast_to(np.asarray(movie_ids, dtype=np.int32),
+                                                                  added_distances.shape)])
+            candidate_distances = np.hstack([distances, added_distances])
+            order = np.argsort(candidate_distances, axis=1, kind="stable")[:, :n_neighbors]
+            neighbor_ids = np.take_along_axis(candidates, order, axis=1)
+            distances = np.take_along_axis(candidate_distances, order, axis=1)
+
+        # We compute again the rows with a removed neighbor, and we compute the rows of the added movies
+        stale = (neighbor_ids < 0).any(axis=1)
+        movie_ids_all = np.concatenate([movie_ids_kept, movie_ids]).astype(np.int32)
+        neighbor_ids = np.vstack([neighbor_ids, np.zeros((len(movie_ids), n_neighbors), dtype=np.int32)])
+        distances = np.vstack([distances, np.zeros((len(movie_ids), n_neighbors), dtype=np.float32)])
+        stale = np.concatenate([stale, np.ones(len(movie_ids), dtype=bool)])
+        if stale.any():
+            rows = [index.rows[movie_id] for movie_id in movie_ids_all[stale].tolist()]
+            stale_distances, stale_rows = _kneighbors_batch(index.nn, index.features[rows], n_neighbors)
+            neighbor_ids[stale] = np.asarray(index.movie_ids, dtype=np.int32)[stale_rows]
+            distances[stale] = stale_distances
+
+        return NeighborTable(movie_ids_all, neighbor_ids.astype(np.int32), distances.astype(np.float32))
+
+
+def _kneighbors_batch(nn, features, n_neighbors):
+    """Function to run kneighbors on a batch of rows ( in a joblib worker )"""
+    distances, rows = nn.kneighbors(features, n_neighbors=n_neighbors)
+    return distances.astype(np.float32), rows
+
+
+def build_neighbor_table(index, max_nb=MAX_NB, batch_size=256, n_jobs=-1):
+    """Function to compute the nearest neighbors of every movie of an index
+
+    Args:
+        index (NeighborIndex): The index of an age category
+        max_nb (int, optional): The largest number of recommendations to answer. Defaults to MAX_NB.
+        batch_size (int, optional): The number of movies by kneighbors call. Defaults to 256.
+        n_jobs (int, optional): The number of joblib workers. Defaults to -1 ( all the CPUs ).
+
+    Returns:
+        NeighborTable: The table of the neighbors of each movie of the index
+    """
+    import joblib
+
+    n_neighbors = min(max_nb * 10 + 1, len(index))
+    batches = joblib.Parallel(n_jobs=n_jobs)(
+        joblib.delayed(_kneighbors_batch)(index.nn, index.features[start:start + batch_size], n_neighbors)
+        for start in range(0, len(index), batch_size)
+    )
+
+    # We convert the rows of the index to indexes in the catalog
+    distances = np.concatenate([batch_distances for batch_distances, _ in batches])
+    rows = np.concatenate([batch_rows for _, batch_rows in batches])
+    neighbor_ids = np.asarray(index.movie_ids, dtype=np.int32)[rows]
+    return NeighborTable(np.asarray(index.movie_ids, dtype=np.int32), neighbor_ids, distances)
+
+
+def save_neighbor_tables(tables, build_seconds=None, directory=INDEXES_DIR):
+    """Function to save the neighbor tables in .npy files, with a report of their build time and size, and the digest
+    of the features they are built with ( see get_neighbor_tables )
+
+    Args:
+        tables (dict): The NeighborTable of each age category
+        build_seconds (dict, optional): The build time of each table. Defaults to None.
+        directory (pathlib.Path, optional): The directory of the files. Defaults to INDEXES_DIR.
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    report = {"features": features_digest()}
+    for age_category, table in tables.items():
+        # Each file is replaced at once, so the workers which memory-mapped the old files keep reading them
+        for name, array in [("movie_ids", table.movie_ids), ("neighbor_ids", table.neighbor_ids),
+                            ("distances", table.distances)]:
+            with replace_file(directory / f"{age_category}_{name}.npy") as path:
+                np.save(path, array)
+        report[age_category] = {"movies": len(table),
+                                "max_neighbors": table.max_neighbors,
+                                "nbytes": table.nbytes,
+                                "build_seconds": (build_seconds or {}).get(age_category)}
+
+    with replace_file(directory / "neighbor_tables.json") as path, open(path, "w") as f:
+        json.dump(report, f, indent=4)
+
+
+def load_neighbor_tables(directory=INDEXES_DIR, mmap_mode="r"):
+    """Function to load the neighbor tables saved by save_neighbor_tables
+
+    Args:
+        directory (pathlib.Path, optional): The directory of the files. Defaults to INDEXES_DIR.
+        mmap_mode (str, optional): The numpy mmap_mode of the arrays. Defaults to "r".
+
+    Returns:
+        dict: The NeighborTable of each age category
+    """
+    return {age_category: NeighborTable(np.load(directory / f"{age_category}_movie_ids.npy"),
+                                        np.load(directory / f"{age_category}_neighbor_ids.npy", mmap_mode=mmap_mode),
+                                        np.load(directory / f"{age_category}_distances.npy", mmap_mode=mmap_mode))
+            for age_category in AGE_CATEGORIES}
+
+
+def build_indexes(movie_ids, features, movies, backend="exact"):
+    """Function to fit an index for each age category
+
+    Args:
+        movie_ids (np.ndarray): The index in the catalog of the movie of each row of features
+        features (np.ndarray): The features of the movies
+        movies (pd.DataFrame): The movies dataframe ( to filter by age category )
+        backend (str, optional): The neighbor backend ( see NEIGHBOR_BACKENDS ). Defaults to "exact".
+
+    Returns:
+        dict: The index of each age category
+    """
+    # This import is here to avoid a circular import
+    from .utils import filter_by_age_category
+
+    indexes = {}
+    for age_category in AGE_CATEGORIES:
+        mask = np.isin(movie_ids, filter_by_age_category(movies, age_category).index)
+        indexes[age_category] = NEIGHBOR_BACKENDS[backend].fit(features[mask], movie_ids[mask])
+    return indexes
+
+
+def index_filename(age_category, backend="exact"):
+    """Function to get the file name of an index ( the exact indexes keep their original name )"""
+    return f"{age_category}.joblib" if backend == "exact" else f"{age_category}.{backend}.joblib"
+
+
+def save_indexes(indexes, directory=INDEXES_DIR, backend="exact"):
+    """Function to serialize the indexes with joblib ( 1 file per age category )
+
+    Args:
+        indexes (dict): The index of each age category
+        directory (pathlib.Path, optional): The directory of the files. Defaults to INDEXES_DIR.
+        backend (str, optional): The neighbor backend of the indexes. Defaults to "exact".
+    """
+    import joblib
+
+    directory.mkdir(parents=True, exist_ok=True)
+    for age_category, index in indexes.items():
+        # No compression, so the arrays can be memory-mapped when we load them ( and the file is replaced at once,
+        # so the workers which memory-mapped the old file keep reading it )
+        with replace_file(directory / index_filename(age_category, backend)) as path:
+            joblib.dump(index, path)
+
+
+def load_indexes(directory=INDEXES_DIR, mmap_mode="r", backend="exact"):
+    """Function to load the indexes serialized by save_indexes
+
+    Args:
+        directory (pathlib.Path, optional): The directory of the files. Defaults to INDEXES_DIR.
+        mmap_mode (str, optional): The joblib mmap_mode of the arrays. Defaults to "r".
+        backend (str, optional): The neighbor backend of the indexes. Defaults to "exact".
+
+    Returns:
+        dict: The index of each age category
+    """
+    import joblib
+
+    return {age_category: joblib.load(directory / index_filename(age_category, backend), mmap_mode=mmap_mode)
+            for age_category in AGE_CATEGORIES}
+
+
+@lru_cache(maxsize=None)
+def get_indexes(backend=None):
+    """Function to get the indexes of the process, they are loaded at the first call
+
+    If they are not built ( with 'python manage.py build_indexes' ), we fit them in memory
+
+    Args:
+        backend (str, optional): The neighbor backend. Defaults to None ( the NEIGHBORS_BACKEND setting ).
+
+    Returns:
+        dict: The index of each age category
+    """
+    backend = backend or settings.NEIGHBORS_BACKEND
+    try:
+        return load_indexes(backend=backend)
+    except FileNotFoundError:
+        logger.warning("The %s indexes are not built, we fit them in memory "
+                       "(run 'python manage.py build_indexes --backend %s')", backend, backend)
+        movie_ids, features = load_features()
+        return build_indexes(movie_ids, features, get_catalog().frame(["age_category"]), backend)
+
+
+@lru_cache(maxsize=None)
+def get_neighbor_tables():
+    """Function to get the neighbor tables of the process, they are loaded at the first call
+
+    The tables built with other features ( before the last build_features ) are ignored, we search the indexes
+
+    Returns:
+        dict: The NeighborTable of each age category, or None if they are not built or outdated
+    """
+    try:
+        with open(INDEXES_DIR / "neighbor_tables.json") as f:
+            report = json.load(f)
+        tables = load_neighbor_tables(INDEXES_DIR)
+    except FileNotFoundError:
+        return None
+    if report.get("features") != features_digest():
+        logger.warning("The neighbor tables are built with other features, we ignore them "
+                       "(run 'python manage.py build_neighbor_tables')")
+        return None
+    return tables
+
+
+@lru_cache(maxsize=None)
+def get_neighbors_version():
+    """Function to get a short digest of the files of the features, the indexes and the neighbor tables of the process
+    ( their size and modification time ), it changes when they are built again
+
+    Returns:
+        str: The version
+    """
+    paths = [FEATURES_DIR / "features.json", INDEXES_DIR / "neighbor_tables.json",
+             *[INDEXES_DIR / index_filename(age_category, settings.NEIGHBORS_BACKEND)
+               for age_category in AGE_CATEGORIES]]
+    digest = hashlib.sha256(settings.NEIGHBORS_BACKEND.encode())
+    for path in paths:
+        if path.exists():
+            stat = path.stat()
+            digest.update(f"{path.name}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+    return digest.hexdigest()[:16]
+
+
+def get_neighbors_source(n_neighbors, age_category="adult"):
+    """Function to get where we search the neighbors of the movies of an age category
+
+    Args:
+        n_neighbors (int): The number of neighbors by movie ( the movie itself is not counted )
+        age_category (str, optional): The age category. Defaults to "adult".
+
+    Returns:
+        NeighborTable or NeighborIndex or IVFIndex: The neighbor table if it's built and large enough,
+                                                   else the index of the NEIGHBORS_BACKEND setting
+    """
+    tables = get_neighbor_tables()
+    if tables is not None and n_neighbors <= tables[age_category].max_neighbors:
+        return tables[age_category]
+    return get_indexes()[age_category]
+
+
+def kneighbors(movie_id, n_neighbors, age_category="adult"):
+    """Function to get the nearest neighbors of a movie in an age category
+
+    We slice the neighbor table if it's built and large enough, else we query the index
+
+    Args:
+        movie_id (int): The index in the catalog of the movie
+        n_neighbors (int): The number of neighbors ( the movie itself is not counted )
+        age_category (str, optional): The age category. Defaults to "adult".
+
+    Returns:
+        tuple: The distances and the indexes in the catalog of the neighbors
+    """
+    # The indexes are loaded ( or fitted ) at the first call
+    with timer("indexes"):
+        source = get_neighbors_source(n_neighbors, age_category)
+    with timer("kneighbors"):
+        return source.kneighbors(movie_id, n_neighbors)
+
+
+def kneighbors_many(movie_ids, n_neighbors, age_category="adult"):
+    """Function to get the nearest neighbors of several movies in an age category ( with 1 batched search )
+
+    Args:
+        movie_ids (iterable): The indexes in the catalog of the movies
+        n_neighbors (int): The number of neighbors by movie ( the movie itself is not counted )
+        age_category (str, optional): The age category. Defaults to "adult".
+
+    Returns:
+        tuple: The distances and the indexes in the catalog of the neighbors ( 1 row per movie )
+    """
+    with timer("indexes"):
+        source = get_neighbors_source(n_neighbors, age_category)
+    with timer("kneighbors"):
+        return source.kneighbors_many(movie_ids, n_neighbors)
+
+
+def kneighbors_basket(movie_ids, n_neighbors, age_category="adult"):
+    """Function to get the recommendations of a basket of movies in an age category: the neighbors of all the movies
+    are searched with 1 batched search, then their lists are fused ( see reciprocal_rank_fusion )
+
+    Args:
+        movie_ids (iterable): The indexes in the catalog of the movies of the basket
+        n_neighbors (int): The number of neighbors ( the movies of the basket are not counted )
+        age_category (str, optional): The age category. Defaults to "adult".
+
+    Returns:
+        tuple: The fusion scores and the indexes in the catalog of the neighbors, the best first
+    """
+    movie_ids = list(dict.fromkeys(movie_ids))
+
+    # The list of a movie can contain the other movies of the basket, we get enough neighbors to remove them
+    _, neighbor_ids = kneighbors_many(movie_ids, n_neighbors + len(movie_ids) - 1, age_category)
+    with timer("fusion"):
+        scores, neighbor_ids = reciprocal_rank_fusion(neighbor_ids, movie_ids)
+    return scores[:n_neighbors], neighbor_ids[:n_neighbors]
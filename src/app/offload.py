@@ -0,0 +1,68 @@
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
+
+from django.conf import settings
+
+
+class Overloaded(Exception):
+    """Raised when all the workers are busy and the queue of the executor is full"""
+
+
+class BoundedExecutor:
+    """A thread pool to run the CPU-bound work of the async views, with a bounded queue
+
+    When max_workers tasks are running and max_queue tasks are waiting, the new tasks are rejected,
+    so a burst of requests gets fast errors instead of an ever-growing latency
+
+    Args:
+        max_workers (int): The number of threads
+        max_queue (int): The number of tasks which can wait for a thread
+    """
+    def __init__(self, max_workers, max_queue):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="recommendations")
+        self.pending = 0
+        self.lock = threading.Lock()
+
+    def release(self, future):
+        """Method called when a task is done ( even if the request which waited for it is cancelled )"""
+        with self.lock:
+            self.pending -= 1
+
+    async def run(self, func, *args, **kwargs):
+        """Method to run a function in a thread of the pool without blocking the event loop
+
+        Args:
+            func (callable): The function
+            *args: The arguments of the function
+            **kwargs: The keyword arguments of the function
+
+        Raises:
+            Overloaded: If the queue is full
+
+        Returns:
+            The result of the function
+        """
+        with self.lock:
+            if self.pending >= self.max_workers + self.max_queue:
+                raise Overloaded(f"{self.pending} tasks are running or waiting")
+            self.pending += 1
+
+        # The function runs in the context of the request ( for the timings of app/timing.py )
+        future = self.executor.submit(contextvars.copy_context().run, partial(func, *args, **kwargs))
+        future.add_done_callback(self.release)
+        return await asyncio.wrap_future(future)
+
+
+@lru_cache(maxsize=None)
+def get_cpu_executor():
+    """Function to get the executor of the process used for the recommendations
+
+    Returns:
+        BoundedExecutor: The shared executor
+    """
+    return BoundedExecutor(settings.RECOMMENDATIONS_WORKERS, settings.RECOMMENDATIONS_QUEUE_SIZE)
@@ -0,0 +1,134 @@
+import logging
+import queue
+import random
+import threading
+from collections import deque
+from functools import lru_cache
+
+import numpy as np
+from django.conf import settings
+
+from .scoring import get_scoring_engine
+
+
+logger = logging.getLogger(__name__)
+
+
+class QualityMonitor:
+    """The evaluation of the quality of the recommendations, out of the requests
+
+    A sample of the requests put their recommendations in a bounded queue ( if it's full, the sample is dropped ),
+    a background thread scores them ( see scoring.ScoringEngine ) and keeps the last scores of each age category
+    and number of recommendations
+
+    Args:
+        sample_rate (float): The part of the requests we score ( between 0 and 1 )
+        queue_size (int): The number of samples which can wait to be scored
+        window (int): The number of last scores kept for each age category and number of recommendations
+        seed (int, optional): The seed of the sampling. Defaults to None.
+    """
+    def __init__(self, sample_rate, queue_size, window, seed=None):
+        self.sample_rate = sample_rate
+        self.window = window
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.random = random.Random(seed)
+        self.scores = {}
+        self.submitted = 0
+        self.dropped = 0
+        self.errors = 0
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def submit(self, movie_id, indices, nb, age_category):
+        """Method to score the recommendations of a request, if the request is sampled ( it never blocks )
+
+        Args:
+            movie_id (int): The index in the catalog of the movie the user chosen
+            indices (np.ndarray): The indexes in the catalog of the recommendations
+            nb (int): The number of recommendations the user wants
+            age_category (str): The age category
+
+        Returns:
+            bool: True if the recommendations will be scored
+        """
+        if self.sample_rate <= 0 or self.random.random() >= self.sample_rate:
+            return False
+
+        self.start()
+        try:
+            self.queue.put_nowait((movie_id, indices, nb, age_category))
+        except queue.Full:
+            with self.lock:
+                self.dropped += 1
+            return False
+        with self.lock:
+            self.submitted += 1
+        return True
+
+    def start(self):
+        """Method to start the background thread, at the first sample"""
+        if self.thread is None:
+            with self.lock:
+                if self.thread is None:
+                    self.thread = threading.Thread(target=self.run, name="quality", daemon=True)
+                    self.thread.start()
+
+    def run(self):
+        """Method of the background thread: it scores the samples of the queue"""
+        while True:
+            movie_id, indices, nb, age_category = self.queue.get()
+            try:
+                score = float(get_scoring_engine().score(movie_id, indices))
+                with self.lock:
+                    self.scores.setdefault((age_category, nb), deque(maxlen=self.window)).append(score)
+            except Exception:
+                logger.exception("Can't score the recommendations of the movie %s", movie_id)
+                with self.lock:
+                    self.errors += 1
+            finally:
+                self.queue.task_done()
+
+    def join(self):
+        """Method to wait until the samples of the queue are scored"""
+        self.queue.join()
+
+    def stats(self):
+        """Method to get the statistics of the last scores
+
+        Returns:
+            dict: The count, the mean, the p50, the min and the max of the last scores of each
+                  ( age_category, nb )
+        """
+        with self.lock:
+            scores = {key: np.array(values) for key, values in self.scores.items()}
+        return {key: {"count": len(values),
+                      "mean": float(values.mean()),
+                      "p50": float(np.median(values)),
+                      "min": float(values.min()),
+                      "max": float(values.max())}
+                for key, values in sorted(scores.items())}
+
+    def to_text(self):
+        """Method to get the statistics in the Prometheus text format ( see timing.Metrics.to_text )"""
+        lines = ["# HELP app_recommendation_score The score of the last sampled recommendations",
+                 "# TYPE app_recommendation_score gauge"]
+        for (age_category, nb), stats in self.stats().items():
+            for stat, value in stats.items():
+                lines.append(f'app_recommendation_score{{age_category="{age_category}",nb="{nb}",stat="{stat}"}} '
+                             f'{value:.6g}')
+        with self.lock:
+            lines += ["# TYPE app_quality_samples_total counter",
+                      f'app_quality_samples_total{{status="submitted"}} {self.submitted}',
+                      f'app_quality_samples_total{{status="dropped"}} {self.dropped}',
+                      f'app_quality_samples_total{{status="error"}} {self.errors}']
+        return "\n".join(lines) + "\n"
+
+
+@lru_cache(maxsize=None)
+def get_quality_monitor():
+    """Function to get the quality monitor of the process
+
+    Returns:
+        QualityMonitor: The shared monitor
+    """
+    return QualityMonitor(settings.QUALITY_SAMPLE_RATE, settings.QUALITY_QUEUE_SIZE, settings.QUALITY_WINDOW)
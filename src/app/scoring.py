@@ -0,0 +1,115 @@
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from .catalog import get_catalog
+
+
+ACTOR_COLUMNS = ["actor_1_name", "actor_2_name", "actor_3_name"]
+
+
+def encode_names(df, columns):
+    """Function to encode names as integer ids shared by several columns
+
+    Args:
+        df (pd.DataFrame): A movies dataframe
+        columns (list): The columns to encode
+
+    Returns:
+        np.ndarray: The ids of the names ( 1 row per movie, 1 column per column, -1 for the empty names )
+    """
+    values = df[columns].to_numpy().ravel()
+    ids, _ = pd.factorize(values)
+    ids[values == ""] = -1
+    return ids.reshape(len(df), len(columns)).astype(np.int32)
+
+
+class ScoringEngine:
+    """The engine to score recommendations ( genre1 +1, genre2 +0.5, genre3 +0.33..., actor +1, director +1 )
+
+    For each recommended movie, we count:
+        - 1 / k for the genre at the position k ( from 1 ) if the movie selected by the user has this genre
+        - 1 for each actor who plays in the movie selected by the user
+        - 1 if the director is the director of the movie selected by the user
+    The empty names are never counted
+
+    Args:
+        movies (pd.DataFrame): A movies dataframe, the movies are identified by their position in it
+    """
+    def __init__(self, movies):
+        # We encode the genres of each movie in a list of ids ( at their position, -1 for the padding )
+        genres = movies["genres"].str.split("|")
+        lengths = genres.str.len().to_numpy()
+        values = genres.explode().to_numpy()
+        ids, self.genres = pd.factorize(values)
+        ids[values == ""] = -1
+        rows = np.repeat(np.arange(len(movies)), lengths)
+        positions = np.arange(len(rows)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+
+        self.genre_ids = np.full((len(movies), lengths.max(initial=1)), -1, dtype=np.int32)
+        self.genre_ids[rows, positions] = ids
+
+        # And in a one-hot matrix ( the last column is for the padding id -1, it's always False )
+        self.genre_matrix = np.zeros((len(movies), len(self.genres) + 1), dtype=bool)
+        self.genre_matrix[rows[ids >= 0], ids[ids >= 0]] = True
+
+        # The weight of a genre at each position
+        self.genre_weights = 1 / np.arange(1, self.genre_ids.shape[1] + 1)
+
+        # We encode the actors and the directors with integer ids
+        self.actor_ids = encode_names(movies, ACTOR_COLUMNS)
+        self.director_ids = encode_names(movies, ["director_name"])[:, 0]
+
+    def score_many(self, movie_ids, recommendation_ids):
+        """Method to score the recommendations of several movies in a single call
+
+        Args:
+            movie_ids (np.ndarray): The movies selected by the user ( shape (n,) )
+            recommendation_ids (np.ndarray): The recommendations of each movie ( shape (n, k) )
+
+        Returns:
+            np.ndarray: The score of the recommendations of each movie ( shape (n,) )
+        """
+        movie_ids = np.asarray(movie_ids)
+        recommendation_ids = np.asarray(recommendation_ids).reshape(len(movie_ids), -1)
+
+        # Genres: we look up the genres of the recommendations in the genres of the movie
+        genre_ids = self.genre_ids[recommendation_ids]                                     # (n, k, g)
+        genre_hits = self.genre_matrix[movie_ids[:, None, None], genre_ids]                # (n, k, g)
+        genre_score = (genre_hits * self.genre_weights).sum(axis=(1, 2))
+
+        # Actors: we count the actors of the recommendations who play in the movie
+        actor_ids = self.actor_ids[recommendation_ids]                                     # (n, k, 3)
+        movie_actor_ids = self.actor_ids[movie_ids][:, None, None, :]                      # (n, 1, 1, 3)
+        actor_hits = ((actor_ids[..., None] == movie_actor_ids).any(axis=-1)) & (actor_ids >= 0)
+        actor_score = actor_hits.sum(axis=(1, 2))
+
+        # Director: we count the recommendations with the same director
+        director_ids = self.director_ids[recommendation_ids]                               # (n, k)
+        director_hits = (director_ids == self.director_ids[movie_ids][:, None]) & (director_ids >= 0)
+        director_score = director_hits.sum(axis=1)
+
+        return genre_score + actor_score + director_score
+
+    def score(self, movie_id, recommendation_ids):
+        """Method to score the recommendations of one movie
+
+        Args:
+            movie_id (int): The movie selected by the user
+            recommendation_ids (iterable): The recommendations
+
+        Returns:
+            float: The score of the recommendations
+        """
+        return float(self.score_many(np.array([movie_id]), np.asarray(recommendation_ids)[None, :])[0])
+
+
+@lru_cache(maxsize=None)
+def get_scoring_engine():
+    """Function to get the scoring engine of the catalog, it's built at the first call
+
+    Returns:
+        ScoringEngine: The scoring engine, the movies are identified by their index in the catalog
+    """
+    return ScoringEngine(get_catalog().frame(["genres", *ACTOR_COLUMNS, "director_name"]))
@@ -1,20 +1,33 @@
+// The Promise of the movie titles, the API is called only once per page
+let filmTitlesPromise = null;
+
 // Function to retrieve movie titles from the API as a Promise
 function getFilmTitles() {
-    return new Promise((resolve, reject) => {
-        $.get("get-titles/")
-            .done((filmTitles) => resolve(filmTitles))
-            .fail((error) => reject(error));
-    });
+    if (filmTitlesPromise === null) {
+        filmTitlesPromise = new Promise((resolve, reject) => {
+            $.get("get-titles/")
+                .done((filmTitles) => resolve(filmTitles))
+                .fail((error) => {
+                    // We will retry at the next call
+                    filmTitlesPromise = null;
+                    reject(error);
+                });
+        });
+    }
+    return filmTitlesPromise;
 };
 
 // Function to initialize the drop-down list with Select2
 function initializeAutoComplete(ageCategory) {
 
-    // Remove old Select2 input if it exists
+    // Remove old Select2 input and the selected titles if they exist
+    const maxTitles = $('#filmTitleInput').data('max-titles');
+    $('#filmInputContainer .select2-container').remove();
     $('#filmTitleInput').remove();
+    $('#filmTitlesHidden').empty();
 
-    // Create new Select2 input
-    let selectInput = $('<input type="text" name="select2" id="filmTitleInput">');
+    // Create new Select2 input ( several movies can be selected )
+    let selectInput = $('<select name="select2" id="filmTitleInput" multiple></select>').attr('data-max-titles', maxTitles);
     $('#filmInputContainer').append(selectInput);
 
     // Call the getFilmTitles() function to get film titles
@@ -26,7 +39,8 @@ function initializeAutoComplete(ageCategory) {
             // Initialize the drop-down list with Select2 using the retrieved film titles
             $("#filmTitleInput").select2({
                  // Transformer les titres de films en objets appropriés pour Select2
-                data: formattedFilmTitles
+                data: formattedFilmTitles,
+                maximumSelectionLength: maxTitles
             });
         })
         .catch((error) => {
@@ -39,14 +53,15 @@ function initializeAutoComplete(ageCategory) {
 // LISTENERS
 function addTitleChangeListener() {
     $(document).on("change", "#filmTitleInput", function () {
-        const selectedTitle = $(this).select2('data')[0];
+        const selectedTitles = $(this).select2('data').map(title => title.text);
 
-        if (selectedTitle) {
-            const value = selectedTitle.text;
-            $("#filmTitleHidden").val(value);
-            
-            console.log(`Selected title: ${value}`);
-        }
+        // We put each selected title in a hidden input, the questionnaire gets the list of the titles
+        $("#filmTitlesHidden").empty();
+        selectedTitles.forEach(title => {
+            $("#filmTitlesHidden").append($('<input type="hidden" name="title">').val(title));
+        });
+
+        console.log(`Selected titles: ${selectedTitles.join(", ")}`);
     });
 };
 
@@ -58,9 +73,9 @@ function addBeforeUnloadListener() {
 
 function addSubmitListener() {
     $('#questionnaireForm').on('submit', function(e) {
-        if ($("#filmTitleHidden").val() === '') {
+        if ($("#filmTitlesHidden input").length === 0) {
             e.preventDefault();
-            alert('Veuillez sélectionner un film');
+            alert('Veuillez sélectionner au moins un film');
         }
     });
 };
@@ -0,0 +1,117 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from app.benchmarks import BENCHMARKS_VERSION, CATALOG_COLUMNS, CATALOG_LOADS, DEFERRED_MODULES, benchmark_report, \
+    compare_reports, deferred_imports, features_benchmarks, import_times, load_benchmarks, run_benchmarks, \
+    synthetic_movies
+from app.catalog import CATALOG_CSV, read_catalog_csv
+from app.columnar import ColumnarCatalog
+
+
+class SyntheticMoviesTest(unittest.TestCase):
+    def test_schema(self):
+        movies = synthetic_movies(500)
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "cleaned_data.csv"
+            movies.to_csv(path, index=False)
+            movies = read_catalog_csv(path)
+
+        # Check that the synthetic catalog has the columns and the types of the catalog
+        catalog = read_catalog_csv(CATALOG_CSV)
+        self.assertListEqual(list(movies.columns), CATALOG_COLUMNS)
+        self.assertListEqual(list(catalog.columns), CATALOG_COLUMNS)
+        self.assertDictEqual(movies.dtypes.astype(str).to_dict(), catalog.dtypes.astype(str).to_dict())
+
+        # Check the values
+        self.assertEqual(len(movies), 500)
+        self.assertTrue(movies["movie_title"].is_unique)
+        self.assertTrue(movies["age_category"].isin(["adult", "teenager", "child", "unknown"]).all())
+        self.assertTrue((movies["genres"] != "").all())
+
+    def test_seed(self):
+        # Check that the catalog depends only on the seed
+        self.assertTrue(synthetic_movies(100, seed=1).equals(synthetic_movies(100, seed=1)))
+        self.assertFalse(synthetic_movies(100, seed=1).equals(synthetic_movies(100, seed=2)))
+
+
+class RunBenchmarksTest(unittest.TestCase):
+    def test_run_benchmarks(self):
+        results = run_benchmarks(300, repeat=1, queries=3, components=8, max_memory=0)
+
+        # Check that each path is timed, and the fit of the features is skipped ( no memory )
+        for name in ["load_movies", "load_movies_columnar", "fit_index", "query", "basket", "filter_recommendations",
+                     "score", "facets", "titles_payload"]:
+            self.assertGreater(results[name]["seconds"], 0)
+        self.assertIn("skipped", results["fit_features"])
+
+
+class CompareReportsTest(unittest.TestCase):
+    def setUp(self):
+        self.baseline = benchmark_report({5000: {"query": {"seconds": 0.010},
+                                                 "score": {"seconds": 0.002},
+                                                 "fit_features": {"skipped": "no memory"}}})
+
+    def test_compare_reports(self):
+        report = benchmark_report({5000: {"query": {"seconds": 0.020},
+                                          "score": {"seconds": 0.0021},
+                                          "fit_features": {"seconds": 1}},
+                                   50000: {"query": {"seconds": 0.1}}})
+
+        # Check that only the slowdowns beyond the tolerance are regressions
+        regressions = compare_reports(report, self.baseline, tolerance=0.25)
+        self.assertEqual(len(regressions), 1)
+        self.assertEqual(regressions[0]["benchmark"], "query")
+        self.assertEqual(regressions[0]["size"], 5000)
+        self.assertAlmostEqual(regressions[0]["ratio"], 2)
+        self.assertListEqual(compare_reports(report, self.baseline, tolerance=1.5), [])
+
+    def test_other_version(self):
+        report = benchmark_report({})
+        report["version"] = BENCHMARKS_VERSION + 1
+        with self.assertRaises(ValueError):
+            compare_reports(report, self.baseline)
+
+
+@unittest.skipUnless(Path("/proc/self/status").exists(), "The resident memory is read in /proc")
+class LoadBenchmarksTest(unittest.TestCase):
+    def test_load_benchmarks(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "cleaned_data.csv"
+            synthetic_movies(200).to_csv(path, index=False)
+            ColumnarCatalog.from_frame(read_catalog_csv(path)).save(Path(directory) / "catalog")
+            results = load_benchmarks(path, Path(directory) / "catalog", ["movie_title", "duration"], repeat=1)
+
+        # Check that each load is measured in its process
+        self.assertListEqual(list(results), list(CATALOG_LOADS))
+        for result in results.values():
+            self.assertGreater(result["seconds"], 0)
+            self.assertGreaterEqual(result["peak_rss_bytes"], 0)
+            self.assertIn("rss_bytes", result)
+
+
+@unittest.skipUnless(Path("/proc/self/status").exists(), "The resident memory is read in /proc")
+class FeaturesBenchmarksTest(unittest.TestCase):
+    def test_features_benchmarks(self):
+        results = features_benchmarks(200)
+
+        # Check that both fits are measured on a small catalog, and that the dense PCA is skipped without memory
+        self.assertGreater(results["encoded_columns"], 200)
+        for name in ["sparse_svd", "dense_pca"]:
+            self.assertGreater(results[name]["seconds"], 0)
+            self.assertGreaterEqual(results[name]["peak_rss_bytes"], 0)
+        self.assertIn("skipped", features_benchmarks(200, max_memory=0)["dense_pca"])
+
+
+class ImportTimesTest(unittest.TestCase):
+    def test_import_times(self):
+        times = import_times("app.urls")
+
+        # Check that the worker imports the app, but none of the deferred modules
+        self.assertIn("app.urls", times)
+        self.assertIn("pandas", times)
+        self.assertListEqual(deferred_imports(times), [])
+
+        # Check that the deferred modules are found when they are imported
+        self.assertListEqual(deferred_imports(import_times("app.benchmarks")), ["sklearn", "scipy", "joblib"])
+        self.assertListEqual(deferred_imports({module: 0 for module in DEFERRED_MODULES}), DEFERRED_MODULES)
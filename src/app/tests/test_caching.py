@@ -0,0 +1,63 @@
+import unittest
+
+import numpy as np
+from django.core.cache.backends.locmem import LocMemCache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from app.caching import RecommendationCache, get_recommendation_cache
+from app.catalog import get_catalog
+from app.utils import get_recommendations_idx
+
+
+class RecommendationCacheTest(unittest.TestCase):
+    def setUp(self):
+        # A cache of 2 entries, which evicts 1 entry when it's full
+        self.cache = RecommendationCache(LocMemCache("test", {"OPTIONS": {"MAX_ENTRIES": 2, "CULL_FREQUENCY": 2}}))
+
+    def test_get_and_set(self):
+        self.assertIsNone(self.cache.get(1, 5, "adult"))
+        self.cache.set(1, 5, "adult", np.array([3, 2]))
+
+        # Check that we get the cached indexes, and that the other requests are other entries
+        np.testing.assert_array_equal(self.cache.get(1, 5, "adult"), [3, 2])
+        self.assertIsNone(self.cache.get(1, 5, "child"))
+        self.assertIsNone(self.cache.get([1, 2], 5, "adult"))
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 3))
+        self.assertIn('app_recommendation_cache_total{result="hit"} 1', self.cache.to_text())
+
+    def test_key(self):
+        # Check that the key contains the catalog version, so a new catalog gets new keys
+        key = self.cache.key([4, 2], 5, "teenager")
+        self.assertIn(get_catalog().version, key)
+        self.assertTrue(key.endswith(":4-2:5:teenager"))
+        self.assertNotEqual(self.cache.key(4, 5, "teenager"), key)
+
+    def test_lru_eviction(self):
+        self.cache.set(1, 5, "adult", [1])
+        self.cache.set(2, 5, "adult", [2])
+
+        # The entry 1 is used, so the entry 2 is the least recently used and it's evicted
+        self.cache.get(1, 5, "adult")
+        self.cache.set(3, 5, "adult", [3])
+        self.assertIsNotNone(self.cache.get(1, 5, "adult"))
+        self.assertIsNone(self.cache.get(2, 5, "adult"))
+        self.assertIsNotNone(self.cache.get(3, 5, "adult"))
+
+
+@override_settings(METRICS_ENABLED=True)
+class GetRecommendationsIdxCacheTest(TestCase):
+    def test_cached_recommendations(self):
+        cache = get_recommendation_cache()
+        cache.cache.clear()
+        movie_id = get_catalog().find_title("Avatar")
+
+        # Check that the second request is a hit with the same recommendations
+        hits = cache.hits
+        indices = get_recommendations_idx(movie_id, 3, "teenager")
+        np.testing.assert_array_equal(get_recommendations_idx(movie_id, 3, "teenager"), indices)
+        self.assertEqual(cache.hits, hits + 1)
+
+        # Check that the counters are in the metrics
+        response = Client().get(reverse('app:metrics'))
+        self.assertIn('app_recommendation_cache_total{result="miss"}', response.content.decode())
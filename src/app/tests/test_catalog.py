@@ -0,0 +1,101 @@
+import unittest
+
+import pandas as pd
+
+from app.catalog import CATALOG_CSV, CATALOG_SCHEMA, Catalog, get_catalog, normalize_title, read_catalog, \
+    read_catalog_csv
+from app.utils import load_movies, load_recommendations
+
+
+class GetCatalogTest(unittest.TestCase):
+    def test_get_catalog(self):
+        # Check that the catalog is loaded only once
+        catalog = get_catalog()
+        self.assertIsInstance(catalog, Catalog)
+        self.assertIs(get_catalog(), catalog)
+
+        # Check that load_movies share the dataframe of the catalog
+        self.assertIs(load_movies(), catalog.movies)
+        self.assertIs(load_movies(), load_movies())
+
+    def test_load_recommendations_is_a_copy(self):
+        # Check that modifying recommendations doesn't modify the shared catalog
+        df = load_recommendations([0, 1])
+        title = load_movies().iloc[0]["movie_title"]
+        df.loc[df.index[0], "movie_title"] = "Modified"
+        self.assertEqual(load_movies().iloc[0]["movie_title"], title)
+
+
+class ReadCatalogTest(unittest.TestCase):
+    def test_read_catalog_csv(self):
+        df = read_catalog_csv(CATALOG_CSV)
+
+        # Check that the columns have the types of the schema
+        self.assertListEqual(list(df.columns), list(CATALOG_SCHEMA))
+        for column, kind in CATALOG_SCHEMA.items():
+            if kind == "string":
+                self.assertFalse(pd.api.types.is_numeric_dtype(df[column]))
+                self.assertEqual(df[column].isna().sum(), 0)
+            else:
+                self.assertEqual(df[column].dtype, kind)
+
+        # Check that we parse only the columns, in their order
+        projected = read_catalog_csv(CATALOG_CSV, ["title_year", "movie_title"])
+        self.assertListEqual(list(projected.columns), ["title_year", "movie_title"])
+        pd.testing.assert_frame_equal(projected, df[["title_year", "movie_title"]])
+
+    def test_read_catalog(self):
+        # Check that we read the columns of the catalog of the process
+        df = read_catalog(["movie_title", "duration"])
+        self.assertListEqual(list(df.columns), ["movie_title", "duration"])
+        self.assertListEqual(df["movie_title"].tolist(), get_catalog().movies["movie_title"].tolist())
+        self.assertListEqual(df["duration"].tolist(), get_catalog().movies["duration"].tolist())
+
+
+class CatalogTest(unittest.TestCase):
+    def test_take(self):
+        catalog = Catalog(pd.DataFrame({"movie_title": ["a", "b", "c"]}))
+        self.assertEqual(len(catalog), 3)
+        self.assertListEqual(catalog.take([2, 0])["movie_title"].tolist(), ["c", "a"])
+
+        # Check that None is not all the movies
+        with self.assertRaises(TypeError):
+            catalog.take(None)
+
+    def test_find_title(self):
+        catalog = Catalog(pd.DataFrame({"movie_title": ["Avatar", "King Kong", "King Kong", "Up"],
+                                        "num_voted_users": [10, 5, 20, 1]}))
+
+        # Check the exact and the normalized lookups
+        self.assertEqual(catalog.find_title("Avatar"), 0)
+        self.assertEqual(catalog.find_title("  avatar "), 0)
+        self.assertEqual(catalog.find_title("UP"), 3)
+
+        # Check that the duplicates are all kept, the most popular first
+        self.assertTupleEqual(catalog.lookup_title("King Kong"), (2, 1))
+        self.assertEqual(catalog.find_title("king  kong"), 2)
+
+        # Check that an unknown title gives None
+        self.assertTupleEqual(catalog.lookup_title("Unknown"), ())
+        self.assertIsNone(catalog.find_title("Unknown"))
+
+    def test_facets(self):
+        catalog = Catalog(pd.DataFrame({"movie_title": ["Avatar", "King Kong", "Up"],
+                                        "language": ["English", "English", "French"],
+                                        "genres": ["Action|Sci-Fi", "Action|Drama", "Animation"],
+                                        "actor_1_name": ["", "Naomi Watts", "Ed Asner"],
+                                        "director_name": ["James Cameron", "Peter Jackson", ""]}))
+
+        # Check that the empty names are not choices, and that the genres are split
+        facets = catalog.facets([1, 0, 2])
+        self.assertListEqual(facets["languages"], ["English", "French"])
+        self.assertListEqual(facets["genres"], ["Action", "Animation", "Drama", "Sci-Fi"])
+        self.assertListEqual(facets["actors"], ["Naomi Watts", "Ed Asner"])
+        self.assertListEqual(facets["directors"], ["Peter Jackson", "James Cameron"])
+
+
+class NormalizeTitleTest(unittest.TestCase):
+    def test_normalize_title(self):
+        self.assertEqual(normalize_title(" Spider-Man\xa0 3 "), "spider-man 3")
+        self.assertEqual(normalize_title("THE  Dark Knight"), "the dark knight")
+
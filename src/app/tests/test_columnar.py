@@ -0,0 +1,140 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from app.catalog import Catalog
+from app.columnar import ColumnarCatalog, StringDictionary, encode_genres, memory_report
+
+
+class StringDictionaryTest(unittest.TestCase):
+    def test_decode(self):
+        dictionary = StringDictionary.from_strings(["", "Amélie", "Spider-Man 3"])
+        self.assertEqual(len(dictionary), 3)
+        self.assertListEqual(dictionary.decode(np.array([2, 0, 1, 2])).tolist(), ["Spider-Man 3", "", "Amélie",
+                                                                                  "Spider-Man 3"])
+        self.assertListEqual(dictionary.decode(np.array([], dtype=int)).tolist(), [])
+
+        # Check that each different string is decoded once, with the whole dictionary or string by string
+        strings = dictionary.decode(np.array([2, 2]))
+        self.assertIs(strings[0], strings[1])
+        dictionary = StringDictionary.from_strings([f"Movie {i}" for i in range(10)] + ["Amélie"])
+        strings = dictionary.decode(np.array([10, 10]))
+        self.assertListEqual(strings.tolist(), ["Amélie", "Amélie"])
+        self.assertIs(strings[0], strings[1])
+
+    def test_to_array(self):
+        # Check that the offsets in bytes are converted in characters ( 'é' and '—' are 2 and 3 bytes in UTF-8 )
+        strings = ["Amélie", "", "Spider-Man 3", "Léon — The Professional", "Up"]
+        dictionary = StringDictionary.from_strings(strings)
+        self.assertListEqual(dictionary.to_array().tolist(), strings)
+        self.assertListEqual(dictionary.decode(np.array([3, 4, 0])).tolist(), [strings[3], strings[4], strings[0]])
+        self.assertListEqual(StringDictionary.from_strings([]).to_list(), [])
+
+
+class EncodeGenresTest(unittest.TestCase):
+    def test_encode_genres(self):
+        mask, names = encode_genres(["Drama|Action", "Action", ""])
+        self.assertListEqual(names, ["Action", "Drama"])
+        self.assertListEqual(mask.tolist(), [0b11, 0b01, 0])
+        self.assertEqual(mask.dtype, np.uint32)
+
+
+class ColumnarCatalogTest(unittest.TestCase):
+    def setUp(self):
+        self.movies = pd.DataFrame({"movie_title": ["Avatar", "King Kong", "King Kong", "Up"],
+                                    "director_name": ["James Cameron", "Peter Jackson", "", "Pete Docter"],
+                                    "genres": ["Action|Sci-Fi", "Action|Drama", "Drama", "Animation|Comedy"],
+                                    "duration": [178.0, 187.0, 100.0, 96.0],
+                                    "num_voted_users": [10, 5, 20, 1],
+                                    "gross_filled_with_median": [False, True, False, False]})
+
+    def test_from_frame(self):
+        columnar = ColumnarCatalog.from_frame(self.movies)
+
+        # Check the types of the arrays
+        self.assertEqual(len(columnar), 4)
+        self.assertEqual(columnar.codes["director_name"].dtype, np.int16)
+        self.assertEqual(columnar.numbers["duration"].dtype, np.float64)
+        self.assertEqual(columnar.numbers["num_voted_users"].dtype, np.int64)
+        self.assertListEqual(columnar.genre_names, ["Action", "Animation", "Comedy", "Drama", "Sci-Fi"])
+        self.assertListEqual(columnar.genre_mask.tolist(), [0b10001, 0b01001, 0b01000, 0b00110])
+
+        # Check that we decode the same dataframe
+        pd.testing.assert_frame_equal(columnar.to_frame(), self.movies, check_dtype=False)
+        pd.testing.assert_frame_equal(columnar.to_frame(rows=[3, 1], columns=["movie_title", "duration"]),
+                                      self.movies.iloc[[3, 1]][["movie_title", "duration"]], check_dtype=False)
+        self.assertEqual(len(columnar.to_frame(rows=[])), 0)
+
+    def test_unique_strings_and_genres(self):
+        columnar = ColumnarCatalog.from_frame(self.movies)
+
+        # Check that we get the different values in the order of their first movie
+        self.assertListEqual(columnar.unique_strings("movie_title", np.array([2, 3, 1, 0])),
+                             ["King Kong", "Up", "Avatar"])
+        self.assertListEqual(columnar.genres(np.array([1, 2, 3])), ["Action", "Animation", "Comedy", "Drama"])
+        self.assertListEqual(columnar.genres(np.array([], dtype=np.intp)), [])
+
+    def test_save_and_load(self):
+        columnar = ColumnarCatalog.from_frame(self.movies)
+        with tempfile.TemporaryDirectory() as directory:
+            columnar.save(Path(directory))
+            loaded = ColumnarCatalog.load(Path(directory))
+
+            # Check that the arrays are memory-mapped
+            self.assertIsInstance(loaded.codes["movie_title"], np.memmap)
+            self.assertIsInstance(loaded.dictionaries["movie_title"].data, np.memmap)
+            self.assertIsInstance(loaded.numbers["duration"], np.memmap)
+
+            pd.testing.assert_frame_equal(loaded.to_frame(), columnar.to_frame())
+            np.testing.assert_array_equal(loaded.genre_mask, columnar.genre_mask)
+            self.assertListEqual(loaded.genre_names, columnar.genre_names)
+
+            # Check that a catalog can use the loaded movies
+            catalog = Catalog(loaded)
+            self.assertTupleEqual(catalog.lookup_title("King Kong"), (2, 1))
+            self.assertListEqual(catalog.take([3])["movie_title"].tolist(), ["Up"])
+            del loaded, catalog
+
+            with open(Path(directory) / "catalog.json") as f:
+                self.assertEqual(json.load(f)["movies"], 4)
+
+    def test_load_columns(self):
+        columnar = ColumnarCatalog.from_frame(self.movies)
+        with tempfile.TemporaryDirectory() as directory:
+            columnar.save(Path(directory))
+            with open(Path(directory) / "catalog.json") as f:
+                self.assertDictEqual(json.load(f)["schema"], {"movie_title": "string", "director_name": "string",
+                                                              "genres": "string", "duration": "float64",
+                                                              "num_voted_users": "int64",
+                                                              "gross_filled_with_median": "bool"})
+
+            # Check that only the files of the columns are read
+            (Path(directory) / "director_name.codes.npy").unlink()
+            (Path(directory) / "genre_mask.npy").unlink()
+            loaded = ColumnarCatalog.load(Path(directory), columns=["duration", "movie_title"])
+            self.assertListEqual(loaded.columns, ["duration", "movie_title"])
+            self.assertIsNone(loaded.genre_mask)
+            pd.testing.assert_frame_equal(loaded.to_frame(), self.movies[["duration", "movie_title"]],
+                                          check_dtype=False)
+            del loaded
+
+            with self.assertRaises(KeyError):
+                ColumnarCatalog.load(Path(directory), columns=["plot_keywords"])
+
+            # Check that an array with another type than the schema is refused
+            np.save(Path(directory) / "duration.npy", np.array([1, 2, 3, 4]))
+            with self.assertRaises(ValueError):
+                ColumnarCatalog.load(Path(directory), columns=["duration"])
+
+    def test_memory_report(self):
+        columnar = ColumnarCatalog.from_frame(self.movies)
+        report = memory_report(self.movies, columnar, workers=4)
+
+        # Check that the dataframe is counted once per worker, and the arrays only once
+        self.assertEqual(report["dataframe_nbytes"], 4 * self.movies.memory_usage(deep=True).sum())
+        self.assertEqual(report["columnar_nbytes"], columnar.nbytes)
+        self.assertLess(report["ratio"], 1)
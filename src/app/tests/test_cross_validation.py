@@ -0,0 +1,98 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from app.cross_validation import algorithm_configs, canonical_config, evaluate_config, hyperparameter_grid, \
+    run_search, time_algorithm
+from app.scoring import ScoringEngine
+
+
+class HyperparameterGridTest(unittest.TestCase):
+    def test_canonical_config(self):
+        # p is not used by the named metrics
+        self.assertDictEqual(canonical_config("manhattan", 2), {"metric": "manhattan"})
+
+        # minkowski with p=1 is manhattan
+        self.assertDictEqual(canonical_config("minkowski", 1), {"metric": "manhattan"})
+        self.assertDictEqual(canonical_config("minkowski", 3), {"metric": "minkowski", "p": 3})
+
+    def test_hyperparameter_grid(self):
+        # The default grid contains 1 config by metric
+        configs = hyperparameter_grid()
+        self.assertListEqual(configs, [{"metric": "euclidean"}, {"metric": "manhattan"}])
+        self.assertEqual(len(hyperparameter_grid(["minkowski"], [1, 2, 3])), 3)
+
+    def test_algorithm_configs(self):
+        # leaf_size is not used by brute
+        configs = algorithm_configs()
+        self.assertEqual(len(configs), 3 * 5 + 1)
+        self.assertEqual(len({json.dumps(config, sort_keys=True) for config in configs}), len(configs))
+        self.assertIn({"algorithm": "brute"}, configs)
+
+
+class RunSearchTest(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.movies = pd.DataFrame({
+            "genres": rng.choice(["Action", "Drama", "Action|Drama", "Comedy|Drama"], size=60),
+            "actor_1_name": rng.choice(["Actor 1", "Actor 2", "Actor 3"], size=60),
+            "actor_2_name": rng.choice(["Actor 4", "Actor 5", ""], size=60),
+            "actor_3_name": [""] * 60,
+            "director_name": rng.choice(["Director 1", "Director 2"], size=60)
+        })
+        self.engine = ScoringEngine(self.movies)
+        self.features = rng.random((60, 5))
+        self.movie_ids = np.arange(60)
+
+    def test_evaluate_config(self):
+        result = evaluate_config({"algorithm": "brute", "metric": "manhattan"},
+                                 self.features, self.movie_ids, self.engine, n_neighbors=5, batch_size=7)
+        self.assertGreater(result["score"], 0)
+        self.assertGreaterEqual(result["max_score"], result["score"])
+        self.assertGreaterEqual(result["fit_seconds"], 0)
+        self.assertGreaterEqual(result["query_seconds"], 0)
+
+    def test_time_algorithm(self):
+        # Check that the tree algorithms of the exact search have the same score, so they are only timed
+        scores = {evaluate_config({**algorithm, "metric": "manhattan"}, self.features, self.movie_ids, self.engine,
+                                  n_neighbors=5)["score"] for algorithm in algorithm_configs(leaf_sizes=[10, 20])}
+        self.assertEqual(len(scores), 1)
+
+        timing = time_algorithm({"algorithm": "kd_tree", "leaf_size": 10, "metric": "manhattan"}, self.features,
+                                n_neighbors=5)
+        self.assertNotIn("score", timing)
+        self.assertGreaterEqual(timing["query_seconds"], 0)
+
+    def test_run_search(self):
+        configs = hyperparameter_grid(["euclidean", "manhattan", "minkowski"], [3])
+        with tempfile.TemporaryDirectory() as directory:
+            checkpoint_path = Path(directory) / "checkpoint.jsonl"
+            evaluated = []
+            results = run_search(configs, self.features, self.movie_ids, self.engine, checkpoint_path,
+                                 n_neighbors=5, n_jobs=1, callback=evaluated.append)
+
+            # Check that all the configs are evaluated, the best first
+            self.assertEqual(len(results), len(configs))
+            self.assertEqual(len(evaluated), len(configs))
+            scores = [result["score"] for result in results]
+            self.assertListEqual(scores, sorted(scores, reverse=True))
+
+            # Check that the search is resumed from the checkpoint
+            evaluated.clear()
+            resumed_results = run_search(configs, self.features, self.movie_ids, self.engine, checkpoint_path,
+                                         n_neighbors=5, n_jobs=1, callback=evaluated.append)
+            self.assertListEqual(evaluated, [])
+            self.assertListEqual(resumed_results, results)
+
+            # Check that the search isn't resumed with other features or another number of recommendations
+            with self.assertRaises(ValueError):
+                run_search(configs, self.features, self.movie_ids, self.engine, checkpoint_path, n_neighbors=6,
+                           n_jobs=1)
+            with self.assertRaises(ValueError):
+                run_search(configs, self.features * 2, self.movie_ids, self.engine, checkpoint_path,
+                           n_neighbors=5, n_jobs=1)
+            self.assertListEqual(evaluated, [])
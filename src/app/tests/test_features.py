@@ -0,0 +1,85 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from app.features import FEATURES_VERSION, NUMERIC_COLUMNS, FeaturePipeline, load_features, load_pipeline, \
+    save_features
+
+
+class FeaturePipelineTest(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.movies = pd.DataFrame({
+            "director_name": rng.choice(["Director 1", "Director 2", "Director 3"], size=30),
+            "actor_1_name": rng.choice(["Actor 1", "Actor 2"], size=30),
+            "actor_2_name": rng.choice(["Actor 3", "Actor 4", ""], size=30),
+            "actor_3_name": rng.choice(["Actor 5", ""], size=30),
+            "language": rng.choice(["English", "French"], size=30),
+            "country": rng.choice(["USA", "France"], size=30),
+            "age_category": rng.choice(["adult", "teenager", "child"], size=30),
+            "genres": rng.choice(["Action", "Drama", "Action|Drama"], size=30),
+            **{column: rng.integers(0, 10_000, size=30).astype(float) for column in NUMERIC_COLUMNS}
+        })
+
+    def test_fit(self):
+        pipeline = FeaturePipeline.fit(self.movies)
+        features = pipeline.transform(self.movies)
+
+        # Check the size and the type of the features ( the components are limited by the movies )
+        self.assertEqual(pipeline.n_components, 29)
+        self.assertEqual(features.shape, (30, pipeline.n_components))
+        self.assertEqual(features.dtype, np.float32)
+        self.assertGreaterEqual(pipeline.explained_variance, 0.95)
+
+        # Check that the textual columns, the numerics and the genres ( twice ) are encoded in a sparse matrix
+        encoded = pipeline.encode(self.movies)
+        self.assertTrue(sparse.issparse(encoded))
+        self.assertEqual(encoded.dtype, np.float32)
+        self.assertEqual(encoded.shape[1], 3 + 2 + 3 + 2 + 2 + 2 + 3 + len(NUMERIC_COLUMNS) + 3 * 2)
+        self.assertEqual(encoded.nnz, 30 * (7 + len(NUMERIC_COLUMNS) + 2))
+
+    def test_n_components(self):
+        pipeline = FeaturePipeline.fit(self.movies, n_components=5)
+
+        # Check that the part lost is the squared norm of the encoding minus the squared norm of the features
+        self.assertEqual(pipeline.transform(self.movies).shape, (30, 5))
+        encoded = pipeline.encode(self.movies).toarray().astype(float)
+        features = pipeline.transform(self.movies).astype(float)
+        self.assertAlmostEqual(pipeline.fit_loss, 1 - (features ** 2).sum() / (encoded ** 2).sum(), places=5)
+        self.assertGreater(pipeline.fit_loss, 0)
+
+    def test_transform_unknown_values(self):
+        pipeline = FeaturePipeline.fit(self.movies)
+
+        # Check that a movie with unknown names can be transformed
+        movie = self.movies.iloc[[0]].copy()
+        movie["director_name"] = "Unknown director"
+        movie["genres"] = "Western"
+        self.assertEqual(pipeline.transform(movie).shape, (1, pipeline.n_components))
+
+    def test_save_and_load_features(self):
+        pipeline = FeaturePipeline.fit(self.movies)
+        features = pipeline.transform(self.movies)
+        with tempfile.TemporaryDirectory() as directory:
+            save_features(self.movies.index.to_numpy(), features, pipeline, directory=Path(directory))
+            movie_ids, loaded_features = load_features(Path(directory))
+
+            # Check that the features are memory-mapped
+            self.assertIsInstance(loaded_features, np.memmap)
+            np.testing.assert_array_equal(movie_ids, np.arange(30))
+            np.testing.assert_array_equal(loaded_features, features)
+            del loaded_features
+
+            # Check that the loaded pipeline gives the same features
+            np.testing.assert_array_equal(load_pipeline(Path(directory)).transform(self.movies), features)
+
+            with open(Path(directory) / "features.json") as f:
+                manifest = json.load(f)
+            self.assertEqual(manifest["version"], FEATURES_VERSION)
+            self.assertEqual(manifest["components"], pipeline.n_components)
+            self.assertAlmostEqual(manifest["reconstruction_loss"], pipeline.fit_loss)
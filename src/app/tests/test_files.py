@@ -0,0 +1,50 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from app.columnar import ColumnarCatalog
+from app.files import replace_file
+
+
+class ReplaceFileTest(unittest.TestCase):
+    def test_replace_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "array.npy"
+            with replace_file(path) as tmp_path:
+                np.save(tmp_path, np.arange(1000))
+
+            # Check that a memory-map of the old file is still readable when the file is replaced
+            old = np.load(path, mmap_mode="r")
+            with replace_file(path) as tmp_path:
+                np.save(tmp_path, np.arange(10))
+            self.assertEqual(int(old.sum()), 499500)
+            self.assertEqual(len(np.load(path)), 10)
+            self.assertListEqual([file.name for file in Path(directory).iterdir()], ["array.npy"])
+
+    def test_failed_write(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "catalog.json"
+            path.write_text("{}")
+
+            # Check that the file is kept, and the temporary file removed, if the write fails
+            with self.assertRaises(ValueError):
+                with replace_file(path) as tmp_path:
+                    tmp_path.write_text("{")
+                    raise ValueError
+            self.assertEqual(path.read_text(), "{}")
+            self.assertListEqual([file.name for file in Path(directory).iterdir()], ["catalog.json"])
+
+    def test_columnar_catalog_save(self):
+        with tempfile.TemporaryDirectory() as directory:
+            directory = Path(directory)
+            ColumnarCatalog.from_frame(pd.DataFrame({"movie_title": ["a", "b", "c"],
+                                                     "duration": [90.0, 100.0, 110.0]})).save(directory)
+            old = ColumnarCatalog.load(directory)
+
+            # Check that the workers which loaded the old catalog keep reading it
+            ColumnarCatalog.from_frame(pd.DataFrame({"movie_title": ["d"], "duration": [80.0]})).save(directory)
+            self.assertListEqual(old.to_frame()["movie_title"].tolist(), ["a", "b", "c"])
+            self.assertListEqual(ColumnarCatalog.load(directory).to_frame()["movie_title"].tolist(), ["d"])
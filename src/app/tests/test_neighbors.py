@@ -0,0 +1,302 @@
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from app.neighbors import AGE_CATEGORIES, BruteForceIndex, IVFIndex, NeighborIndex, build_indexes, load_indexes, \
+    save_indexes, build_neighbor_table, get_neighbor_tables, load_neighbor_tables, save_neighbor_tables, recall_at_k, \
+    reciprocal_rank_fusion
+
+
+class NeighborIndexTest(unittest.TestCase):
+    def setUp(self):
+        # Movies on a line, so the neighbors are known
+        self.features = np.arange(10, dtype=float).reshape(-1, 1)
+        self.movie_ids = np.arange(100, 110)
+
+    def test_kneighbors(self):
+        index = NeighborIndex.fit(self.features, self.movie_ids)
+        distances, movie_ids = index.kneighbors(100, 3)
+
+        # Check that the input movie is not in the neighbors
+        self.assertListEqual(movie_ids.tolist(), [101, 102, 103])
+        self.assertListEqual(distances.tolist(), [1, 2, 3])
+
+        # Check that we can't get more neighbors than movies
+        _, movie_ids = index.kneighbors(100, 50)
+        self.assertEqual(len(movie_ids), 9)
+
+    def test_kneighbors_many(self):
+        index = NeighborIndex.fit(self.features, self.movie_ids)
+        distances, movie_ids = index.kneighbors_many([100, 105, 109], 2)
+
+        # Check that the batched search gives the neighbors of each movie
+        self.assertEqual(movie_ids.shape, (3, 2))
+        for row, movie_id in enumerate([100, 105, 109]):
+            expected_distances, expected_ids = index.kneighbors(movie_id, 2)
+            np.testing.assert_array_equal(movie_ids[row], expected_ids)
+            np.testing.assert_array_equal(distances[row], expected_distances)
+
+    def test_unknown_movie(self):
+        index = NeighborIndex.fit(self.features, self.movie_ids)
+        self.assertNotIn(0, index)
+        with self.assertRaises(KeyError):
+            index.kneighbors(0, 3)
+
+    def test_update(self):
+        index = NeighborIndex.fit(self.features, self.movie_ids)
+
+        # We remove the movie 102 ( the next movies move down ), and we add a movie at 2.5
+        mapping = np.full(110, -1)
+        mapping[100:110] = [100, 101, -1, 102, 103, 104, 105, 106, 107, 108]
+        updated = index.update(mapping, np.array([[2.5]]), np.array([109]))
+
+        # Check that the updated index contains the new movies
+        self.assertEqual(len(updated), 10)
+        self.assertIn(109, updated)
+        distances, movie_ids = updated.kneighbors(109, 2)
+        self.assertListEqual(movie_ids.tolist(), [102, 101])
+        self.assertListEqual(distances.tolist(), [0.5, 1.5])
+
+
+class IVFIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.features = np.random.default_rng(0).random((200, 8))
+        self.movie_ids = np.arange(1000, 1200)
+        self.exact = NeighborIndex.fit(self.features, self.movie_ids)
+
+    def test_fit(self):
+        index = IVFIndex.fit(self.features, self.movie_ids, n_lists=10)
+
+        # Check that each movie is in 1 cluster
+        self.assertEqual(index.n_lists, 10)
+        self.assertEqual(index.offsets[-1], 200)
+        self.assertListEqual(sorted(index.movie_ids.tolist()), self.movie_ids.tolist())
+        self.assertEqual(index.features.dtype, np.float32)
+
+    def test_all_clusters(self):
+        index = IVFIndex.fit(self.features, self.movie_ids, n_lists=10)
+        index.n_probe = 10
+
+        # Check that the search is exact when we search all the clusters
+        distances, movie_ids = index.kneighbors_many([1000, 1050], 20)
+        expected_distances, expected_ids = self.exact.kneighbors_many([1000, 1050], 20)
+        np.testing.assert_array_equal(movie_ids, expected_ids)
+        np.testing.assert_allclose(distances, expected_distances, rtol=1e-5)
+
+    def test_approximate(self):
+        index = IVFIndex.fit(self.features, self.movie_ids, n_lists=10)
+        index.n_probe = 1
+
+        # Check that we get enough neighbors, sorted, without the input movie, even if the cluster is too small
+        distances, movie_ids = index.kneighbors(1000, 50)
+        self.assertEqual(len(movie_ids), 50)
+        self.assertNotIn(1000, movie_ids)
+        self.assertListEqual(distances.tolist(), sorted(distances.tolist()))
+
+        # Check the recall of the approximate search
+        expected_ids = self.exact.kneighbors_many(self.movie_ids[:20], 10)[1]
+        recall = recall_at_k(expected_ids, index.kneighbors_many(self.movie_ids[:20], 10)[1])
+        self.assertGreater(recall, 0)
+        self.assertLessEqual(recall, 1)
+        self.assertEqual(recall_at_k(expected_ids, expected_ids), 1)
+
+    def test_update(self):
+        index = IVFIndex.fit(self.features, self.movie_ids, n_lists=10)
+        index.n_probe = 10
+
+        # We remove the first 10 movies, and we add 5 movies
+        mapping = np.full(1200, -1)
+        mapping[1010:1200] = np.arange(1000, 1190)
+        added_features = np.random.default_rng(1).random((5, 8))
+        updated = index.update(mapping, added_features, np.arange(1190, 1195))
+
+        # Check that the clusters are kept, and that the search is exact when we search all the clusters
+        np.testing.assert_array_equal(updated.centroids, index.centroids)
+        self.assertEqual(updated.offsets[-1], 195)
+        exact = NeighborIndex.fit(np.vstack([self.features[10:], added_features]), np.arange(1000, 1195))
+        distances, movie_ids = updated.kneighbors_many([1000, 1192], 20)
+        expected_distances, expected_ids = exact.kneighbors_many([1000, 1192], 20)
+        np.testing.assert_array_equal(movie_ids, expected_ids)
+        np.testing.assert_allclose(distances, expected_distances, rtol=1e-5)
+
+
+class BruteForceIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.features = np.random.default_rng(0).random((200, 8))
+        self.movie_ids = np.arange(1000, 1200)
+        self.exact = NeighborIndex.fit(self.features, self.movie_ids)
+
+    def test_kneighbors_many(self):
+        index = BruteForceIndex.fit(self.features, self.movie_ids)
+
+        # Check that the search is the exact search of sklearn, even with movies on several batches
+        distances, movie_ids = index.kneighbors_many([1000, 1050, 1199], 20, batch_size=64)
+        expected_distances, expected_ids = self.exact.kneighbors_many([1000, 1050, 1199], 20)
+        np.testing.assert_array_equal(movie_ids, expected_ids)
+        np.testing.assert_allclose(distances, expected_distances, rtol=1e-5)
+
+    def test_all_movies(self):
+        index = BruteForceIndex.fit(self.features[:10], self.movie_ids[:10])
+
+        # Check that we can't get more neighbors than movies, and that the input movie is not in the neighbors
+        distances, movie_ids = index.kneighbors(1000, 50)
+        self.assertEqual(len(movie_ids), 9)
+        self.assertNotIn(1000, movie_ids)
+        self.assertListEqual(distances.tolist(), sorted(distances.tolist()))
+
+
+class ReciprocalRankFusionTest(unittest.TestCase):
+    def test_reciprocal_rank_fusion(self):
+        # The movie 7 is a neighbor of the 2 movies, the movie 2 is in the basket
+        scores, neighbor_ids = reciprocal_rank_fusion([[5, 7, 2], [7, 8, 9]], exclude=[1, 2], k=0)
+
+        # Check that the common neighbor is first, and that the ties keep the order of the indexes
+        self.assertListEqual(neighbor_ids.tolist(), [7, 5, 8, 9])
+        np.testing.assert_allclose(scores, [1 / 2 + 1, 1, 1 / 2, 1 / 3])
+
+
+class BuildIndexesTest(unittest.TestCase):
+    def setUp(self):
+        self.movies = pd.DataFrame({"age_category": ["adult", "teenager", "child", "unknown"] * 3})
+        self.movie_ids = np.arange(12)
+        self.features = np.random.default_rng(0).random((12, 4))
+
+    def test_build_indexes(self):
+        indexes = build_indexes(self.movie_ids, self.features, self.movies)
+
+        # Check that each index contains only the movies of his age category
+        self.assertListEqual(sorted(indexes), sorted(AGE_CATEGORIES))
+        self.assertEqual(len(indexes["adult"]), 12)
+        self.assertEqual(len(indexes["teenager"]), 9)
+        self.assertEqual(len(indexes["child"]), 6)
+        self.assertNotIn(0, indexes["teenager"])
+        self.assertNotIn(1, indexes["child"])
+
+    def test_save_and_load_indexes(self):
+        indexes = build_indexes(self.movie_ids, self.features, self.movies)
+        with tempfile.TemporaryDirectory() as directory:
+            save_indexes(indexes, Path(directory))
+            loaded_indexes = load_indexes(Path(directory))
+
+            # Check that the loaded indexes give the same neighbors
+            for age_category in AGE_CATEGORIES:
+                expected = indexes[age_category].kneighbors(2, 3)
+                result = loaded_indexes[age_category].kneighbors(2, 3)
+                np.testing.assert_array_equal(result[1], expected[1])
+                np.testing.assert_allclose(result[0], expected[0])
+
+            # Check that the features are memory-mapped
+            self.assertIsInstance(loaded_indexes["adult"].features, np.memmap)
+            del loaded_indexes
+
+    def test_ivf_backend(self):
+        indexes = build_indexes(self.movie_ids, self.features, self.movies, backend="ivf")
+        with tempfile.TemporaryDirectory() as directory:
+            save_indexes(indexes, Path(directory), backend="ivf")
+
+            # Check that the approximate indexes don't replace the exact ones
+            with self.assertRaises(FileNotFoundError):
+                load_indexes(Path(directory))
+
+            loaded_indexes = load_indexes(Path(directory), backend="ivf")
+            self.assertIsInstance(loaded_indexes["teenager"], IVFIndex)
+            self.assertEqual(len(loaded_indexes["teenager"]), 9)
+            np.testing.assert_array_equal(loaded_indexes["adult"].kneighbors(2, 3)[1],
+                                          indexes["adult"].kneighbors(2, 3)[1])
+            del loaded_indexes
+
+    def test_numpy_backend(self):
+        indexes = build_indexes(self.movie_ids, self.features, self.movies, backend="numpy")
+        exact_indexes = build_indexes(self.movie_ids, self.features, self.movies)
+        with tempfile.TemporaryDirectory() as directory:
+            save_indexes(indexes, Path(directory), backend="numpy")
+
+            # Check that the loaded indexes give the neighbors of the exact indexes
+            loaded_indexes = load_indexes(Path(directory), backend="numpy")
+            for age_category in AGE_CATEGORIES:
+                self.assertIsInstance(loaded_indexes[age_category], BruteForceIndex)
+                np.testing.assert_array_equal(loaded_indexes[age_category].kneighbors(2, 3)[1],
+                                              exact_indexes[age_category].kneighbors(2, 3)[1])
+            del loaded_indexes
+
+
+class NeighborTableTest(unittest.TestCase):
+    def setUp(self):
+        self.movies = pd.DataFrame({"age_category": ["adult", "teenager", "child", "unknown"] * 10})
+        self.movie_ids = np.arange(40)
+        self.features = np.random.default_rng(0).random((40, 4))
+        self.indexes = build_indexes(self.movie_ids, self.features, self.movies)
+
+    def test_build_neighbor_table(self):
+        index = self.indexes["teenager"]
+        table = build_neighbor_table(index, max_nb=2, batch_size=7, n_jobs=1)
+
+        # Check the size and the types of the table
+        self.assertEqual(len(table), len(index))
+        self.assertEqual(table.max_neighbors, 20)
+        self.assertEqual(table.neighbor_ids.dtype, np.int32)
+        self.assertEqual(table.distances.dtype, np.float32)
+
+        # Check that the table gives the same neighbors as the index
+        for movie_id in index.movie_ids:
+            expected_distances, expected_ids = index.kneighbors(movie_id, 15)
+            distances, neighbor_ids = table.kneighbors(movie_id, 15)
+            np.testing.assert_array_equal(neighbor_ids, expected_ids)
+            np.testing.assert_allclose(distances, expected_distances, rtol=1e-6)
+
+        # Check that we can't get more neighbors than the table contains
+        with self.assertRaises(ValueError):
+            table.kneighbors(index.movie_ids[0], 21)
+
+        # Check that the batched slice gives the same neighbors
+        distances, neighbor_ids = table.kneighbors_many(index.movie_ids[:3].tolist(), 15)
+        for row, movie_id in enumerate(index.movie_ids[:3].tolist()):
+            np.testing.assert_array_equal(neighbor_ids[row], table.kneighbors(movie_id, 15)[1])
+
+    def test_save_and_load_neighbor_tables(self):
+        tables = {age_category: build_neighbor_table(index, max_nb=1, n_jobs=1)
+                  for age_category, index in self.indexes.items()}
+        with tempfile.TemporaryDirectory() as directory:
+            save_neighbor_tables(tables, directory=Path(directory))
+            loaded_tables = load_neighbor_tables(Path(directory))
+            self.assertTrue((Path(directory) / "neighbor_tables.json").exists())
+
+            for age_category in AGE_CATEGORIES:
+                np.testing.assert_array_equal(loaded_tables[age_category].neighbor_ids,
+                                              tables[age_category].neighbor_ids)
+            del loaded_tables
+
+    def test_outdated_neighbor_tables(self):
+        tables = {age_category: build_neighbor_table(index, max_nb=1, n_jobs=1)
+                  for age_category, index in self.indexes.items()}
+        with tempfile.TemporaryDirectory() as directory, mock.patch("app.neighbors.INDEXES_DIR", Path(directory)):
+            with mock.patch("app.neighbors.features_digest", return_value="features 1"):
+                save_neighbor_tables(tables, directory=Path(directory))
+                self.assertIsNotNone(get_neighbor_tables.__wrapped__())
+
+            # Check that the tables built with other features are ignored
+            with mock.patch("app.neighbors.features_digest", return_value="features 2"), \
+                    self.assertLogs("app.neighbors", "WARNING"):
+                self.assertIsNone(get_neighbor_tables.__wrapped__())
+
+    def test_update(self):
+        index = self.indexes["adult"]
+        table = build_neighbor_table(index, max_nb=1, n_jobs=1)
+
+        # We remove 3 movies, and we add 4 movies
+        mapping = np.full(40, -1)
+        removed = [0, 5, 17]
+        mapping[np.setdiff1d(np.arange(40), removed)] = np.arange(37)
+        added_ids = np.arange(37, 41)
+        updated_index = index.update(mapping, np.random.default_rng(1).random((4, 4)), added_ids)
+        updated = table.update(mapping, updated_index, added_ids)
+
+        # Check that the updated table is the table of the updated index
+        expected = build_neighbor_table(updated_index, max_nb=1, n_jobs=1)
+        np.testing.assert_array_equal(updated.movie_ids, expected.movie_ids)
+        np.testing.assert_array_equal(updated.neighbor_ids, expected.neighbor_ids)
+        np.testing.assert_allclose(updated.distances, expected.distances, rtol=1e-5)
@@ -0,0 +1,41 @@
+import asyncio
+import threading
+import unittest
+
+from app.offload import BoundedExecutor, Overloaded
+
+
+class BoundedExecutorTest(unittest.IsolatedAsyncioTestCase):
+    async def test_run(self):
+        executor = BoundedExecutor(max_workers=2, max_queue=0)
+
+        # Check that the function runs in a thread of the pool
+        self.assertEqual(await executor.run(pow, 2, 10), 1024)
+        name = await executor.run(lambda: threading.current_thread().name)
+        self.assertTrue(name.startswith("recommendations"))
+        self.assertEqual(executor.pending, 0)
+
+    async def test_overloaded(self):
+        executor = BoundedExecutor(max_workers=1, max_queue=1)
+        event = threading.Event()
+
+        # 1 task is running and 1 task is waiting
+        tasks = [asyncio.ensure_future(executor.run(event.wait, 5)) for _ in range(2)]
+        await asyncio.sleep(0)
+
+        # Check that the next task is rejected
+        with self.assertRaises(Overloaded):
+            await executor.run(pow, 2, 10)
+
+        # Check that the executor accepts tasks again when the tasks are done
+        event.set()
+        self.assertListEqual(await asyncio.gather(*tasks), [True, True])
+        self.assertEqual(await executor.run(pow, 2, 10), 1024)
+
+    async def test_exception(self):
+        executor = BoundedExecutor(max_workers=1, max_queue=0)
+
+        # Check that the exceptions are raised in the view, and the task is released
+        with self.assertRaises(ZeroDivisionError):
+            await executor.run(divmod, 1, 0)
+        self.assertEqual(executor.pending, 0)
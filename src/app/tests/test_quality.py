@@ -0,0 +1,58 @@
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from app.catalog import get_catalog
+from app.quality import QualityMonitor
+from app.scoring import get_scoring_engine
+from app.utils import get_recommendations_idx
+
+
+class QualityMonitorTest(unittest.TestCase):
+    def setUp(self):
+        self.movie_id = get_catalog().find_title("Spider-Man 3")
+        self.indices = get_recommendations_idx(self.movie_id, 5, "adult")
+
+    def test_submit(self):
+        monitor = QualityMonitor(sample_rate=1, queue_size=10, window=2)
+        for nb in [5, 5, 5, 2]:
+            self.assertTrue(monitor.submit(self.movie_id, self.indices, nb, "adult"))
+        monitor.join()
+
+        # Check that the scores are computed in the background, by age category and number of recommendations
+        stats = monitor.stats()
+        expected = get_scoring_engine().score(self.movie_id, self.indices)
+        self.assertListEqual(list(stats), [("adult", 2), ("adult", 5)])
+        self.assertEqual(stats[("adult", 5)]["count"], 2)  # The window keeps the 2 last scores
+        self.assertAlmostEqual(stats[("adult", 5)]["mean"], expected)
+        self.assertEqual(monitor.submitted, 4)
+        self.assertIn('app_recommendation_score{age_category="adult",nb="5",stat="mean"}', monitor.to_text())
+
+    def test_sample_rate(self):
+        # Check that no request is sampled with a rate of 0, and about half of them with a rate of 0.5
+        self.assertFalse(QualityMonitor(sample_rate=0, queue_size=10, window=10).submit(0, [1], 5, "adult"))
+        monitor = QualityMonitor(sample_rate=0.5, queue_size=1000, window=10, seed=0)
+        sampled = sum(monitor.submit(self.movie_id, self.indices, 5, "adult") for _ in range(1000))
+        self.assertTrue(400 < sampled < 600)
+        monitor.join()
+
+    def test_full_queue(self):
+        monitor = QualityMonitor(sample_rate=1, queue_size=2, window=10)
+
+        # Without the background thread, the queue stays full, so the next samples are dropped without blocking
+        with mock.patch.object(monitor, "start"):
+            results = [monitor.submit(self.movie_id, self.indices, 5, "adult") for _ in range(5)]
+        self.assertListEqual(results, [True, True, False, False, False])
+        self.assertEqual(monitor.dropped, 3)
+
+    def test_error(self):
+        monitor = QualityMonitor(sample_rate=1, queue_size=10, window=10)
+
+        # Check that an error doesn't stop the background thread
+        with self.assertLogs("app.quality", level="ERROR"):
+            monitor.submit(self.movie_id, np.array([10 ** 9]), 5, "adult")
+            monitor.submit(self.movie_id, self.indices, 5, "adult")
+            monitor.join()
+        self.assertEqual(monitor.errors, 1)
+        self.assertEqual(monitor.stats()[("adult", 5)]["count"], 1)
@@ -0,0 +1,90 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from app.catalog import get_catalog
+from app.scoring import ScoringEngine, get_scoring_engine
+from app.utils import score
+
+
+def reference_score(movie, df_recommendations):
+    """The definition of the score with Python loops ( genre1 +1, genre2 +0.5, actor +1, director +1 )"""
+    genres = movie["genres"].split("|")
+    actors = [movie["actor_1_name"], movie["actor_2_name"], movie["actor_3_name"]]
+
+    result = 0
+    for _, row in df_recommendations.iterrows():
+        for k, genre in enumerate(row["genres"].split("|"), 1):
+            if genre and genre in genres:
+                result += 1 / k
+        for column in ["actor_1_name", "actor_2_name", "actor_3_name"]:
+            if row[column] and row[column] in actors:
+                result += 1
+        if row["director_name"] and row["director_name"] == movie["director_name"]:
+            result += 1
+    return result
+
+
+class ScoringEngineTest(unittest.TestCase):
+    def setUp(self):
+        self.movies = pd.DataFrame({
+            "genres": ["Action|Adventure|Sci-Fi", "Adventure|Action", "Drama", "Sci-Fi|Drama|Action", ""],
+            "actor_1_name": ["Actor 1", "Actor 2", "Actor 1", "Actor 4", ""],
+            "actor_2_name": ["Actor 2", "Actor 1", "", "Actor 5", ""],
+            "actor_3_name": ["Actor 3", "", "", "Actor 6", ""],
+            "director_name": ["Director 1", "Director 1", "", "Director 2", ""]
+        })
+
+    def test_score(self):
+        engine = ScoringEngine(self.movies)
+
+        # Movie 1: Adventure +1, Action +0.5, Actor 2 +1, Actor 1 +1, Director 1 +1
+        self.assertAlmostEqual(engine.score(0, [1]), 4.5)
+
+        # Movie 3: Sci-Fi +1, Action +1/3
+        self.assertAlmostEqual(engine.score(0, [3]), 1 + 1 / 3)
+
+        # The empty names and genres are never counted
+        self.assertAlmostEqual(engine.score(2, [4]), 0)
+        self.assertAlmostEqual(engine.score(4, [2, 4]), 0)
+
+    def test_score_many(self):
+        engine = ScoringEngine(self.movies)
+        movie_ids = np.array([0, 1, 2])
+        recommendation_ids = np.array([[1, 3], [0, 2], [3, 4]])
+
+        # Check that a single call gives the score of each movie
+        scores = engine.score_many(movie_ids, recommendation_ids)
+        self.assertEqual(scores.shape, (3,))
+        for movie_id, ids, result in zip(movie_ids, recommendation_ids, scores):
+            self.assertAlmostEqual(result, engine.score(movie_id, ids))
+
+    def test_parity_with_reference(self):
+        engine = ScoringEngine(self.movies)
+        for movie_id in range(len(self.movies)):
+            ids = [i for i in range(len(self.movies)) if i != movie_id]
+            self.assertAlmostEqual(engine.score(movie_id, ids),
+                                   reference_score(self.movies.iloc[movie_id], self.movies.iloc[ids]))
+
+    def test_parity_with_reference_on_catalog(self):
+        movies = get_catalog().movies
+        engine = get_scoring_engine()
+        rng = np.random.default_rng(0)
+        movie_ids = rng.choice(len(movies), size=20, replace=False)
+        recommendation_ids = rng.choice(len(movies), size=(20, 50))
+
+        scores = engine.score_many(movie_ids, recommendation_ids)
+        for movie_id, ids, result in zip(movie_ids, recommendation_ids, scores):
+            self.assertAlmostEqual(result, reference_score(movies.iloc[movie_id], movies.iloc[ids]))
+
+
+class ScoreTest(unittest.TestCase):
+    def test_score(self):
+        movies = get_catalog().movies
+        movie = movies.iloc[[10]]
+        df_recommendations = movies.iloc[[20, 30, 10, 40]]
+
+        # Check that utils.score gives the same result as the reference ( with any dataframes )
+        self.assertAlmostEqual(score(movie, df_recommendations),
+                               reference_score(movie.iloc[0], df_recommendations))
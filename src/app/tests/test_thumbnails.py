@@ -0,0 +1,139 @@
+import asyncio
+import threading
+import time
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from app.models import Thumbnail
+from app.thumbnails import PROCESS_CLIENT, aget_thumbnail_urls, client_session
+from project.asgi import application
+
+
+class StubIMDBHandler(BaseHTTPRequestHandler):
+    """A stub of the IMDB photo gallery webpages"""
+    hits = []
+
+    def do_GET(self):
+        self.hits.append(self.path)
+        movie = self.path.split("/")[2]
+        if movie.startswith("slow"):
+            time.sleep(0.15)
+        if movie == "timeout":
+            # The client is gone after the sleep, so we don't answer
+            time.sleep(0.5)
+            return
+        if movie == "missing":
+            self.send_response(404)
+            self.end_headers()
+            return
+
+        # The 'noimage' movie has a webpage without image
+        body = "<html><body></body></html>" if movie == "noimage" else \
+            f'<html><body><img src="http://images.test/{movie}.jpg"></body></html>'
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html")
+        self.end_headers()
+        self.wfile.write(body.encode())
+
+    def log_message(self, format, *args):
+        pass
+
+
+@override_settings(THUMBNAIL_TIMEOUT=0.2)
+class GetThumbnailUrlsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), StubIMDBHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_port}/title"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        StubIMDBHandler.hits.clear()
+
+    def movie_url(self, movie):
+        return f"{self.base_url}/{movie}/?ref_=fn_tt_tt_1"
+
+    async def test_aget_thumbnail_urls(self):
+        urls = [self.movie_url(f"tt{i}") for i in range(5)]
+        thumbnail_urls = await aget_thumbnail_urls(urls)
+
+        # Check that we get the image of each movie
+        self.assertListEqual(list(thumbnail_urls), urls)
+        self.assertEqual(thumbnail_urls[urls[0]], "http://images.test/tt0.jpg")
+        self.assertEqual(len(StubIMDBHandler.hits), 5)
+        self.assertEqual(await Thumbnail.objects.acount(), 5)
+
+        # Check that the second time, the images come from the cache
+        self.assertDictEqual(await aget_thumbnail_urls(urls), thumbnail_urls)
+        self.assertEqual(len(StubIMDBHandler.hits), 5)
+
+    async def test_negative_cache(self):
+        urls = [self.movie_url("missing"), self.movie_url("noimage"), self.movie_url("timeout")]
+        thumbnail_urls = await aget_thumbnail_urls(urls)
+
+        # Check that the errors, the webpages without image and the timeouts give None
+        self.assertDictEqual(thumbnail_urls, {url: None for url in urls})
+
+        # Check that the not found thumbnails are cached too
+        hits = len(StubIMDBHandler.hits)
+        await aget_thumbnail_urls(urls)
+        self.assertEqual(len(StubIMDBHandler.hits), hits)
+
+    async def test_expired_cache(self):
+        url = self.movie_url("tt1")
+        await Thumbnail.objects.acreate(movie_url=url, thumbnail_url=None,
+                                        fetched_at=timezone.now() - timedelta(days=1))
+
+        # Check that an expired thumbnail is scraped again and updated in the cache
+        self.assertDictEqual(await aget_thumbnail_urls([url]), {url: "http://images.test/tt1.jpg"})
+        self.assertEqual(len(StubIMDBHandler.hits), 1)
+        self.assertEqual((await Thumbnail.objects.aget(movie_url=url)).thumbnail_url, "http://images.test/tt1.jpg")
+
+    async def test_concurrency(self):
+        urls = [self.movie_url(f"slow{i}") for i in range(4)]
+        start = time.perf_counter()
+        await aget_thumbnail_urls(urls)
+
+        # Check that the images are scraped concurrently ( each 'slow' movie takes 0.15s )
+        self.assertLess(time.perf_counter() - start, 0.45)
+
+    async def test_client_session(self):
+        # Check that without the client of the process, each batch has a client closed at the end
+        async with client_session() as client:
+            self.assertIsNone(PROCESS_CLIENT.get("client"))
+        self.assertTrue(client.is_closed)
+
+    async def test_lifespan(self):
+        messages = asyncio.Queue()
+        sent = []
+
+        async def send(message):
+            sent.append(message["type"])
+
+        # Check that the ASGI server opens the client of the process at the startup, and the batches share it
+        task = asyncio.create_task(application({"type": "lifespan"}, messages.get, send))
+        await messages.put({"type": "lifespan.startup"})
+        while not sent:
+            await asyncio.sleep(0.01)
+        client = PROCESS_CLIENT["client"]
+        await aget_thumbnail_urls([self.movie_url("tt1")])
+        async with client_session() as session_client:
+            self.assertIs(session_client, client)
+        self.assertFalse(client.is_closed)
+
+        # And that it closes it at the shutdown
+        await messages.put({"type": "lifespan.shutdown"})
+        await task
+        self.assertListEqual(sent, ["lifespan.startup.complete", "lifespan.shutdown.complete"])
+        self.assertTrue(client.is_closed)
+        self.assertNotIn("client", PROCESS_CLIENT)
@@ -0,0 +1,121 @@
+import time
+import unittest
+
+from django.core.cache import caches
+from django.test import TestCase, Client, override_settings
+from django.urls import reverse
+
+from app.offload import BoundedExecutor
+from app.timing import BUCKETS, Histogram, Metrics, _timings, server_timing, timer
+
+
+class TimerTest(unittest.IsolatedAsyncioTestCase):
+    def test_not_timed(self):
+        # Check that the timer does nothing outside of a timed request
+        with timer("stage"):
+            pass
+        self.assertIsNone(_timings.get())
+
+    def test_timer(self):
+        timings = []
+        token = _timings.set(timings)
+        try:
+            with timer("stage"):
+                time.sleep(0.01)
+            with self.assertRaises(ZeroDivisionError), timer("error"):
+                1 / 0
+        finally:
+            _timings.reset(token)
+
+        # Check that the stages are timed, even with an exception
+        self.assertListEqual([stage for stage, _ in timings], ["stage", "error"])
+        self.assertGreaterEqual(timings[0][1], 0.01)
+
+    async def test_executor(self):
+        timings = []
+        token = _timings.set(timings)
+        try:
+            # Check that the stages timed in a thread of the executor are in the timings of the request
+            await BoundedExecutor(1, 0).run(timer("thread")(time.sleep), 0)
+        finally:
+            _timings.reset(token)
+        self.assertListEqual([stage for stage, _ in timings], ["thread"])
+
+
+class HistogramTest(unittest.TestCase):
+    def test_quantile(self):
+        histogram = Histogram()
+        self.assertIsNone(histogram.quantile(0.5))
+
+        for _ in range(90):
+            histogram.observe(0.001)
+        for _ in range(10):
+            histogram.observe(1)
+
+        # Check that the quantiles are the upper bound of their bucket ( 19% wide )
+        self.assertEqual(histogram.count, 100)
+        self.assertAlmostEqual(histogram.sum, 10.09)
+        self.assertTrue(0.001 <= histogram.quantile(0.5) < 0.001 * 1.19)
+        self.assertTrue(1 <= histogram.quantile(0.95) < 1.19)
+        self.assertTrue(1 <= histogram.quantile(0.99) < 1.19)
+
+        # Check the durations beyond the last bucket
+        histogram.observe(BUCKETS[-1] * 2)
+        self.assertEqual(histogram.quantile(1), float("inf"))
+
+    def test_to_text(self):
+        metrics = Metrics()
+        metrics.observe([("kneighbors", 0.002), ("total", 0.01), ("kneighbors", 0.003)])
+        text = metrics.to_text()
+
+        # Check the Prometheus text format
+        self.assertIn('app_stage_seconds{stage="kneighbors",quantile="0.95"}', text)
+        self.assertIn('app_stage_seconds_count{stage="kneighbors"} 2', text)
+        self.assertIn('app_stage_seconds_count{stage="total"} 1', text)
+
+    def test_server_timing(self):
+        # Check that the durations of a stage are summed
+        self.assertEqual(server_timing([("imdb", 0.1), ("score", 0.002), ("imdb", 0.2)]),
+                         'imdb;dur=300.0;desc="2 calls", score;dur=2.0')
+
+
+class TimingMiddlewareTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+
+        # The recommendations are computed, not read from the cache
+        caches["recommendations"].clear()
+
+    @override_settings(TIMING_ENABLED=True, METRICS_ENABLED=True)
+    def test_server_timing(self):
+        response = self.client.post(reverse('app:questionnaire'), data={
+            'title': 'Spider-Man 3',
+            'recommendationsNumber': '5',
+            'age': 'adult',
+        })
+
+        # Check that the stages of generate_recommendations are in the header
+        stages = [timing.split(";")[0] for timing in response["Server-Timing"].split(", ")]
+        for stage in ["catalog", "indexes", "kneighbors", "load_recommendations", "total"]:
+            self.assertIn(stage, stages)
+
+        # Check that they are in the metrics
+        response = self.client.get(reverse('app:metrics'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('app_stage_seconds{stage="kneighbors",quantile="0.99"}', response.content.decode())
+
+    @override_settings(TIMING_ENABLED=False)
+    def test_disabled(self):
+        response = self.client.get(reverse('app:get_movie_titles'))
+        self.assertNotIn("Server-Timing", response)
+
+    @override_settings(METRICS_ENABLED=False)
+    def test_metrics_disabled(self):
+        # Check that the metrics are not served when they are disabled
+        self.assertEqual(self.client.get(reverse('app:metrics')).status_code, 404)
+
+    @override_settings(METRICS_ENABLED=True, METRICS_ALLOWED_IPS=["10.0.0.1"])
+    def test_metrics_allowed_ips(self):
+        # Check that the metrics are served only to the allowed IPs
+        self.assertEqual(self.client.get(reverse('app:metrics')).status_code, 404)
+        self.assertEqual(self.client.get(reverse('app:metrics'), REMOTE_ADDR="10.0.0.1").status_code, 200)
@@ -0,0 +1,40 @@
+import gzip
+import json
+import unittest
+
+import pandas as pd
+
+from app.catalog import Catalog, get_catalog
+from app.titles import TitlesPayload, get_titles_payload
+
+
+class TitlesPayloadTest(unittest.TestCase):
+    def setUp(self):
+        self.movies = pd.DataFrame({"movie_title": ["b", "a", "d", "c"],
+                                    "age_category": ["adult", "teenager", "child", "unknown"]})
+
+    def test_from_movies(self):
+        payload = TitlesPayload.from_movies(self.movies)
+
+        # Check that the titles are filtered by age category and sorted
+        self.assertDictEqual(json.loads(payload.content), {"adult": ["a", "b", "c", "d"],
+                                                           "teenager": ["a", "c", "d"],
+                                                           "child": ["c", "d"]})
+        self.assertEqual(gzip.decompress(payload.gzip_content), payload.content)
+
+    def test_etag(self):
+        payload = TitlesPayload.from_movies(self.movies)
+
+        # Check that the ETags only depend on the titles
+        self.assertEqual(TitlesPayload.from_movies(self.movies).etag, payload.etag)
+        self.assertEqual(TitlesPayload.from_movies(self.movies).gzip_etag, payload.gzip_etag)
+        self.assertNotEqual(payload.etag, payload.gzip_etag)
+
+        movies = self.movies.assign(movie_title=["b", "a", "d", "e"])
+        self.assertNotEqual(TitlesPayload.from_movies(movies).etag, payload.etag)
+
+    def test_get_titles_payload(self):
+        # Check that the payload is built once per catalog
+        payload = get_titles_payload(get_catalog())
+        self.assertIs(get_titles_payload(get_catalog()), payload)
+        self.assertIsNot(get_titles_payload(Catalog(self.movies)), payload)
@@ -0,0 +1,52 @@
+import time
+import unittest
+from unittest import mock
+
+from django.conf import settings
+from django.core import signing
+from django.test import override_settings
+
+from app.catalog import get_catalog
+from app.tokens import TOKEN_SALT, make_token, read_token
+
+
+class TokenTest(unittest.TestCase):
+    def test_read_token(self):
+        token = make_token(42, 5, "teenager")
+        self.assertTupleEqual(read_token(token), (42, 5, "teenager"))
+
+        # Check that the token is compact and can be put in a form
+        self.assertLess(len(token), 100)
+        self.assertRegex(token, r"^[\w:.-]+$")
+
+    def test_basket_token(self):
+        self.assertTupleEqual(read_token(make_token([42, 7, 3], 5, "adult")), ([42, 7, 3], 5, "adult"))
+
+    def test_invalid_token(self):
+        token = make_token(42, 5, "teenager")
+        self.assertIsNone(read_token(token[:-1] + ("a" if token[-1] != "a" else "b")))
+        self.assertIsNone(read_token("not a token"))
+        self.assertIsNone(read_token(signing.dumps([42, 5], salt=TOKEN_SALT)))
+
+    def test_other_catalog_version(self):
+        # Check that a token made for another catalog is refused
+        token = signing.dumps([42, 5, "teenager", "0" * 16], salt=TOKEN_SALT, compress=True)
+        self.assertNotEqual(get_catalog().version, "0" * 16)
+        self.assertIsNone(read_token(token))
+
+    def test_expired_token(self):
+        token = make_token(42, 5, "teenager")
+
+        # Check that the token is refused after RECOMMENDATIONS_TOKEN_MAX_AGE seconds
+        now = time.time()
+        with mock.patch("time.time", return_value=now + settings.RECOMMENDATIONS_TOKEN_MAX_AGE - 10):
+            self.assertIsNotNone(read_token(token))
+        with mock.patch("time.time", return_value=now + settings.RECOMMENDATIONS_TOKEN_MAX_AGE + 10):
+            self.assertIsNone(read_token(token))
+
+    @override_settings(API_MAX_NB=10)
+    def test_clamp_nb(self):
+        # Check that the number of recommendations of a token is at most API_MAX_NB
+        self.assertEqual(read_token(make_token(42, 1000, "adult"))[1], 10)
+        token = signing.dumps([42, 1000, "adult", get_catalog().version], salt=TOKEN_SALT, compress=True)
+        self.assertEqual(read_token(token)[1], 10)
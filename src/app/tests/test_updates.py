@@ -0,0 +1,107 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from app.features import NUMERIC_COLUMNS, FeaturePipeline
+from app.neighbors import AGE_CATEGORIES, NeighborIndex, build_indexes, build_neighbor_table
+from app.updates import CatalogUpdate, id_mapping, reconstruction_loss, unknown_rate
+
+
+class IdMappingTest(unittest.TestCase):
+    def test_id_mapping(self):
+        mapping = id_mapping(6, [1, 4])
+        self.assertListEqual(mapping.tolist(), [0, -1, 1, 2, -1, 3])
+
+        # Check that nothing moves without removed movies
+        self.assertListEqual(id_mapping(3, []).tolist(), [0, 1, 2])
+
+
+class CatalogUpdateTest(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.movies = pd.DataFrame({
+            "movie_title": [f"Movie {i}" for i in range(60)],
+            "director_name": rng.choice(["Director 1", "Director 2", "Director 3"], size=60),
+            "actor_1_name": rng.choice(["Actor 1", "Actor 2"], size=60),
+            "actor_2_name": rng.choice(["Actor 3", "Actor 4", ""], size=60),
+            "actor_3_name": rng.choice(["Actor 5", ""], size=60),
+            "language": rng.choice(["English", "French"], size=60),
+            "country": rng.choice(["USA", "France"], size=60),
+            "age_category": rng.choice(["adult", "teenager", "child"], size=60),
+            "content_rating": "R",
+            "genres": rng.choice(["Action", "Drama", "Action|Drama"], size=60),
+            **{column: rng.integers(0, 10_000, size=60).astype(float) for column in NUMERIC_COLUMNS}
+        })
+        # We fit on the first 50 movies, the last 10 are added
+        self.catalog = self.movies.iloc[:50].reset_index(drop=True)
+        self.added = self.movies.iloc[50:].reset_index(drop=True)
+        self.pipeline = FeaturePipeline.fit(self.catalog, n_components=10)
+        self.manifest = {"movies": 50,
+                         "fitted_movies": 50,
+                         "changed_movies": 0,
+                         "reconstruction_loss": self.pipeline.fit_loss}
+
+    def test_new_catalog(self):
+        update = CatalogUpdate(self.catalog, self.added, [3, 7])
+
+        # Check that the removed movies are removed, and that the added movies are at the end
+        self.assertEqual(len(update.movies), 58)
+        self.assertEqual(update.n_changed, 12)
+        self.assertNotIn("Movie 3", update.movies["movie_title"].tolist())
+        self.assertListEqual(update.added_ids.tolist(), list(range(48, 58)))
+        self.assertListEqual(update.added["movie_title"].tolist(), [f"Movie {i}" for i in range(50, 60)])
+
+    def test_missing_columns(self):
+        with self.assertRaises(ValueError):
+            CatalogUpdate(self.catalog, self.added.drop(columns=["genres"]))
+
+    def test_drift(self):
+        # Check that a few movies like the movies of the fit don't drift
+        drift = CatalogUpdate(self.catalog, self.catalog.iloc[:2]).drift(self.pipeline, self.manifest)
+        self.assertAlmostEqual(drift["changed"], 0.04)
+        self.assertEqual(drift["unknown"], 0)
+        self.assertFalse(drift["rebuild"])
+
+        # Check that too many changes or unknown values trigger a rebuild
+        self.assertTrue(CatalogUpdate(self.catalog, self.added).drift(self.pipeline, self.manifest)["rebuild"])
+        unknown = self.added.iloc[:2].copy()
+        unknown[["director_name", "actor_1_name", "actor_2_name", "actor_3_name", "language", "country"]] = "New"
+        drift = CatalogUpdate(self.catalog, unknown).drift(self.pipeline, self.manifest)
+        self.assertAlmostEqual(drift["unknown"], 6 / 8)
+        self.assertTrue(drift["rebuild"])
+
+    def test_unknown_rate_and_reconstruction_loss(self):
+        self.assertEqual(unknown_rate(self.pipeline, self.catalog), 0)
+        self.assertEqual(unknown_rate(self.pipeline, self.catalog.iloc[:0]), 0)
+
+        # Check that the loss on the movies of the fit is the loss of the fit
+        self.assertAlmostEqual(reconstruction_loss(self.pipeline, self.catalog), self.pipeline.fit_loss, places=5)
+
+    def test_update_features_and_indexes(self):
+        features = self.pipeline.transform(self.catalog)
+        movie_ids = self.catalog.index.to_numpy()
+        update = CatalogUpdate(self.catalog, self.added, [3, 7])
+        new_movie_ids, new_features = update.update_features(movie_ids, features, self.pipeline)
+
+        # Check that the features of the kept movies don't change, and that the added movies are transformed
+        self.assertListEqual(new_movie_ids.tolist(), list(range(58)))
+        np.testing.assert_array_equal(new_features[:48], np.delete(features, [3, 7], axis=0))
+        np.testing.assert_allclose(new_features[48:], self.pipeline.transform(self.added), rtol=1e-6)
+
+        # Check that the updated indexes and tables are the indexes and tables of the new features
+        indexes = build_indexes(movie_ids, features, self.catalog)
+        updated_indexes = update.update_indexes(indexes, new_features[48:])
+        expected_indexes = build_indexes(new_movie_ids, new_features, update.movies)
+        tables = {age_category: build_neighbor_table(index, max_nb=1, n_jobs=1)
+                  for age_category, index in indexes.items()}
+        updated_tables = update.update_neighbor_tables(tables, updated_indexes)
+        for age_category in AGE_CATEGORIES:
+            self.assertIsInstance(updated_indexes[age_category], NeighborIndex)
+            self.assertListEqual(sorted(updated_indexes[age_category].movie_ids.tolist()),
+                                 sorted(expected_indexes[age_category].movie_ids.tolist()))
+            expected_table = build_neighbor_table(expected_indexes[age_category], max_nb=1, n_jobs=1)
+            np.testing.assert_array_equal(updated_tables[age_category].neighbor_ids[:, 0],
+                                          expected_table.neighbor_ids[:, 0])
+            np.testing.assert_allclose(updated_tables[age_category].distances, expected_table.distances,
+                                       rtol=1e-5, atol=1e-5)
@@ -2,10 +2,12 @@ import imghdr
 import requests
 import unittest
 
+import numpy as np
 import pandas as pd
 
+from app.catalog import get_catalog
 from app.utils import load_movies, load_recommendations, filter_by_age_category, generate_recommendations, \
-    filter_recommendations, get_thumbnail_url
+    filter_recommendations, get_recommendations_batch, get_recommendations_idx, get_thumbnail_url, in_age_category
 
 
 class LoadMoviesTest(unittest.TestCase):
@@ -90,6 +92,57 @@ class GenerateRecommendationsTest(unittest.TestCase):
         # Check that the DataFrame does not contain the input movie
         self.assertNotIn(title, df["movie_title"])
 
+    def test_unknown_title(self):
+        # Check that an unknown title gives an empty DataFrame ( and no IndexError )
+        df = generate_recommendations(title="This movie doesn't exist", nb=5, age_category="adult")
+        self.assertIsInstance(df, pd.DataFrame)
+        self.assertEqual(len(df), 0)
+
+    def test_basket(self):
+        catalog = get_catalog()
+        titles = ["Spider-Man 3", "Avatar", "The Dark Knight Rises"]
+        df = generate_recommendations(title=titles, nb=5, age_category="adult")
+
+        # Check that the basket gets nb * 10 recommendations, without the movies of the basket
+        self.assertEqual(len(df), 50)
+        self.assertFalse(set(df.index) & {catalog.find_title(title) for title in titles})
+        self.assertEqual(len(set(df.index)), 50)
+
+        # Check that a basket of 1 movie gets the recommendations of the movie, and that an unknown title gets nothing
+        np.testing.assert_array_equal(generate_recommendations(title=titles[:1]).index,
+                                      generate_recommendations(title=titles[0]).index)
+        self.assertEqual(len(generate_recommendations(title=[titles[0], "This movie doesn't exist"])), 0)
+
+
+class GetRecommendationsBatchTest(unittest.TestCase):
+    def test_get_recommendations_batch(self):
+        catalog = get_catalog()
+        queries = [(catalog.find_title("Spider-Man 3"), 5, "adult"),
+                   (catalog.find_title("Avatar"), 2, "adult"),
+                   (catalog.find_title("Spider-Man 3"), 3, "teenager")]
+        results = get_recommendations_batch(queries)
+
+        # Check that each query gets the same neighbors as a single query
+        for (movie_id, nb, age_category), (distances, indices) in zip(queries, results):
+            self.assertEqual(len(distances), nb * 10)
+            np.testing.assert_array_equal(indices, get_recommendations_idx(movie_id, nb, age_category))
+
+    def test_other_age_category(self):
+        # Check that a movie which is not in the index of the age category gets None
+        movie_id = get_catalog().find_title("Avatar")
+        self.assertIsNone(get_recommendations_batch([(movie_id, 5, "child")])[0])
+
+
+class InAgeCategoryTest(unittest.TestCase):
+    def test_in_age_category(self):
+        catalog = get_catalog()
+        movie_ids = [catalog.find_title("Spider-Man 3"), catalog.find_title("Avatar")]
+        self.assertTrue(in_age_category(movie_ids, 5, "adult"))
+        self.assertTrue(in_age_category(movie_ids[:1], 5, "teenager"))
+
+        # Check that a basket with a movie of another age category is not in the age category
+        self.assertFalse(in_age_category(movie_ids, 5, "child"))
+
 
 class FilterRecommendationsTest(unittest.TestCase):
     def setUp(self):
@@ -153,6 +206,40 @@ class FilterRecommendationsTest(unittest.TestCase):
         filtered_df = filter_recommendations(self.df, choices, nb=1)
         self.assertEqual(filtered_df.iloc[0]["director_name"], "Director 1")
 
+    def test_keep_neighbors_order(self):
+        df = pd.DataFrame({
+            "language": ["English", "French", "English", "English", "English"],
+            "duration": [200, 80, 100, 85, 130],
+            "genres": ["Drama", "Drama|Comedy", "Comedy", "Drama|Comedy", "Action"],
+            "actor_1_name": ["Actor 1", "Actor 2", "Actor 3", "Actor 4", "Actor 5"],
+            "actor_2_name": ["Actor 2", "", "Actor 1", "", ""],
+            "director_name": ["Director 1", "Director 2", "Director 3", "Director 1", "Director 4"]
+        }, index=[10, 11, 12, 13, 14])
+
+        # Check that the durations don't reorder the movies
+        choices = {"languages": ["English"], "duration": ["2", "0"], "filter": "none",
+                   "genres": [], "actors": [], "directors": []}
+        self.assertListEqual(filter_recommendations(df, choices, nb=5).index.tolist(), [13, 14])
+
+        # Check that the durations are ignored if no movie has them
+        choices["duration"] = ["1"]
+        choices["languages"] = ["French"]
+        self.assertListEqual(filter_recommendations(df, choices, nb=5).index.tolist(), [11])
+
+        # Check that the movies with the same score stay in the order of the neighbors
+        choices = {"languages": [], "duration": [], "filter": "genres",
+                   "genres": ["Drama", "Comedy"], "actors": [], "directors": []}
+        self.assertListEqual(filter_recommendations(df, choices, nb=5).index.tolist(), [11, 13, 10, 12, 14])
+
+        # Check that all the actors are counted
+        choices = {"languages": [], "duration": [], "filter": "actors",
+                   "genres": [], "actors": ["Actor 1", "Actor 2"], "directors": []}
+        self.assertListEqual(filter_recommendations(df, choices, nb=3).index.tolist(), [10, 11, 12])
+
+        choices = {"languages": [], "duration": [], "filter": "directors",
+                   "genres": [], "actors": [], "directors": ["Director 1"]}
+        self.assertListEqual(filter_recommendations(df, choices, nb=3).index.tolist(), [10, 13, 11])
+
 
 class GetThumbnailUrlTest(unittest.TestCase):
     def test_get_thumbnail_url(self):
@@ -1,8 +1,17 @@
+import gzip
+import json
+import time
+from unittest import mock
+
 import numpy as np
-from django.test import TestCase, RequestFactory, Client
+from asgiref.sync import async_to_sync
+from django.test import TestCase, RequestFactory, Client, override_settings
 from django.urls import reverse
 
-from app.utils import generate_recommendations
+from app.catalog import get_catalog
+from app.offload import BoundedExecutor, Overloaded
+from app.tokens import make_token
+from app.utils import generate_recommendations, load_recommendations
 from app.views import index, questionnaire, result
 
 
@@ -31,7 +40,7 @@ class QuestionnaireViewTest(TestCase):
     def test_not_allowed_request(self):
         # Test GET request
         request = self.factory.get(reverse('app:questionnaire'))
-        response = questionnaire(request)
+        response = async_to_sync(questionnaire)(request)
 
         # Check the returned status code and message
         self.assertEqual(response.status_code, 405)  # 405 for method not allowed
@@ -58,6 +67,95 @@ class QuestionnaireViewTest(TestCase):
         self.assertIn("title", response.context)
         self.assertIn("nb", response.context)
 
+    def test_token_handoff(self):
+        response = self.client.post(reverse('app:questionnaire'), data={
+            'title': 'Spider-Man 3',
+            'recommendationsNumber': '5',
+            'age': 'adult',
+        })
+
+        # Check that the recommendations are handed off in the form, not in the session
+        self.assertTrue(response.context["token"])
+        self.assertIn('name="token"', response.content.decode())
+        self.assertNotIn("recommendations_idx", self.client.session)
+
+    @override_settings(RECOMMENDATIONS_HANDOFF="session")
+    def test_session_handoff(self):
+        response = self.client.post(reverse('app:questionnaire'), data={
+            'title': 'Spider-Man 3',
+            'recommendationsNumber': '5',
+            'age': 'adult',
+        })
+
+        # Check that the recommendations are in the session
+        self.assertIsNone(response.context["token"])
+        self.assertEqual(len(self.client.session["recommendations_idx"]), 50)
+
+    def test_basket(self):
+        # Test POST request with several titles
+        response = self.client.post(reverse('app:questionnaire'), data={
+            'title': ['Spider-Man 3', 'Avatar'],
+            'recommendationsNumber': '5',
+            'age': 'adult',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["title"], "Spider-Man 3, Avatar")
+
+        # Check that the result page gets the recommendations of the basket from the token
+        response = self.client.post(reverse('app:result'), data={
+            "token": response.context["token"],
+            "age": "adult",
+            "filter": "none"
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["title"], "Spider-Man 3, Avatar")
+        self.assertEqual(len(response.context["recommended_films"]), 5)
+
+    @override_settings(BASKET_MAX_TITLES=1)
+    def test_too_many_titles(self):
+        response = self.client.post(reverse('app:questionnaire'), data={
+            'title': ['Spider-Man 3', 'Avatar'],
+            'recommendationsNumber': '5',
+            'age': 'adult',
+        })
+        self.assertEqual(response.status_code, 400)
+
+    def test_unknown_title(self):
+        # Test POST request with a title not in the catalog
+        response = self.client.post(reverse('app:questionnaire'), data={
+            'title': "This movie doesn't exist",
+            'recommendationsNumber': '5',
+            'age': 'adult',
+        })
+
+        # Check the returned status code and message
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Ce film n'est pas dans notre catalogue", response.content.decode())
+
+    def test_age_category(self):
+        # Test POST request with an adult movie for a child, and with an age category which doesn't exist
+        for title, age in [("Terminator 3: Rise of the Machines", "child"), ("Spider-Man 3", "bogus")]:
+            response = self.client.post(reverse('app:questionnaire'), data={
+                'title': title,
+                'recommendationsNumber': '5',
+                'age': age,
+            })
+
+            # Check the returned status code and message
+            self.assertEqual(response.status_code, 400)
+            self.assertIn("Ce film n'est pas dans cette catégorie d'âge", response.content.decode())
+
+    def test_overloaded(self):
+        # Check that the request is rejected when the executor of the recommendations is full
+        with mock.patch.object(BoundedExecutor, "run", mock.AsyncMock(side_effect=Overloaded())):
+            response = self.client.post(reverse('app:questionnaire'), data={
+                'title': 'Spider-Man 3',
+                'recommendationsNumber': '5',
+                'age': 'adult',
+            })
+        self.assertEqual(response.status_code, 503)
+        self.assertIn("Retry-After", response)
+
 
 class ResultViewTest(TestCase):
     def setUp(self):
@@ -67,7 +165,7 @@ class ResultViewTest(TestCase):
     def test_not_allowed_request(self):
         # Test GET request
         request = self.factory.get(reverse('app:result'))
-        response = result(request)
+        response = async_to_sync(result)(request)
 
         # Check the returned status code and message
         self.assertEqual(response.status_code, 405)  # 405 for method not allowed
@@ -108,6 +206,55 @@ class ResultViewTest(TestCase):
         self.assertIn("nb", response.context)
         self.assertIn("recommended_films", response.context)
 
+    def test_token_request(self):
+        # Test POST request with the token of the questionnaire ( no session )
+        response = self.client.post(reverse('app:result'), data={
+            "token": make_token(generate_recommendations("Spider-Man 3").index[0], 5, "adult"),
+            "age": "adult",
+            "duration": [],
+            "filter": "none"
+        })
+
+        # Check the returned status code and the recommendations
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["nb"], 5)
+        self.assertEqual(len(response.context["recommended_films"]), 5)
+
+    def test_invalid_token(self):
+        response = self.client.post(reverse('app:result'), data={"token": "invalid", "filter": "none"})
+
+        # Check the returned status code and message
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Cette page a expiré", response.content.decode())
+
+    def test_token_age_category(self):
+        # Test POST request with a token of an adult movie for a child, and of an age category which doesn't exist
+        for title, age in [("Terminator 3: Rise of the Machines", "child"), ("Spider-Man 3", "bogus")]:
+            token = make_token(get_catalog().find_title(title), 5, age)
+            response = self.client.post(reverse('app:result'), data={"token": token, "filter": "none"})
+            self.assertEqual(response.status_code, 400)
+            self.assertIn("Cette page a expiré", response.content.decode())
+
+    def test_expired_token(self):
+        token = make_token(generate_recommendations("Spider-Man 3").index[0], 5, "adult")
+
+        # Check that the result page of an old token has expired
+        with override_settings(RECOMMENDATIONS_TOKEN_MAX_AGE=60), \
+                mock.patch("time.time", return_value=time.time() + 3600):
+            response = self.client.post(reverse('app:result'), data={"token": token, "filter": "none"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Cette page a expiré", response.content.decode())
+
+    def test_no_handoff(self):
+        # Test POST request without token and without recommendations in the session
+        with mock.patch("app.views.aget_thumbnail_urls") as aget_thumbnail_urls:
+            response = self.client.post(reverse('app:result'), data={"filter": "none"})
+
+        # Check that the request is rejected before loading the recommendations
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Cette page a expiré", response.content.decode())
+        aget_thumbnail_urls.assert_not_called()
+
 
 class GetMovieTitlesViewTest(TestCase):
     def setUp(self):
@@ -131,3 +278,100 @@ class GetMovieTitlesViewTest(TestCase):
         self.assertIsInstance(data["adult"], list)
         self.assertIsInstance(data["teenager"], list)
         self.assertIsInstance(data["child"], list)
+
+    def test_etag(self):
+        response = self.client.get(reverse('app:get_movie_titles'))
+
+        # Check the cache headers
+        self.assertIn("ETag", response)
+        self.assertIn("max-age", response["Cache-Control"])
+        self.assertIn("Accept-Encoding", response["Vary"])
+
+        # Check that a request with the same ETag gets a 304 without content
+        response = self.client.get(reverse('app:get_movie_titles'), HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+        self.assertIn("ETag", response)
+
+        # And a request with another ETag gets the titles
+        response = self.client.get(reverse('app:get_movie_titles'), HTTP_IF_NONE_MATCH='"outdated"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_gzip(self):
+        response = self.client.get(reverse('app:get_movie_titles'), HTTP_ACCEPT_ENCODING="gzip, deflate")
+
+        # Check that the compressed response contains the same titles
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        data = json.loads(gzip.decompress(response.content))
+        self.assertDictEqual(data, self.client.get(reverse('app:get_movie_titles')).json())
+
+        # Check that the 2 encodings have different ETags
+        self.assertNotEqual(response["ETag"], self.client.get(reverse('app:get_movie_titles'))["ETag"])
+
+    def test_cached_payload(self):
+        self.client.get(reverse('app:get_movie_titles'))
+
+        # Check that the cached titles are served when the executor of the recommendations is full
+        with mock.patch.object(BoundedExecutor, "run", mock.AsyncMock(side_effect=Overloaded())) as run:
+            response = self.client.get(reverse('app:get_movie_titles'))
+        self.assertEqual(response.status_code, 200)
+        run.assert_not_called()
+
+
+class RecommendationsApiViewTest(TestCase):
+    def setUp(self):
+        self.client = Client()
+
+    def test_get_request(self):
+        response = self.client.get(reverse('app:recommendations_api'), {"title": "Spider-Man 3", "nb": 3})
+        self.assertEqual(response.status_code, 200)
+
+        # Check that the recommendations are the first neighbors ( there is no choice )
+        result = response.json()["results"][0]
+        self.assertEqual(result["title"], "Spider-Man 3")
+        self.assertEqual(len(result["recommendations"]), 3)
+        expected = generate_recommendations("Spider-Man 3", 3, "adult").index[:3].tolist()
+        self.assertListEqual([movie["id"] for movie in result["recommendations"]], expected)
+
+        # Check that the distances are sorted
+        distances = [movie["distance"] for movie in result["recommendations"]]
+        self.assertListEqual(distances, sorted(distances))
+
+    def test_post_batch(self):
+        queries = [{"title": "Spider-Man 3", "nb": 5, "age": "adult", "languages": ["English"]},
+                   {"title": "Avatar", "nb": 2, "age": "teenager"},
+                   {"title": "This movie doesn't exist"},
+                   {"title": "Avatar", "age": "child"}]
+        response = self.client.post(reverse('app:recommendations_api'), json.dumps({"queries": queries}),
+                                    content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        results = response.json()["results"]
+
+        # Check that each query gets his result, in the order of the queries
+        self.assertEqual(len(results), 4)
+        self.assertEqual(len(results[0]["recommendations"]), 5)
+        self.assertEqual(len(results[1]["recommendations"]), 2)
+        self.assertEqual(results[1]["age"], "teenager")
+        self.assertIn("error", results[2])
+        self.assertIn("error", results[3])
+
+        # Check that the choices filter the recommendations
+        languages = load_recommendations([movie["id"] for movie in results[0]["recommendations"]])["language"]
+        self.assertTrue((languages == "English").all())
+
+    def test_invalid_queries(self):
+        url = reverse('app:recommendations_api')
+
+        # Check that the invalid queries get a 400 with an error
+        for response in [self.client.get(url),
+                         self.client.get(url, {"title": "Avatar", "nb": "five"}),
+                         self.client.get(url, {"title": "Avatar", "age": "baby"}),
+                         self.client.get(url, {"title": "Avatar", "nb": 1000}),
+                         self.client.post(url, "{", content_type="application/json"),
+                         self.client.post(url, json.dumps({"queries": [{"nb": 5}]}),
+                                          content_type="application/json")]:
+            self.assertEqual(response.status_code, 400)
+            self.assertIn("error", response.json())
+
+        # Check the methods
+        self.assertEqual(self.client.put(url).status_code, 405)
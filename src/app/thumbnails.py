@@ -0,0 +1,162 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Thumbnail
+from .timing import timer
+from .utils import get_gallery_url, parse_thumbnail_url
+
+
+logger = logging.getLogger(__name__)
+
+
+# The HTTP client of the process and its event loop, opened and closed by the ASGI server ( see project/asgi.py )
+PROCESS_CLIENT = {}
+
+
+def new_client():
+    """Function to get a new HTTP client to scrap IMDB
+
+    Returns:
+        httpx.AsyncClient: The client ( THUMBNAIL_WORKERS connections at most )
+    """
+    # The HTTP client is imported when we scrap IMDB, not when the worker starts
+    import httpx
+
+    return httpx.AsyncClient(limits=httpx.Limits(max_connections=settings.THUMBNAIL_WORKERS), follow_redirects=True)
+
+
+async def open_client():
+    """Function to open the HTTP client of the process, its connections are reused across the requests
+
+    It's called at the startup of the ASGI server, on the event loop of the requests
+    """
+    PROCESS_CLIENT["client"] = new_client()
+    PROCESS_CLIENT["loop"] = asyncio.get_running_loop()
+
+
+async def close_client():
+    """Function to close the HTTP client of the process, it's called at the shutdown of the ASGI server"""
+    client = PROCESS_CLIENT.pop("client", None)
+    PROCESS_CLIENT.pop("loop", None)
+    if client is not None:
+        await client.aclose()
+
+
+@asynccontextmanager
+async def client_session():
+    """Context manager to get the HTTP client of a batch of requests
+
+    The client of the process is used if it's open on this event loop, else ( WSGI, tests ) we open a client for the
+    batch and we close it at the end, the connections of a client can't be used by another event loop
+
+    Yields:
+        httpx.AsyncClient: The client
+    """
+    if PROCESS_CLIENT.get("loop") is asyncio.get_running_loop():
+        yield PROCESS_CLIENT["client"]
+    else:
+        async with new_client() as client:
+            yield client
+
+
+async def afetch_thumbnail_url(client, url):
+    """Function to scrap the thumbnail URL of a movie without blocking the event loop, without raising an exception
+
+    Args:
+        client (httpx.AsyncClient): The client ( see client_session )
+        url (str): The url of the movie
+
+    Returns:
+        str: The url of the movie image, or None if we didn't get it
+    """
+    import httpx
+
+    # The requests wait for a connection of the client without timeout, only IMDB is timed out
+    timeout = httpx.Timeout(settings.THUMBNAIL_TIMEOUT, pool=None)
+    try:
+        with timer("imdb"):
+            response = await client.get(get_gallery_url(url), timeout=timeout)
+            response.raise_for_status()
+    except httpx.HTTPError as e:
+        logger.warning("Can't get the thumbnail of %s: %s", url, e)
+        return None
+
+    # The HTML is parsed in a thread, so it doesn't block the other requests of the event loop
+    return await sync_to_async(parse_thumbnail_url, thread_sensitive=False)(response.text)
+
+
+def is_fresh(thumbnail, now):
+    """Function to know if a cached thumbnail is still valid
+
+    Args:
+        thumbnail (Thumbnail): The cached thumbnail
+        now (datetime.datetime): The current time
+
+    Returns:
+        bool: True if the thumbnail is still valid
+    """
+    if thumbnail.thumbnail_url is None:
+        ttl = settings.THUMBNAIL_NEGATIVE_CACHE_TTL
+    else:
+        ttl = settings.THUMBNAIL_CACHE_TTL
+    return now - thumbnail.fetched_at < timedelta(seconds=ttl)
+
+
+# The bulk_create arguments to insert the thumbnails, or update them if they are already in the cache
+UPSERT = {"update_conflicts": True,
+          "unique_fields": ["movie_url"],
+          "update_fields": ["thumbnail_url", "fetched_at"]}
+
+
+def new_thumbnails(fetched, now):
+    """Function to get the Thumbnail objects of the thumbnails we scraped
+
+    Args:
+        fetched (dict): The url of the image of each movie ( None if we didn't get it )
+        now (datetime.datetime): The time of the scraping
+
+    Returns:
+        list: The Thumbnail objects ( not saved )
+    """
+    return [Thumbnail(movie_url=url, thumbnail_url=thumbnail_url, fetched_at=now)
+            for url, thumbnail_url in fetched.items()]
+
+
+async def aget_thumbnail_urls(urls):
+    """Function to get the thumbnail URLs of several movies
+
+    We read them in the database, and we scrap the missing or expired ones concurrently on the event loop
+    ( THUMBNAIL_WORKERS connections at most ), so a slow IMDB response doesn't hold a thread
+
+    Args:
+        urls (iterable): The urls of the movies
+
+    Returns:
+        dict: The url of the image of each movie ( None if we didn't get it )
+    """
+    urls = list(dict.fromkeys(urls))
+    now = timezone.now()
+
+    # We get the thumbnails still valid in the cache
+    thumbnail_urls = {thumbnail.movie_url: thumbnail.thumbnail_url
+                      async for thumbnail in Thumbnail.objects.filter(movie_url__in=urls)
+                      if is_fresh(thumbnail, now)}
+
+    # We scrap the others concurrently
+    missing_urls = [url for url in urls if url not in thumbnail_urls]
+    if missing_urls:
+        async with client_session() as client:
+            thumbnails = await asyncio.gather(*[afetch_thumbnail_url(client, url) for url in missing_urls])
+        fetched = dict(zip(missing_urls, thumbnails))
+        thumbnail_urls.update(fetched)
+
+        # And we store them in the cache ( the not found thumbnails too )
+        await Thumbnail.objects.abulk_create(new_thumbnails(fetched, now), **UPSERT)
+
+    return {url: thumbnail_urls[url] for url in urls}
@@ -0,0 +1,185 @@
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from time import perf_counter
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+
+# The timings of the current request, a list of ( stage, seconds ), None if we don't time the request
+_timings = ContextVar("timings", default=None)
+
+# The upper bounds of the buckets of the histograms ( in seconds ), from 0.1 ms to ~ 100 s, 4 buckets by doubling
+BUCKETS = [0.0001 * 2 ** (i / 4) for i in range(81)]
+
+
+@contextmanager
+def timer(stage):
+    """Context manager to time a stage of the current request
+
+    It does nothing if the request isn't timed ( see TimingMiddleware ), so it can stay in the hot path
+
+    Args:
+        stage (str): The name of the stage
+    """
+    timings = _timings.get()
+    if timings is None:
+        yield
+        return
+
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        timings.append((stage, perf_counter() - start))
+
+
+class Histogram:
+    """The distribution of the durations of a stage, in fixed buckets ( its memory doesn't grow with the requests )"""
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        """Method to add a duration"""
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def quantile(self, q):
+        """Method to get a quantile of the durations, it's the upper bound of its bucket
+
+        Args:
+            q (float): The quantile ( between 0 and 1 )
+
+        Returns:
+            float: The quantile in seconds ( inf if it's beyond the last bucket, None if there is no duration )
+        """
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return BUCKETS[bucket] if bucket < len(BUCKETS) else float("inf")
+        return float("inf")
+
+
+class Metrics:
+    """The histograms of the stages of the process ( each worker process has its own )"""
+    def __init__(self):
+        self.histograms = {}
+        self.lock = threading.Lock()
+
+    def observe(self, timings):
+        """Method to add the timings of a request
+
+        Args:
+            timings (list): The ( stage, seconds ) of the request
+        """
+        with self.lock:
+            for stage, seconds in timings:
+                self.histograms.setdefault(stage, Histogram()).observe(seconds)
+
+    def to_text(self, quantiles=(0.5, 0.95, 0.99)):
+        """Method to get the metrics in the Prometheus text format
+
+        Args:
+            quantiles (tuple, optional): The quantiles of each stage. Defaults to (0.5, 0.95, 0.99).
+
+        Returns:
+            str: The metrics
+        """
+        lines = ["# HELP app_stage_seconds The duration of the stages of the requests",
+                 "# TYPE app_stage_seconds summary"]
+        with self.lock:
+            for stage, histogram in sorted(self.histograms.items()):
+                for q in quantiles:
+                    lines.append(f'app_stage_seconds{{stage="{stage}",quantile="{q}"}} {histogram.quantile(q):.6g}')
+                lines.append(f'app_stage_seconds_sum{{stage="{stage}"}} {histogram.sum:.6g}')
+                lines.append(f'app_stage_seconds_count{{stage="{stage}"}} {histogram.count}')
+        return "\n".join(lines) + "\n"
+
+
+@lru_cache(maxsize=None)
+def get_metrics():
+    """Function to get the metrics of the process
+
+    Returns:
+        Metrics: The shared metrics
+    """
+    return Metrics()
+
+
+def server_timing(timings):
+    """Function to get the Server-Timing header of the timings of a request
+
+    The durations of a stage are summed ( the IMDB scrapes are concurrent, so their sum can exceed the total )
+
+    Args:
+        timings (list): The ( stage, seconds ) of the request
+
+    Returns:
+        str: The value of the header
+    """
+    stages = {}
+    for stage, seconds in timings:
+        total, count = stages.get(stage, (0.0, 0))
+        stages[stage] = (total + seconds, count + 1)
+    return ", ".join(f'{stage};dur={total * 1000:.1f}' + (f';desc="{count} calls"' if count > 1 else "")
+                     for stage, (total, count) in stages.items())
+
+
+class TimingMiddleware:
+    """The middleware to time the stages of the requests when the TIMING_ENABLED setting is True
+
+    The timings are sent in the Server-Timing header and added to the histograms of the /metrics/ endpoint
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not settings.TIMING_ENABLED:
+            return self.get_response(request)
+
+        timings = []
+        token = _timings.set(timings)
+        start = perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _timings.reset(token)
+        return self.process_timings(response, timings, perf_counter() - start)
+
+    async def __acall__(self, request):
+        if not settings.TIMING_ENABLED:
+            return await self.get_response(request)
+
+        timings = []
+        token = _timings.set(timings)
+        start = perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _timings.reset(token)
+        return self.process_timings(response, timings, perf_counter() - start)
+
+    @staticmethod
+    def process_timings(response, timings, seconds):
+        """Method to add the timings to the response and to the metrics"""
+        timings.append(("total", seconds))
+        response["Server-Timing"] = server_timing(timings)
+        get_metrics().observe(timings)
+        return response
@@ -0,0 +1,52 @@
+import gzip
+import hashlib
+import json
+from functools import lru_cache
+
+from .neighbors import AGE_CATEGORIES
+from .utils import filter_by_age_category
+
+
+class TitlesPayload:
+    """The response of the get-titles endpoint, serialized and compressed once
+
+    Args:
+        titles (dict): The sorted titles of each age category
+    """
+    def __init__(self, titles):
+        self.titles = titles
+        self.content = json.dumps(titles, separators=(",", ":")).encode()
+
+        # mtime=0, so the compressed bytes ( and their ETag ) only depend on the content
+        self.gzip_content = gzip.compress(self.content, compresslevel=9, mtime=0)
+
+        # Strong ETags, the 2 encodings are 2 different representations
+        digest = hashlib.sha256(self.content).hexdigest()[:32]
+        self.etag = f'"{digest}"'
+        self.gzip_etag = f'"{digest}-gzip"'
+
+    @classmethod
+    def from_movies(cls, df):
+        """Method to build the payload from a movies dataframe
+
+        Args:
+            df (pd.DataFrame): A movies dataframe
+
+        Returns:
+            TitlesPayload: The payload
+        """
+        return cls({age_category: sorted(filter_by_age_category(df, age_category)["movie_title"].tolist())
+                    for age_category in AGE_CATEGORIES})
+
+
+@lru_cache(maxsize=1)
+def get_titles_payload(catalog):
+    """Function to get the payload of a catalog, it's built at the first call for each catalog
+
+    Args:
+        catalog (Catalog): The catalog
+
+    Returns:
+        TitlesPayload: The payload
+    """
+    return TitlesPayload.from_movies(catalog.frame(["movie_title", "age_category"]))
@@ -0,0 +1,55 @@
+import numpy as np
+from django.conf import settings
+from django.core import signing
+
+from .catalog import get_catalog
+
+
+# The salt of the signatures, so a token can't be used by another part of the project
+TOKEN_SALT = "app.recommendations"
+
+
+def clamp_nb(nb):
+    """Function to get a number of recommendations between 1 and API_MAX_NB, like the recommendations API"""
+    return min(max(int(nb), 1), settings.API_MAX_NB)
+
+
+def make_token(movie_id, nb, age_category):
+    """Function to get the signed token handing off a recommendation request from the questionnaire to the result page
+
+    The token contains the catalog version, because the indexes of the movies are only valid for this catalog, and it
+    expires after RECOMMENDATIONS_TOKEN_MAX_AGE seconds
+
+    Args:
+        movie_id (int or list): The index in the catalog of the movie selected by the user, or the indexes of the
+                                movies of a basket
+        nb (int): The number of recommendations ( at most API_MAX_NB )
+        age_category (str): The age category
+
+    Returns:
+        str: The token ( it's URL-safe )
+    """
+    movie_id = int(movie_id) if np.ndim(movie_id) == 0 else [int(idx) for idx in movie_id]
+    return signing.dumps([movie_id, clamp_nb(nb), age_category, get_catalog().version], salt=TOKEN_SALT,
+                         compress=True)
+
+
+def read_token(token):
+    """Function to read a token made by make_token
+
+    Args:
+        token (str): The token
+
+    Returns:
+        tuple: The movie index ( or the indexes of a basket ), the number of recommendations ( at most API_MAX_NB ) and
+               the age category, or None if the token is invalid, expired or made for another catalog version
+    """
+    try:
+        movie_id, nb, age_category, version = signing.loads(token, salt=TOKEN_SALT,
+                                                            max_age=settings.RECOMMENDATIONS_TOKEN_MAX_AGE)
+    except (signing.SignatureExpired, signing.BadSignature, ValueError, TypeError):
+        # The result page answers them with its expired page
+        return None
+    if version != get_catalog().version:
+        return None
+    return movie_id, clamp_nb(nb), age_category
@@ -0,0 +1,182 @@
+import numpy as np
+import pandas as pd
+
+from .features import TEXTUAL_COLUMNS
+from .neighbors import AGE_CATEGORIES
+
+
+# The drift beyond which the pipeline, the features and the indexes are fitted again on the whole catalog:
+#   - the movies added or removed since the fit ( part of the movies of the fit )
+#   - the textual values of the added movies never seen by the encoders ( they are in the unknown bucket )
+#   - the part of the added movies lost by the TruncatedSVD, compared to the part lost on the movies of the fit
+MAX_CHANGED = 0.1
+MAX_UNKNOWN = 0.5
+MAX_LOSS_RATIO = 2.0
+
+
+def id_mapping(n_movies, removed_ids):
+    """Function to get the new index in the catalog of each movie when we remove some movies
+
+    Args:
+        n_movies (int): The number of movies in the catalog
+        removed_ids (iterable): The indexes in the catalog of the removed movies
+
+    Returns:
+        np.ndarray: The new index of each movie ( -1 for the removed movies )
+    """
+    keep = np.ones(n_movies, dtype=bool)
+    keep[np.asarray(list(removed_ids), dtype=np.intp)] = False
+    mapping = np.full(n_movies, -1, dtype=np.int64)
+    mapping[keep] = np.arange(keep.sum())
+    return mapping
+
+
+def unknown_rate(pipeline, movies):
+    """Function to get the part of the textual values of the movies never seen by the encoders of a pipeline
+
+    Args:
+        pipeline (FeaturePipeline): The fitted pipeline
+        movies (pd.DataFrame): A movies dataframe
+
+    Returns:
+        float: The part of the unknown values ( 0 if there is no movie )
+    """
+    if not len(movies):
+        return 0.0
+    columns = [*TEXTUAL_COLUMNS, "genres"]
+    categories = [*pipeline.textual_encoder.categories_, pipeline.genres_encoder.categories_[0]]
+    unknown = [~movies[column].isin(column_categories) for column, column_categories in zip(columns, categories)]
+    return float(np.mean(unknown))
+
+
+def reconstruction_loss(pipeline, movies):
+    """Function to get the part of the encoded movies lost by the TruncatedSVD of a pipeline
+
+    Args:
+        pipeline (FeaturePipeline): The fitted pipeline
+        movies (pd.DataFrame): A movies dataframe
+
+    Returns:
+        float: The part lost ( 0 if there is no movie )
+    """
+    if not len(movies):
+        return 0.0
+    return pipeline.reconstruction_loss(pipeline.encode(movies))
+
+
+class CatalogUpdate:
+    """An incremental update of the catalog: movies removed, and movies added at the end
+
+    The indexes in the catalog of the movies after a removed movie change, mapping gives their new index
+
+    Args:
+        movies (pd.DataFrame): The movies dataframe of the catalog
+        added (pd.DataFrame): The added movies ( with the columns of the catalog )
+        removed_ids (iterable, optional): The indexes in the catalog of the removed movies. Defaults to ().
+    """
+    def __init__(self, movies, added, removed_ids=()):
+        missing = set(movies.columns) - set(added.columns)
+        if missing:
+            raise ValueError(f"The added movies have no column {', '.join(sorted(missing))}")
+
+        self.mapping = id_mapping(len(movies), removed_ids)
+        self.n_removed = int((self.mapping < 0).sum())
+        kept = movies[self.mapping >= 0]
+        self.movies = pd.concat([kept, added[movies.columns]], ignore_index=True)
+
+        # The added movies, with their index in the new catalog
+        self.added = self.movies.iloc[len(kept):]
+        self.added_ids = self.added.index.to_numpy()
+
+    @property
+    def n_changed(self):
+        return len(self.added) + self.n_removed
+
+    def drift(self, pipeline, manifest, max_changed=MAX_CHANGED, max_unknown=MAX_UNKNOWN,
+              max_loss_ratio=MAX_LOSS_RATIO):
+        """Method to measure the drift of the catalog since the fit of the pipeline
+
+        Args:
+            pipeline (FeaturePipeline): The fitted pipeline
+            manifest (dict): The manifest of the features ( see features.save_features )
+            max_changed (float, optional): The threshold of the changed movies. Defaults to MAX_CHANGED.
+            max_unknown (float, optional): The threshold of the unknown values. Defaults to MAX_UNKNOWN.
+            max_loss_ratio (float, optional): The threshold of the part lost. Defaults to MAX_LOSS_RATIO.
+
+        Returns:
+            dict: The measures, and 'rebuild' True if a measure is beyond its threshold
+        """
+        fitted_movies = manifest.get("fitted_movies", manifest["movies"])
+        changed = (manifest.get("changed_movies", 0) + self.n_changed) / fitted_movies
+        unknown = unknown_rate(pipeline, self.added)
+        loss_ratio = reconstruction_loss(pipeline, self.added) / max(manifest["reconstruction_loss"], 1e-6)
+        return {"changed": changed,
+                "unknown": unknown,
+                "loss_ratio": loss_ratio,
+                "rebuild": changed > max_changed or unknown > max_unknown or loss_ratio > max_loss_ratio}
+
+    def update_features(self, movie_ids, features, pipeline):
+        """Method to update the features: the removed movies are removed, the added movies are transformed
+        with the fitted pipeline ( the unknown values are in the unknown bucket of the encoders )
+
+        Args:
+            movie_ids (np.ndarray): The index in the catalog of the movie of each row of features
+            features (np.ndarray): The features of the movies
+            pipeline (FeaturePipeline): The fitted pipeline
+
+        Returns:
+            tuple: The index in the new catalog of the movie of each row, and the features
+        """
+        new_ids = self.mapping[movie_ids]
+        keep = new_ids >= 0
+        added_features = pipeline.transform(self.added) if len(self.added) else \
+            np.empty((0, features.shape[1]), dtype=np.float32)
+        return (np.concatenate([new_ids[keep], self.added_ids]),
+                np.vstack([np.asarray(features[keep], dtype=np.float32), added_features]))
+
+    def added_by_age_category(self, features):
+        """Method to get the added movies of each age category
+
+        Args:
+            features (np.ndarray): The features of the added movies
+
+        Returns:
+            dict: The indexes in the new catalog and the features of the added movies of each age category
+        """
+        # This import is here to avoid a circular import
+        from .utils import filter_by_age_category
+
+        added = {}
+        for age_category in AGE_CATEGORIES:
+            mask = np.isin(self.added_ids, filter_by_age_category(self.added, age_category).index)
+            added[age_category] = (self.added_ids[mask], features[mask])
+        return added
+
+    def update_indexes(self, indexes, features):
+        """Method to update the index of each age category ( see NeighborIndex.update and IVFIndex.update )
+
+        Args:
+            indexes (dict): The index of each age category
+            features (np.ndarray): The features of the added movies
+
+        Returns:
+            dict: The updated index of each age category
+        """
+        return {age_category: indexes[age_category].update(self.mapping, age_features, age_ids)
+                for age_category, (age_ids, age_features) in self.added_by_age_category(features).items()}
+
+    def update_neighbor_tables(self, tables, indexes):
+        """Method to update the neighbor table of each age category ( see NeighborTable.update )
+
+        Args:
+            tables (dict): The NeighborTable of each age category
+            indexes (dict): The updated exact index of each age category
+
+        Returns:
+            dict: The updated NeighborTable of each age category
+        """
+        added_ids = {age_category: np.isin(self.added_ids,
+                                           indexes[age_category].movie_ids) for age_category in AGE_CATEGORIES}
+        return {age_category: tables[age_category].update(self.mapping, indexes[age_category],
+                                                          self.added_ids[added_ids[age_category]])
+                for age_category in AGE_CATEGORIES}
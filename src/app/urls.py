@@ -1,7 +1,7 @@
 from django.urls import path
 
 
-from .views import index, questionnaire, result, get_movie_titles
+from .views import index, questionnaire, result, get_movie_titles, recommendations_api, metrics
 
 app_name = "app"
 
@@ -9,5 +9,7 @@ urlpatterns = [
     path("", index, name="index"),
     path("questionnaire/", questionnaire, name="questionnaire"),
     path("result/", result, name="result"),
-    path("get-titles/", get_movie_titles, name="get_movie_titles")
+    path("get-titles/", get_movie_titles, name="get_movie_titles"),
+    path("api/recommendations/", recommendations_api, name="recommendations_api"),
+    path("metrics/", metrics, name="metrics")
 ]
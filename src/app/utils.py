@@ -1,26 +1,23 @@
+import numpy as np
 import pandas as pd
-import requests
-from bs4 import BeautifulSoup
 
-from project import settings
-from sklearn.neighbors import NearestNeighbors
-
-
-DATA_DIR = settings.BASE_DIR / "data"
+from .caching import get_recommendation_cache
+from .catalog import DATA_DIR, get_catalog
+from .neighbors import get_neighbors_source, kneighbors, kneighbors_basket
+from .quality import get_quality_monitor
+from .scoring import ACTOR_COLUMNS, ScoringEngine
+from .timing import timer
 
 
 def load_movies():
     """Function to load movies dataframe
 
+    The CSV file is parsed only once per process, the dataframe is shared, so don't modify it !
+
     Returns:
         pd.DataFrame: A dataframe contains all movies
     """
-    # We load the dataframe from CSV file
-    df = pd.read_csv(DATA_DIR / "cleaned_data.csv")
-
-    # We fill empty values with an empty string ( Don't worry the dataframe is already cleaned ! )
-    df.fillna("", inplace=True)
-    return df
+    return get_catalog().movies
 
 
 def load_recommendations(idx):
@@ -32,11 +29,8 @@ def load_recommendations(idx):
     Returns:
         pd.DataFrame: A dataframe contains movies at the indexes in idx
     """
-    # We load the movies dataframe
-    df = load_movies()
-
     # We return only the movies with an index in 'idx'
-    return df.iloc[idx]
+    return get_catalog().take(idx)
 
 
 def filter_by_age_category(df, age_category):
@@ -58,7 +52,7 @@ def filter_by_age_category(df, age_category):
 
 
 def score(movie, df_recommendations):
-    """Function to score the model
+    """Function to score the model ( see scoring.ScoringEngine for the definition of the score )
 
     Args:
         movie (pd.DataFrame): A dataframe of the movie selected by the user ( 1 row )
@@ -67,303 +61,267 @@ def score(movie, df_recommendations):
     Returns:
         float: The score of the recommendations
     """
-    genres = movie["genres"].str.split("|")
-    actors = movie[["actor_1_name", "actor_2_name", "actor_3_name"]]
-    director = movie["director_name"].values[0]
-
-    score = 0
-    for i, row in df_recommendations.iterrows():
-        genres_recommendation = row["genres"].split("|")
-        for j, genre in enumerate(genres_recommendation):
-            try:
-                if genre in genres:
-                    score += 1 / j
-            except KeyError:
-                pass
-        if row["actor_1_name"] in actors:
-            score += 1
-        if row["actor_2_name"] in actors:
-            score += 1
-        if row["actor_3_name"] in actors:
-            score += 1
-        if row["director_name"] == director:
-            score += 1
-    return score
+    # We encode the movie ( position 0 ) and the recommendations ( positions 1 to n )
+    engine = ScoringEngine(pd.concat([movie.iloc[:1], df_recommendations], ignore_index=True))
+    return engine.score(0, np.arange(1, len(df_recommendations) + 1))
+
+
+def get_recommendations_idx(movie_id, nb=5, age_category="adult"):
+    """Function to get the indexes of the movies recommended for a movie ( before the filters of the user )
+
+    Args:
+        movie_id (int or list): The index in the catalog of the movie the user chosen, or the indexes of the movies
+                                of a basket
+        nb (int, optional): Number of recommandations the user want. Defaults to 5.
+        age_category (str, optional): The age category. Defaults to "adult".
+
+    Returns:
+        np.ndarray: The indexes in the catalog of the nb * 10 nearest neighbors, the nearest first
+    """
+    movie_ids = np.atleast_1d(movie_id).tolist()
+
+    # The popular movies are requested again and again, we get their recommendations from the cache
+    cache = get_recommendation_cache()
+    indices = cache.get(movie_ids, nb, age_category)
+    if indices is not None:
+        return indices
+
+    if len(movie_ids) > 1:
+        # The neighbors of the movies of a basket are fused ( the movies of the basket are not recommended )
+        _, indices = kneighbors_basket(movie_ids, nb * 10, age_category)
+    else:
+        # From the neighbor table of build_neighbor_table, or the index of build_indexes
+        _, indices = kneighbors(movie_ids[0], nb * 10, age_category)
+
+    cache.set(movie_ids, nb, age_category, indices)
+    return indices
+
+
+def in_age_category(movie_ids, nb=5, age_category="adult"):
+    """Function to know if movies can be recommended in an age category ( the neighbors are searched only for them )
+
+    Args:
+        movie_ids (iterable): The indexes in the catalog of the movies
+        nb (int, optional): Number of recommandations the user want. Defaults to 5.
+        age_category (str, optional): The age category. Defaults to "adult".
+
+    Returns:
+        bool: True if all the movies are in the age category
+    """
+    with timer("indexes"):
+        source = get_neighbors_source(nb * 10, age_category)
+    return all(movie_id in source for movie_id in movie_ids)
+
+
+def get_recommendations_batch(queries):
+    """Function to get the nearest neighbors of several movies ( before the filters of the user )
+
+    The queries are grouped by age category, and each group is answered with 1 batched search
+
+    Args:
+        queries (list): The ( movie_id, nb, age_category ) of each query
+
+    Returns:
+        list: The distances and the indexes in the catalog of the nb * 10 nearest neighbors of each query
+              ( None if the movie is not in his age category )
+    """
+    results = [None] * len(queries)
+
+    # We group the queries by age category
+    groups = {}
+    for position, (_, _, age_category) in enumerate(queries):
+        groups.setdefault(age_category, []).append(position)
+
+    for age_category, positions in groups.items():
+        # We search the neighbors of the largest query of the group, the other queries take the nearest
+        n_neighbors = max(queries[position][1] for position in positions) * 10
+        source = get_neighbors_source(n_neighbors, age_category)
+        positions = [position for position in positions if queries[position][0] in source]
+        if not positions:
+            continue
+
+        with timer("kneighbors"):
+            distances, indices = source.kneighbors_many([queries[position][0] for position in positions],
+                                                        n_neighbors)
+        for row, position in enumerate(positions):
+            n = queries[position][1] * 10
+            results[position] = distances[row, :n], indices[row, :n]
+
+    return results
 
 
 def generate_recommendations(title="", nb=5, age_category="adult"):
     """Function to generate recommendations using Machine Learning
 
     Args:
-        title (str, optional): The title of the movie the user chosen. Defaults to "".
+        title (str or list, optional): The title of the movie the user chosen, or the titles of the movies of a
+                                       basket. Defaults to "".
         nb (int, optional): Number of recommandations the user want. Defaults to 5.
         age_category (str, optional): A string representing the category of age.
                                       Possibles values : ["child", "teenager", "adult"]. Defaults to "adult".
 
     Returns:
         pd.DataFrame: A dataframe contains movies are recommended by the Machine Learning algorithm
+                      ( empty if a title is unknown )
     """
-    # we load the preprocessed and the movies dataframe
-    df_ML = pd.read_csv(DATA_DIR / "preprocessed_data.csv.gz")
-    df_movies = load_movies()
+    titles = [title] if isinstance(title, str) else list(title)
+
+    # We get the index of the movies with their titles
+    with timer("catalog"):
+        catalog = get_catalog()
+        movie_ids = [catalog.find_title(title) for title in titles]
+    if not movie_ids or None in movie_ids:
+        return catalog.take([])
+    movie_ids = list(dict.fromkeys(movie_ids))
 
-    # We filter ML dataframe by age
-    df_ML = df_ML[df_ML.index.isin(filter_by_age_category(df_movies, age_category).index)]
+    # We get the neighbors (except the input movies)
+    indices = get_recommendations_idx(movie_ids, nb, age_category)
 
-    # We rename the first column to idx
-    new_columns = df_ML.columns.tolist()
-    new_columns[0] = 'idx'
-    df_ML.columns = new_columns
+    # And we load the recommendations in a dataframe
+    with timer("load_recommendations"):
+        df_recommendations = load_recommendations(indices)
 
-    # We fit the NearestNeighbors model
+    # We count the score ( genre1 +1, genre2+0.5, actor+1, director+1 ) of a sample of the requests,
+    # in the background ( see quality.QualityMonitor ), the score compares with 1 movie so the baskets are not scored
+    if len(movie_ids) == 1:
+        get_quality_monitor().submit(movie_ids[0], indices, nb, age_category)
 
-    # BESTS HYPERPARAMETERS
-    # {'algorithm': 'auto', 'leaf_size': 10, 'metric': 'manhattan', 'p': 1}
-    nn = NearestNeighbors(n_neighbors=nb * 10 + 1, algorithm="auto", leaf_size=10, metric="manhattan", p=1)
-    nn.fit(df_ML.drop("idx", axis=1))
+    return df_recommendations
 
-    # We get the index of the movie with his title, and we get the neighbors
-    idx = df_movies[df_movies["movie_title"] == title].index[0]
-    distances, indices = nn.kneighbors(df_ML[df_ML["idx"] == idx].drop("idx", axis=1))
 
-    # We get the indexes of the movies (except the first, it's the input movie)
-    indices = df_ML.iloc[indices[0, 1:]]["idx"].values
+# The limits ( in minutes ) of the duration choices of the questionnaire: "0" < 90 <= "1" < 120 <= "2" < 180 <= "3"
+DURATION_BINS = [90, 120, 180]
 
-    # And we load the recommendations in a dataframe
-    df_recommendations = load_recommendations(indices)
 
-    # We count the score ( genre1 +1, genre2+0.5, actor+1, director+1 )
-    movie = df_movies[df_movies["movie_title"] == title]
-    print("score :", score(movie, df_recommendations))
+def isin_codes(values, choices):
+    """Function to know which values are in the choices, with the integer codes of the values
+
+    Each different value is compared once, then we get the result of each row with its code
+
+    Args:
+        values (iterable): The values ( 1 by row )
+        choices (iterable): The values we are looking for
+
+    Returns:
+        np.ndarray: True for the rows with a value in choices
+    """
+    codes, uniques = pd.factorize(np.asarray(values, dtype=object))
+    return np.isin(np.asarray(uniques, dtype=object), list(choices))[codes]
 
-    return df_recommendations
 
+def preference_scores(df, choices):
+    """Function to score the recommendations with the preferences of the user ( the 'filter' of the questionnaire )
 
+    Args:
+        df (pd.DataFrame): A dataframe contains movies recommendations
+        choices (dict): A dictionary containing the user choices
+
+    Returns:
+        np.ndarray: The score of each recommendation ( 0 if the user has no preference )
+    """
+    scores = np.zeros(len(df), dtype=np.int64)
+    filter_choice = choices["filter"]
+
+    # The number of genres of the movie in the genres of the user
+    if filter_choice == "genres" and choices["genres"]:
+        codes, uniques = pd.factorize(df["genres"].to_numpy(dtype=object))
+        genres = set(choices["genres"])
+        scores += np.array([sum(1 for genre in value.split("|") if genre in genres) for value in uniques],
+                           dtype=np.int64)[codes]
+
+    # The number of actors of the movie in the actors of the user
+    elif filter_choice == "actors" and choices["actors"]:
+        for column in ACTOR_COLUMNS:
+            if column in df:
+                scores += isin_codes(df[column], choices["actors"])
+
+    # 1 if the director of the movie is a director of the user
+    elif filter_choice == "directors" and choices["directors"]:
+        scores += isin_codes(df["director_name"], choices["directors"])
+
+    return scores
+
+
+@timer("filter_recommendations")
 def filter_recommendations(df, choices, nb=5):
     """Function to filter recommandations by user choices
 
+    The movies are filtered by languages and durations, then they are sorted by preference score,
+    the sort is stable, so the movies with the same score stay in the order of the neighbors
+
     Args:
-        df (pd.DataFrame): A dataframe contains movies recommendations
+        df (pd.DataFrame): A dataframe contains movies recommendations ( the nearest first )
         choices (dict): A dictionary containing the user choices
         nb (int, optional): The number of recommendations needed. Defaults to 5.
 
     Returns:
         pd.DataFrame: A dataframe contains the movies recommendations filtered
     """
+    mask = np.ones(len(df), dtype=bool)
+
     # Filter by languages
-    languages = choices["languages"]
-    if languages:
-        df = df[df["language"].isin(languages)]
-
-    # Filter by time
-    durations = choices["duration"]
-    if durations:
-        temp_df = None
-        if "0" in durations:
-            mask = df["duration"] < 90
-            temp_df = pd.concat([temp_df, df[mask]])
-        if "1" in durations:
-            mask_1 = df["duration"] >= 90
-            mask_2 = df["duration"] < 120
-            temp_df = pd.concat([temp_df, df[mask_1 & mask_2]])
-        if "2" in durations:
-            mask_1 = df["duration"] >= 120
-            mask_2 = df["duration"] < 180
-            temp_df = pd.concat([temp_df, df[mask_1 & mask_2]])
-        if "3" in durations:
-            mask = df["duration"] >= 180
-            temp_df = pd.concat([temp_df, df[mask]])
-
-        if len(temp_df):
-            df = temp_df
-
-    # Sort selection criteria
-    filter_choice = choices["filter"]
+    if choices["languages"]:
+        mask &= isin_codes(df["language"], choices["languages"])
+
+    # Filter by time ( only if a movie has one of the durations )
+    if choices["duration"]:
+        buckets = np.digitize(df["duration"].to_numpy(dtype=float), DURATION_BINS)
+        duration_mask = mask & np.isin(buckets, [int(duration) for duration in choices["duration"]])
+        if duration_mask.any():
+            mask = duration_mask
+
+    # Sort by preference score, the nearest first for the same score
+    rows = np.flatnonzero(mask)
+    order = np.argsort(-preference_scores(df, choices)[rows], kind="stable")
+    return df.iloc[rows[order[:nb]]]
+
+
+def get_gallery_url(url):
+    """Function to get the URL of the photo gallery webpage of a movie
+
+    Args:
+        url (str): The url of the movie
+
+    Returns:
+        str: The url of the photo gallery webpage
+    """
+    return "/".join(url.split("/")[:-1]) + "/mediaindex?ref_=tt_ov_mi_sm"
 
-    # Sort by gender in choices
-    if filter_choice == "genres":
-        def sort_func(title_genres, choice_genres):
-            return title_genres.apply(lambda x: sum(1 for genre in x.split("|") if genre in choice_genres))
-        genres = choices["genres"]
-        if genres:
-            df = df.sort_values(by="genres",
-                                key=lambda x: sort_func(x, genres),
-                                ascending=False)
-
-    # Sort by actors in choices
-    elif filter_choice == "actors":
-        def sort_func(title_actors, choice_actors):
-            return title_actors.apply(lambda x: 1 if x in choice_actors else 0)
-        actors = choices["actors"]
-        if actors:
-            df = df.sort_values(by="actor_1_name",
-                                key=lambda x: sort_func(x, actors),
-                                ascending=False)
-
-    # Sort by director in choices
-    elif filter_choice == "directors":
-        def sort_func(title_director, choice_directors):
-            return title_director.apply(lambda x: 1 if x in choice_directors else 0)
-        directors = choices["directors"]
-        if directors:
-            df = df.sort_values(by="director_name",
-                                key=lambda x: sort_func(x, directors),
-                                ascending=False)
-
-    return df.iloc[:nb, :]
-
-
-def get_thumbnail_url(url):
+
+def parse_thumbnail_url(html):
+    """Function to get the movie image URL in the photo gallery webpage
+
+    Args:
+        html (str): The HTML of the photo gallery webpage
+
+    Returns:
+        str: The url of the movie image ( None if there is no image )
+    """
+    # The scraping modules are imported when we scrap IMDB, not when the worker starts
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "html.parser")  # We parse HTML in a BeautifulSoup object
+    img = soup.find("img")                     # We get the first image of the webpage
+    if img is None:
+        return None
+    return img.get("src")                      # And we return the source of the image
+
+
+def get_thumbnail_url(url, session=None, timeout=None):
     """Function to scrap IMDB website and get the movie image URL
 
     Args:
         url (str): The url of the movie
+        session (requests.Session, optional): The session to reuse the connections. Defaults to None.
+        timeout (float, optional): The timeout of the request in seconds. Defaults to None.
 
     Returns:
-        str: The url of the movie image 
+        str: The url of the movie image ( None if there is no image )
     """
-    # We modify url to get the photo gallery webpage
-    url = "/".join(url.split("/")[:-1]) + "/mediaindex?ref_=tt_ov_mi_sm"
-
-    response = requests.get(url)                        # We get the HTML response of the url
-    soup = BeautifulSoup(response.text, "html.parser")  # We parse HTML in a BeautifulSoup object
-    img = soup.find("img")                              # We get the first image of the webpage
-    img_url = img.get("src")                            # We get the source of the image
-    return img_url                                      # And we return it
-
-
-def cross_validation():
-    """Function to do a cross validation on the KNN
-       and write the result in a files in the cross_validation_logs directory
-
-        Args:
-            url (str): The url of the movie
-
-        Returns:
-            str: The url of the movie image
-        """
-    # This module is for beeping ( to ear when scoring is finish )
-    import winsound
-    from project.settings import BASE_DIR
-
-    LOG_DIR = BASE_DIR / "cross_validation_logs"
-    LOG_DIR.mkdir(exist_ok=True)
-
-    df_ML = pd.read_csv(DATA_DIR / "preprocessed_data.csv.gz")
-    df_movies = load_movies()
-
-    total_counter = 0
-
-    def best_score(fitted_knn, total_counter):
-
-        # We count the score ( genre1 +1, genre2+0.5, actor+1, director+1 )
-        max_score = 0
-        for i, row in df_ML.iterrows():
-            # Prédiction des indices et distances pour les 3 plus proches voisins
-            _, indices = fitted_knn.kneighbors(row.values.reshape(1, -1))
-
-            df_recommendations = load_recommendations(indices[0]).iloc[1:]
-
-            genres = df_movies.iloc[i]["genres"].split("|")
-            score = 0
-
-            for j, row_reco in df_recommendations.iterrows():
-                genres_recommendation = row_reco["genres"].split("|")
-                for k, genre in enumerate(genres_recommendation, 1):
-                    try:
-                        if genre in genres:
-                            score += 1 / k
-                    except KeyError:
-                        pass
-                row = df_movies.iloc[i]
-                if row["actor_1_name"] in row_reco[["actor_1_name", "actor_2_name", "actor_3_name"]]:
-                    score += 1
-                if row["actor_2_name"] in row_reco[["actor_1_name", "actor_2_name", "actor_3_name"]]:
-                    score += 1
-                if row["actor_3_name"] in row_reco[["actor_1_name", "actor_2_name", "actor_3_name"]]:
-                    score += 1
-                if row["director_name"] == row_reco["director_name"]:
-                    score += 1
-                if score > max_score:
-                    max_score = score
-
-                if total_counter % 10_000 == 0:
-                    print("TOTAL_COUNTER :", total_counter)
-                total_counter += 1
-
-        # To launch a 10 millisecond beep at each iteration
-        frequency = 2500  # Hertz
-        duration = 10  # ms
-        winsound.Beep(frequency, duration)
-
-        return max_score, total_counter
-
-    # Define the hyperparameters to be tested
-    algorithms = ['auto', 'ball_tree', 'kd_tree', 'brute']
-    leaf_sizes = [10, 20, 30, 40, 50]  # Testons plusieurs leaf_sizes
-    metrics = ['euclidean', 'manhattan']
-    p_values = [1, 2]
-
-    # Initializing lists to store results
-    best_model_score = 0
-    best_params = None
-
-    best_params_details = []
-
-    # Hyperparameter loop
-    for algorithm in algorithms:
-        for leaf_size in leaf_sizes:
-            for metric in metrics:
-                for p in p_values:
-
-                    print(f"algorithm: {algorithm},\nleaf_size: {leaf_size},\nmetric: {metric},\np_value: {p}")
-                    # KNN model creation with current hyperparameters
-                    knn = NearestNeighbors(n_neighbors=51,
-                                           algorithm=algorithm,
-                                           leaf_size=leaf_size,
-                                           metric=metric,
-                                           p=p)
-
-                    # Model fitting
-                    knn.fit(df_ML.values)
-                    score, total_counter = best_score(knn, total_counter)
-                    print("SCORE :", score)
-                    if score > best_model_score:
-                        best_model_score = score
-                        best_params = {"algorithm": algorithm,
-                                       "leaf_size": leaf_size,
-                                       "metric": metric,
-                                       "p_value": p}
-                        best_params_details.extend([f"score : {score}\n",
-                                                    f"params :\n",
-                                                    f"algorithm: {algorithm},\nleaf_size: {leaf_size},\n",
-                                                    f"metric: {metric},\np_value: {p}\n",
-                                                    "-" * 50 + "\n"])
-
-                    # To launch a one-second beep at each iteration in hyperparameters
-                    frequency = 2500  # Hertz
-                    duration = 1000  # ms
-                    winsound.Beep(frequency, duration)
-
-    # We print result and store it in a logging files
-    print("best_score :", best_model_score)
-    print("best_params :", best_params)
-    with open(LOG_DIR / "result.log", "a") as f:
-        f.writelines([f"best score : {best_model_score}\n",
-                      f"params : {best_params}\n"])
-    with open(LOG_DIR / "best_params_detail.log", "a") as f:
-        f.writelines(best_params_details)
-
-    # To launch a 10-second beep at the end
-    frequency = 2500  # Hertz
-    duration = 10_000  # ms
-    winsound.Beep(frequency, duration)
-
-
-if __name__ == "__main__":
-    cross_validation()
-
-    # RESULT
-    # SCORE: 88.99999999999997
-    # best_score: 88.99999999999997
-    # best_params: {'algorithm': 'auto', 'leaf_size': 10, 'metric': 'manhattan', 'p_value': 1}
+    import requests
+
+    # We get the HTML response of the photo gallery webpage
+    with timer("imdb"):
+        response = (session or requests).get(get_gallery_url(url), timeout=timeout)
+        response.raise_for_status()
+    return parse_thumbnail_url(response.text)
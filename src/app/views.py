@@ -1,15 +1,100 @@
-from django.http import JsonResponse, HttpResponseNotAllowed
+import json
+import re
+from functools import lru_cache
+
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import Http404, HttpResponse, HttpResponseNotAllowed, HttpResponseBadRequest, JsonResponse
 from django.shortcuts import render
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
 
 from . import utils
+from .caching import get_recommendation_cache
+from .catalog import get_catalog
+from .neighbors import AGE_CATEGORIES
+from .offload import Overloaded, get_cpu_executor
+from .quality import get_quality_monitor
+from .thumbnails import aget_thumbnail_urls
+from .timing import get_metrics
+from .titles import get_titles_payload
+from .tokens import clamp_nb, make_token, read_token
+
+
+ACCEPTS_GZIP = re.compile(r"\bgzip\b")
+
+# The choices of the questionnaire, the API queries can give them too ( see filter_recommendations )
+CHOICE_LISTS = ["languages", "duration", "genres", "actors", "directors"]
 
 
 def index(request):
     """The view for the index page"""
-    return render(request, "app/index.html")
+    return render(request, "app/index.html", context={"max_titles": settings.BASKET_MAX_TITLES,
+                                                      "max_nb": settings.API_MAX_NB})
+
+
+def overloaded_response():
+    """Function to get the response when the executor of the recommendations is overloaded"""
+    response = HttpResponse(status=503)
+    response["Retry-After"] = "1"
+    response.content = """
+    <h1>Le service est surchargé</h1>
+    <p><i>Veuillez réessayer dans quelques instants</i></p>"""
+    return response
+
+
+def expired_response():
+    """Function to get the response when the result page has no valid handoff of the questionnaire"""
+    response = HttpResponseBadRequest()
+    response.content = """
+    <h1>Cette page a expiré</h1>
+    <p><i>Veuillez remplir à nouveau le formulaire de la page d'accueil</i></p>"""
+    return response
+
+
+def age_category_response():
+    """Function to get the response when the movies are not in the age category chosen by the user"""
+    response = HttpResponseBadRequest()
+    response.content = """
+    <h1>Ce film n'est pas dans cette catégorie d'âge</h1>
+    <p><i>Veuillez choisir un film proposé par la page d'accueil pour cette catégorie d'âge</i></p>"""
+    return response
+
+
+def store_handoff(session, title, nb, recommendations_idx):
+    """Function to store in the session the title, the number of movies to recommend and the indexes of the
+    recommendations ( it accesses the database, so the async views call it with sync_to_async )"""
+    session["title"] = title
+    session["nb"] = nb
+    session["recommendations_idx"] = recommendations_idx
+    session.save()
+
+
+def read_handoff(session):
+    """Function to read in the session what store_handoff stored"""
+    return session.get("title"), session.get("nb"), session.get("recommendations_idx")
+
+
+def get_questionnaire_recommendations(movie_ids, titles, nb, age_category):
+    """Function to generate the recommendations of the questionnaire ( the CPU-bound part of questionnaire )
+
+    Args:
+        movie_ids (list): The indexes in the catalog of the movies
+        titles (list): The titles of the movies
+        nb (int): The number of recommendations needed
+        age_category (str): The age category
 
+    Returns:
+        pd.DataFrame: A dataframe contains the movies recommendations, or None if a movie is not in the age category
+    """
+    if not utils.in_age_category(movie_ids, nb, age_category):
+        return None
+    return utils.generate_recommendations(titles, nb, age_category)
 
-def questionnaire(request):
+
+async def questionnaire(request):
     """The view for the questionnaire page"""
     if request.method != 'POST':
         response = HttpResponseNotAllowed(['POST'])
@@ -18,46 +103,105 @@ def questionnaire(request):
         <p><i>Veuillez remplir le formulaire de la page d'accueil</i></p>"""
         return response
 
-    # We get the datas of the form on index page
-    title = request.POST.get("title")
-    nb = int(request.POST.get("recommendationsNumber"))
+    # We get the datas of the form on index page ( several titles for a basket of movies )
+    titles = list(dict.fromkeys(request.POST.getlist("title")))
+    # The number of recommendations is between 1 and API_MAX_NB, like in the token of the result page
+    nb = clamp_nb(request.POST.get("recommendationsNumber"))
     age = request.POST.get("age")
 
-    # We generate recommendations
-    df_recommendations = utils.generate_recommendations(title, nb, age)
+    if len(titles) > settings.BASKET_MAX_TITLES:
+        response = HttpResponseBadRequest()
+        response.content = f"""
+        <h1>Vous avez choisi trop de films</h1>
+        <p><i>Veuillez choisir au plus {settings.BASKET_MAX_TITLES} films</i></p>"""
+        return response
+
+    # We check that the movies are in the catalog
+    movie_ids = [get_catalog().find_title(title) for title in titles]
+    if not movie_ids or None in movie_ids:
+        response = HttpResponseBadRequest()
+        response.content = """
+        <h1>Ce film n'est pas dans notre catalogue</h1>
+        <p><i>Veuillez choisir un film proposé par la page d'accueil</i></p>"""
+        return response
+    title = ", ".join(titles)
+    if age not in AGE_CATEGORIES:
+        return age_category_response()
 
-    # We store in the session the title, the number of movies to recommend and the indexes of the recommendations
-    request.session["title"] = title
-    request.session["nb"] = nb
-    request.session["recommendations_idx"] = df_recommendations.index.tolist()
-    request.session.save()
+    # We generate recommendations ( in a thread of the executor, the event loop stays free )
+    try:
+        df_recommendations = await get_cpu_executor().run(get_questionnaire_recommendations, movie_ids, titles, nb,
+                                                          age)
+    except Overloaded:
+        return overloaded_response()
+    if df_recommendations is None:
+        return age_category_response()
 
-    # We get the languages and the genres of the movies in df_recommendations
-    languages = df_recommendations["language"].unique().tolist()
-    genres = df_recommendations["genres"].apply(lambda x: (x.split("|"))).explode().unique().tolist()
+    if settings.RECOMMENDATIONS_HANDOFF == "token":
+        # We hand off the movies, the number of movies to recommend and the age category in a signed token of the form
+        # ( the result page recomputes the recommendations, without database access )
+        token = make_token(movie_ids[0] if len(movie_ids) == 1 else movie_ids, nb, age)
+    else:
+        # We store in the session the title, the number of movies to recommend and the indexes of the recommendations
+        token = None
+        await sync_to_async(store_handoff)(request.session, title, nb, df_recommendations.index.tolist())
+
+    # We get the languages, the genres, the actor_1_name and the director_name of the movies in df_recommendations
+    # ( with the codes of the catalog, see Catalog.facets )
+    facets = get_catalog().facets(df_recommendations.index)
 
     # We put group_size elements on each row
     group_size = 7
-    languages = [languages[i:i + group_size] for i in range(0, len(languages), group_size)]
-    genres = [genres[i:i + group_size] for i in range(0, len(genres), group_size)]
-
-    # We get the actor_1_name and the director_name in df_recommendations
-    actors = df_recommendations.loc[df_recommendations["actor_1_name"] != "", "actor_1_name"].unique().tolist()
-    directors = df_recommendations.loc[df_recommendations["director_name"] != "", "director_name"].unique().tolist()
+    languages = [facets["languages"][i:i + group_size] for i in range(0, len(facets["languages"]), group_size)]
+    genres = [facets["genres"][i:i + group_size] for i in range(0, len(facets["genres"]), group_size)]
 
     # We store all datas we need in the template in a dict
     context = {"languages": languages,
                "genres": genres,
-               "actors": actors,
-               "directors": directors,
+               "actors": facets["actors"],
+               "directors": facets["directors"],
                "title": title,
-               "nb": nb}
+               "nb": nb,
+               "token": token}
 
     # And we return the render of the template
     return render(request, "app/questionnaire.html", context=context)
 
 
-def result(request):
+def get_result_recommendations(idx, choices, nb):
+    """Function to load the recommendations and filter them with the user choices ( the CPU-bound part of result )
+
+    Args:
+        idx (iterable): The indexes in the catalog of the recommendations ( the nearest first )
+        choices (dict): A dictionary containing the user choices
+        nb (int): The number of recommendations needed
+
+    Returns:
+        pd.DataFrame: A dataframe contains the movies recommendations filtered
+    """
+    return utils.filter_recommendations(utils.load_recommendations(idx), choices, nb)
+
+
+def get_token_recommendations(movie_id, nb, age_category, choices):
+    """Function to recompute the recommendations of a token and filter them with the user choices
+
+    Args:
+        movie_id (int or list): The index in the catalog of the movie, or the indexes of the movies of a basket
+        nb (int): The number of recommendations needed
+        age_category (str): The age category
+        choices (dict): A dictionary containing the user choices
+
+    Returns:
+        pd.DataFrame: A dataframe contains the movies recommendations filtered, or None if a movie is not in the age
+                      category
+    """
+    if age_category not in AGE_CATEGORIES or not utils.in_age_category(np.atleast_1d(movie_id).tolist(), nb,
+                                                                        age_category):
+        return None
+    return get_result_recommendations(utils.get_recommendations_idx(movie_id, nb, age_category), choices, nb)
+
+
+async def result(request):
     """The view for the result page"""
     if request.method != 'POST':
         response = HttpResponseNotAllowed(['POST'])
@@ -69,14 +213,6 @@ def result(request):
     # We get the choices in the form in 'data'
     data = request.POST
 
-    # We get title, number of recommendations and index of recommended movies from the session
-    title = request.session.get("title")
-    nb = request.session.get("nb")
-    idx = request.session.get("recommendations_idx")
-
-    # We load recommendations with the indexes
-    df = utils.load_recommendations(idx)
-
     # We store all the choices in a dict
     choices = {"age": data.get("age"),
                "languages": data.getlist("languages"),
@@ -86,8 +222,30 @@ def result(request):
                "actors": data.getlist("actors"),
                "directors": data.getlist("directors")}
 
-    # We filter recommendations with the user choices
-    df = utils.filter_recommendations(df, choices, nb)
+    token = data.get("token")
+    try:
+        if token:
+            # We get the movie, the number of recommendations and the age category from the token
+            handoff = read_token(token)
+            if handoff is None:
+                return expired_response()
+
+            # And we recompute the recommended movies, filtered with the user choices
+            movie_id, nb, age_category = handoff
+            title = ", ".join(get_catalog().title(idx) for idx in np.atleast_1d(movie_id).tolist())
+            df = await get_cpu_executor().run(get_token_recommendations, movie_id, nb, age_category, choices)
+            if df is None:
+                return expired_response()
+        else:
+            # We get title, number of recommendations and index of recommended movies from the session
+            title, nb, idx = await sync_to_async(read_handoff)(request.session)
+            if idx is None:
+                return expired_response()
+
+            # And we load the recommendations, filtered with the user choices
+            df = await get_cpu_executor().run(get_result_recommendations, idx, choices, nb)
+    except Overloaded:
+        return overloaded_response()
 
     # We get the Series we need to use in the template
     titles = df["movie_title"]
@@ -96,10 +254,13 @@ def result(request):
     actors = df["actor_1_name"]
     directors = df["director_name"]
 
+    # We get the images of the movies ( from the cache, or scraped concurrently on IMDB without blocking )
+    thumbnail_urls = await aget_thumbnail_urls(urls)
+
     # We store all in a list of dict contains datas for each movie
     recommended_films = [{"title": title,
                           "url": url,
-                          "thumbnail_url": utils.get_thumbnail_url(url),
+                          "thumbnail_url": thumbnail_urls[url],
                           "genres": ", ".join(genre.split("|")),
                           "actor": actor,
                           "director": director} for title, url, genre, actor, director in zip(titles,
@@ -117,13 +278,167 @@ def result(request):
     return render(request, "app/result.html", context)
 
 
-def get_movie_titles(request):
-    """The API view to get movies title with AJAX for autocomplete"""
-    # We load movies dataframe
-    df = utils.load_movies()
-    # We store the movies titles filtered by age in a dict
-    titles = {"adult": sorted(utils.filter_by_age_category(df=df, age_category="adult")["movie_title"].tolist()),
-              "teenager": sorted(utils.filter_by_age_category(df=df, age_category="teenager")["movie_title"].tolist()),
-              "child": sorted(utils.filter_by_age_category(df=df, age_category="child")["movie_title"].tolist())}
-    # And we return a JsonResponse contains this dict
-    return JsonResponse(titles)
+def accepts_gzip(request):
+    """Function to know if the client accepts a gzip response"""
+    return ACCEPTS_GZIP.search(request.headers.get("Accept-Encoding", "")) is not None
+
+
+@lru_cache(maxsize=None)
+def get_current_titles_payload():
+    """Function to get the payload of the titles of the catalog of the process, it's built at the first call"""
+    return get_titles_payload(get_catalog())
+
+
+async def get_movie_titles(request):
+    """The API view to get movies title with AJAX for autocomplete
+
+    The JSON is serialized and compressed once per catalog, and a request with the current ETag gets a 304
+    """
+    # The payload is built in a thread of the executor the first time, then it's cached and we don't use the executor
+    if get_current_titles_payload.cache_info().currsize:
+        payload = get_current_titles_payload()
+    else:
+        try:
+            payload = await get_cpu_executor().run(get_current_titles_payload)
+        except Overloaded:
+            return overloaded_response()
+
+    gzip = accepts_gzip(request)
+    etag = payload.gzip_etag if gzip else payload.etag
+
+    # We answer 304 if the client has the current titles
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        if gzip:
+            response = HttpResponse(payload.gzip_content, content_type="application/json")
+            response["Content-Encoding"] = "gzip"
+        else:
+            response = HttpResponse(payload.content, content_type="application/json")
+
+    # The clients can keep the titles TITLES_CACHE_MAX_AGE seconds, then they revalidate them with the ETag
+    response["ETag"] = etag
+    patch_cache_control(response, public=True, max_age=settings.TITLES_CACHE_MAX_AGE)
+    patch_vary_headers(response, ["Accept-Encoding"])
+    return response
+
+
+def parse_recommendations_query(query):
+    """Function to check a query of the recommendations API
+
+    Args:
+        query (dict): The query ( title, and optionally nb, age and the choices of the questionnaire )
+
+    Raises:
+        ValueError: If the query is invalid
+
+    Returns:
+        dict: The query with the default values
+    """
+    if not isinstance(query, dict) or not isinstance(query.get("title"), str):
+        raise ValueError("Each query needs a title")
+
+    try:
+        nb = int(query.get("nb", 5))
+    except (TypeError, ValueError):
+        raise ValueError("nb must be an integer")
+    if not 1 <= nb <= settings.API_MAX_NB:
+        raise ValueError(f"nb must be between 1 and {settings.API_MAX_NB}")
+
+    age = query.get("age", "adult")
+    if age not in AGE_CATEGORIES:
+        raise ValueError(f"age must be one of {', '.join(AGE_CATEGORIES)}")
+
+    choices = {"filter": query.get("filter") or "none"}
+    for choice in CHOICE_LISTS:
+        values = query.get(choice) or []
+        if not isinstance(values, list):
+            raise ValueError(f"{choice} must be a list")
+        choices[choice] = [str(value) for value in values]
+
+    return {"title": query["title"], "nb": nb, "age": age, "choices": choices}
+
+
+@csrf_exempt
+@require_http_methods(["GET", "POST"])
+def recommendations_api(request):
+    """The API view to get recommendations in JSON, for 1 or many movies
+
+    GET: ?title=...&title=...&nb=5&age=adult ( and the choices of the questionnaire, for all the titles )
+    POST: {"queries": [{"title": ..., "nb": 5, "age": "adult", "languages": [...], ...}, ...]}
+
+    The neighbors of all the movies of an age category are searched with 1 batched call
+    """
+    if request.method == "GET":
+        shared = {"nb": request.GET.get("nb", 5),
+                  "age": request.GET.get("age", "adult"),
+                  "filter": request.GET.get("filter"),
+                  **{choice: request.GET.getlist(choice) for choice in CHOICE_LISTS}}
+        queries = [{"title": title, **shared} for title in request.GET.getlist("title")]
+    else:
+        try:
+            queries = json.loads(request.body).get("queries")
+        except (ValueError, AttributeError):
+            return JsonResponse({"error": "The body must be a JSON object"}, status=400)
+
+    if not isinstance(queries, list) or not queries:
+        return JsonResponse({"error": "There is no query"}, status=400)
+    if len(queries) > settings.API_MAX_QUERIES:
+        return JsonResponse({"error": f"There are more than {settings.API_MAX_QUERIES} queries"}, status=400)
+    try:
+        queries = [parse_recommendations_query(query) for query in queries]
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    # We get the index of the movies with their title, then their neighbors
+    catalog = get_catalog()
+    movie_ids = [catalog.find_title(query["title"]) for query in queries]
+    known = [position for position, movie_id in enumerate(movie_ids) if movie_id is not None]
+    neighbors = [None] * len(queries)
+    for position, result in zip(known, utils.get_recommendations_batch(
+            [(movie_ids[position], queries[position]["nb"], queries[position]["age"]) for position in known])):
+        neighbors[position] = result
+
+    # We load the neighbors of all the queries at once
+    found = [result for result in neighbors if result is not None]
+    df = utils.load_recommendations([movie_id for _, indices in found for movie_id in indices.tolist()])
+
+    results = []
+    start = 0
+    for query, movie_id, result in zip(queries, movie_ids, neighbors):
+        if movie_id is None:
+            results.append({"title": query["title"], "error": "This movie is not in the catalog"})
+            continue
+        if result is None:
+            results.append({"title": query["title"], "error": f"This movie is not for the age category {query['age']}"})
+            continue
+
+        # We filter the neighbors of the query with the choices, like the result page
+        distances, indices = result
+        df_recommendations = utils.filter_recommendations(df.iloc[start:start + len(indices)], query["choices"],
+                                                          query["nb"])
+        start += len(indices)
+        distances = dict(zip(indices.tolist(), distances.tolist()))
+        results.append({"title": catalog.title(movie_id),
+                        "id": movie_id,
+                        "nb": query["nb"],
+                        "age": query["age"],
+                        "recommendations": [{"id": idx, "title": title, "distance": distances[idx]}
+                                            for idx, title in zip(df_recommendations.index.tolist(),
+                                                                  df_recommendations["movie_title"])]})
+
+    return JsonResponse({"results": results})
+
+
+def metrics(request):
+    """The view of the metrics of the process: the p50, p95 and p99 of the duration of each stage of the requests,
+    the statistics of the score of the sampled recommendations and the hits and misses of the recommendation cache
+
+    The stages are timed only when the TIMING_ENABLED setting is True ( see app/timing.py ), and the view answers only
+    when the METRICS_ENABLED setting is True, to the METRICS_ALLOWED_IPS if there are some ( else it's a 404 )
+    """
+    if not settings.METRICS_ENABLED or (settings.METRICS_ALLOWED_IPS
+                                        and request.META.get("REMOTE_ADDR") not in settings.METRICS_ALLOWED_IPS):
+        raise Http404
+    return HttpResponse(get_metrics().to_text() + get_quality_monitor().to_text()
+                        + get_recommendation_cache().to_text(),
+                        content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -45,6 +45,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'app.timing.TimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -122,6 +123,67 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Thumbnails of the movies scraped on IMDB ( see app/thumbnails.py )
+# The timeout is in seconds, the TTLs of the cached URLs too ( the negative TTL is for the not found thumbnails )
+THUMBNAIL_TIMEOUT = env.float("THUMBNAIL_TIMEOUT", default=5)
+THUMBNAIL_WORKERS = env.int("THUMBNAIL_WORKERS", default=8)
+THUMBNAIL_CACHE_TTL = env.int("THUMBNAIL_CACHE_TTL", default=30 * 24 * 60 * 60)
+THUMBNAIL_NEGATIVE_CACHE_TTL = env.int("THUMBNAIL_NEGATIVE_CACHE_TTL", default=60 * 60)
+
+# The cache of the recommended movies of ( movie, nb, age category ) ( see app/caching.py ): a cache URL of
+# django-environ ( "locmemcache://" by worker process, "filecache:///path" or "dbcache://table" to share it between
+# the workers ) and its largest number of entries ( the local memory cache evicts the least recently used entry ),
+# "dummycache://" disables it
+RECOMMENDATIONS_CACHE_MAX_ENTRIES = env.int("RECOMMENDATIONS_CACHE_MAX_ENTRIES", default=10_000)
+CACHES = {
+    "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+    "recommendations": {**env.cache_url("RECOMMENDATIONS_CACHE_URL", default="locmemcache://recommendations"),
+                        "TIMEOUT": None,
+                        "OPTIONS": {"MAX_ENTRIES": RECOMMENDATIONS_CACHE_MAX_ENTRIES,
+                                    "CULL_FREQUENCY": RECOMMENDATIONS_CACHE_MAX_ENTRIES}},
+}
+
+# How the questionnaire hands off the recommendations to the result page:
+# "token" ( a signed token in the form, no database access ) or "session" ( the database-backed session )
+RECOMMENDATIONS_HANDOFF = env.str("RECOMMENDATIONS_HANDOFF", default="token")
+# The max-age ( in seconds ) of the tokens, the result page of an older token has expired
+RECOMMENDATIONS_TOKEN_MAX_AGE = env.int("RECOMMENDATIONS_TOKEN_MAX_AGE", default=60 * 60)
+
+# The max-age ( in seconds ) of the titles of the autocomplete, the clients revalidate them with their ETag after
+TITLES_CACHE_MAX_AGE = env.int("TITLES_CACHE_MAX_AGE", default=60 * 60)
+
+# The neighbor backend of the recommendations: "exact" ( sklearn ), "ivf" ( approximate, for the large catalogs,
+# see app/neighbors.py and the benchmark_neighbors command ) or "numpy" ( exact, a worker which serves it never
+# imports sklearn )
+NEIGHBORS_BACKEND = env.str("NEIGHBORS_BACKEND", default="exact")
+
+# Time the stages of the requests ( Server-Timing header and /metrics/ endpoint, see app/timing.py )
+TIMING_ENABLED = env.bool("TIMING_ENABLED", default=DEBUG)
+
+# The /metrics/ endpoint answers only if it's enabled, and only to the allowed IPs if there are some
+# ( for example the IP of the Prometheus server ), else it's a 404
+METRICS_ENABLED = env.bool("METRICS_ENABLED", default=DEBUG)
+METRICS_ALLOWED_IPS = env.list("METRICS_ALLOWED_IPS", default=[])
+
+# The score of the recommendations is computed in a background thread for a sample of the requests
+# ( see app/quality.py ): the part of the requests sampled, the samples which can wait ( the others are dropped )
+# and the number of last scores kept for each age category and number of recommendations
+QUALITY_SAMPLE_RATE = env.float("QUALITY_SAMPLE_RATE", default=0.1)
+QUALITY_QUEUE_SIZE = env.int("QUALITY_QUEUE_SIZE", default=1000)
+QUALITY_WINDOW = env.int("QUALITY_WINDOW", default=1000)
+
+# The limits of the recommendations API: the number of queries by request and the number of recommendations by query
+API_MAX_QUERIES = env.int("API_MAX_QUERIES", default=50)
+API_MAX_NB = env.int("API_MAX_NB", default=10)
+
+# The largest number of movies the user can choose in the form of the index page ( a basket of movies )
+BASKET_MAX_TITLES = env.int("BASKET_MAX_TITLES", default=5)
+
+# The threads of the async views for the recommendations ( CPU-bound ), and the number of requests which can wait
+# for a thread ( the others get a 503, see app/offload.py )
+RECOMMENDATIONS_WORKERS = env.int("RECOMMENDATIONS_WORKERS", default=4)
+RECOMMENDATIONS_QUEUE_SIZE = env.int("RECOMMENDATIONS_QUEUE_SIZE", default=16)
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 